@@ -1,19 +1,20 @@
 import pandas as pd
 import os
-import jieba
-from gensim import corpora, models
-from gensim.models import CoherenceModel
-from snownlp import SnowNLP
+import json
+import argparse
+import itertools
 from tqdm import tqdm
-import matplotlib.pyplot as plt
-from matplotlib import rcParams, font_manager
 import numpy as np
 from multiprocessing import freeze_support
-import pyLDAvis.gensim_models as gensimvis # 导入 pyLDAvis 的 gensim 模块
-import pyLDAvis # 导入 pyLDAvis
-
-# 启用tqdm的pandas集成
-tqdm.pandas()
+from concurrent.futures import ProcessPoolExecutor, as_completed
+# gensim、jieba、matplotlib、pyLDAvis 导入较慢，只在用到它们的阶段内导入，
+# 使仅做情感分析等子命令无需加载这些库
+from lda_vis import collect_vis_inputs, save_vis_inputs, load_vis_inputs, render_html, VIS_HTML_FILENAME
+from fast_sentiment import score_texts, sentiment_categories
+from coherence_index import CooccurrenceIndex
+from artifact_cache import ArtifactCache, file_digest, make_key
+from stage_telemetry import RunTelemetry
+from token_store import TokenStore, dataset_key, default_store_dir, filter_tokens
 
 # --- 可编辑配置 ---
 CONFIG = {
@@ -21,45 +22,612 @@ CONFIG = {
     'input_csv_path': '/Users/ziming_ye/Python/BERTopic/开盒评论集合（6平台）.csv',
     # 输出根目录（可选）。若为None，则在输入CSV同目录下创建同名文件夹
     'output_root_dir': None,
+    # 主题数目：固定整数；设为None时按 topic_sweep 范围并行扫描并自动选择
+    'num_topics': 6,
+    # 主题数扫描范围 (起始, 结束(不含), 步长)，仅在 num_topics 为None时使用
+    'topic_sweep': (2, 16, 1),
+    # 扫描时选择最佳主题数的指标：'coherence'（c_v 最大）或 'perplexity'（困惑度最小）
+    'sweep_metric': 'coherence',
+    # 扫描使用的进程数（每个进程训练一个主题数）。None表示 CPU核数-1
+    'sweep_workers': None,
+    # 最终模型训练的核数。1 为单核 LdaModel（与历史结果一致），>1 使用 LdaMulticore
+    'workers': 1,
+    # 一致性计算后端：'index' 先建立一次共现索引再为每个模型廉价打分；'gensim' 使用 CoherenceModel
+    'coherence_backend': 'index',
+    # 建立共现索引时的文档抽样比例 (0, 1]，None 为全部文档；抽样时输出一致性的95%置信区间
+    'coherence_sample_rate': None,
+    # 主题推断的批大小（每批文档一次性送入 LDA 推断）
+    'inference_batch_size': 2000,
+    # 文档-主题分布矩阵的保存格式：None（不保存）、'npy' 或 'csv'
+    'doc_topic_matrix_format': None,
+    # 情感打分的进程数（按块并行分词打分，适合超大数据量）
+    'sentiment_workers': 1,
+    # 流式模式：按块读取CSV、增量构建字典，并把词袋语料序列化为磁盘上的 MmCorpus，
+    # 训练、一致性计算和主题分类都从磁盘迭代，内存占用与数据量无关（适合超出内存的输入）
+    'streaming': False,
+    # 流式模式每块读取的行数
+    'chunksize': 50000,
+    # pyLDAvis 交互图：'full' 原始 gensimvis.prepare（重新扫描语料）；'fast' 复用已有统计量并只保留
+    # 相关词（近似）；'defer' 只保存可视化输入，之后用 python lda_vis.py <输出目录> 生成；'skip' 不生成
+    'lda_vis': 'fast',
+    # 生成交互图时计算相关度的进程数，-1 表示全部核心
+    'vis_workers': -1,
+    # 是否缓存中间结果（字典、语料、LDA模型、情感得分）。输入CSV、停用词和模型参数不变时直接复用，
+    # 只改图表或输出目录不必重新分词和训练。查看/清理: python artifact_cache.py <缓存目录> list|evict
+    'use_cache': True,
+    # 缓存目录。None 表示输入CSV同目录下的 .lda_cache
+    'cache_dir': None,
+    # 各阶段的耗时、CPU时间、峰值内存和吞吐量写入输出目录下的 运行报告.json
+    'telemetry': True,
+    # 额外用 tracemalloc 记录各阶段 Python 内存分配峰值（较精确，但会明显拖慢分词）
+    'telemetry_tracemalloc': False,
+    # 除 content* 列外还要读取并保留到结果CSV中的列（如 ['platform', 'date']）；'all' 读取全部列。
+    # 默认只读取 content* 列，大文件读取更快、占用内存更少
+    'extra_columns': [],
+    # 增量更新（update 子命令）时是否把新评论中的新词加入词典并扩展模型；False 时忽略新词
+    'grow_vocabulary': False,
+    # 分词结果存储目录（与 WordCloud.py、词共现网络.py 共用），None 表示输入CSV同目录下的 .token_store；
+    # 关闭 use_cache 时不保存分词结果
+    'token_store_dir': None,
+    # 分词的进程数，None 表示全部核心
+    'tokenize_workers': None,
 }
 
 # --- 全局函数和配置 ---
 
+# 默认停用词文件路径（可由 CONFIG['stopwords_path'] 或命令行 --stopwords 覆盖）
+STOPWORDS_PATH = '/Volumes/ZimingYe/Python/cn_all_stopwords.txt'
+
 # 加载停用词
-def load_stopwords(filepath='/Volumes/ZimingYe/Python/cn_all_stopwords.txt'):
+def load_stopwords(filepath=STOPWORDS_PATH):
     """加载停用词"""
     with open(filepath, 'r', encoding='utf-8') as f:
         return set([line.strip() for line in f])
 
-# 全局停用词变量，只加载一次
-stopwords = load_stopwords()
+def stopwords_path():
+    return CONFIG.get('stopwords_path') or STOPWORDS_PATH
+
+# 停用词在第一次分词时加载，之后复用
+_stopwords = None
+
+def get_stopwords():
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = load_stopwords(stopwords_path())
+    return _stopwords
 
 # 中文分词函数
 def tokenize(text):
     """分词，并去除停用词和单个字符"""
-    return [w for w in jieba.lcut(text) if w not in stopwords and len(w.strip()) > 1]
+    import jieba
+    return filter_tokens(jieba.lcut(text), 'lda', get_stopwords())
 
-# 计算情感得分
-def sentiment_score(text):
-    """计算情感得分（0到1之间，越接近1越积极）"""
+def open_token_store(input_csv_path):
+    """按配置打开分词结果存储；未启用缓存时返回不落盘的存储"""
+    root = None
+    if CONFIG.get('use_cache', True):
+        root = CONFIG.get('token_store_dir') or default_store_dir(input_csv_path)
+    return TokenStore(root, workers=CONFIG.get('tokenize_workers'))
+
+def tokenize_comments(input_csv_path, texts_factory):
+    """
+    读取（或生成并保存）合并后 content 列的分词结果，过滤规则同 tokenize。
+    texts_factory 只在没有已保存的分词结果时调用，应按 load_comments 的顺序产出文本。
+    """
+    key = dataset_key('merged-content', file_digest(input_csv_path))
+    return open_token_store(input_csv_path).tokens(key, texts_factory, 'lda', stopwords_path())
+
+# --- 数据读取 ---
+
+def detect_content_columns(columns):
+    """检测所有以 content 开头的列"""
+    content_like_columns = [col for col in columns if str(col).lower().startswith('content')]
+    if len(content_like_columns) == 0:
+        raise ValueError("未在输入CSV中找到以 'content' 开头的列，请检查数据列名。")
+    return content_like_columns
+
+def merge_content_columns(df, content_like_columns):
+    """合并多个 content 列为一列文本（非空值以'。'连接），并去除空评论；按列向量化，不逐行遍历"""
+    merged = pd.Series('', index=df.index)
+    has_value = pd.Series(False, index=df.index)
+    for column_name in content_like_columns:
+        present = df[column_name].notna()
+        text = df[column_name].astype(str)
+        merged = merged.where(~present, text.where(~has_value, merged + '。' + text))
+        has_value |= present
+    df['content'] = merged.str.strip()
+    return df[df['content'] != '']  # 去除空评论
+
+def _csv_columns(input_csv_path):
+    """返回 (content 列, 需要读取的列)"""
+    columns = pd.read_csv(input_csv_path, nrows=0).columns
+    content_like_columns = detect_content_columns(columns)
+    extra_columns = CONFIG.get('extra_columns') or []
+    if extra_columns == 'all':
+        return content_like_columns, list(columns)
+    missing = [col for col in extra_columns if col not in columns]
+    if missing:
+        raise ValueError(f"输入CSV中没有这些列: {missing}")
+    return content_like_columns, [col for col in columns if col in content_like_columns or col in extra_columns]
+
+def _csv_engine():
+    """整块读取时优先使用多线程的 pyarrow 解析器（未安装时使用 C 解析器）"""
     try:
-        return SnowNLP(text).sentiments
-    except:
-        return 0.5 # 异常情况返回中性
+        import pyarrow  # noqa: F401
+        return 'pyarrow'
+    except ImportError:
+        return 'c'
+
+def load_comments(input_csv_path, skip_rows=0):
+    """
+    读取评论：只读取需要的列、content 列按字符串读取，合并 content 列并去除空评论。
+    skip_rows: 跳过开头的数据行数（增量更新时跳过已处理的行）
+    """
+    content_like_columns, usecols = _csv_columns(input_csv_path)
+    print(f"🔎 检测到用于分析的列: {content_like_columns}")
+    dtype = {col: str for col in content_like_columns}
+    if skip_rows:
+        # pyarrow 解析器不支持跳过指定行
+        df = pd.read_csv(input_csv_path, usecols=usecols, dtype=dtype, skiprows=range(1, skip_rows + 1))
+    else:
+        df = pd.read_csv(input_csv_path, usecols=usecols, dtype=dtype, engine=_csv_engine())
+    return merge_content_columns(df, content_like_columns)
+
+# --- 流式（超出内存）语料 ---
+
+class TokenStream:
+    """逐行读取分词结果文件（每行一个JSON列表），可重复迭代，供一致性计算等多次遍历使用"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+def iter_comment_chunks(input_csv_path, chunksize):
+    """按块读取CSV（列选择与 load_comments 相同）并合并 content 列，逐块产出"""
+    content_like_columns, usecols = _csv_columns(input_csv_path)
+    print(f"🔎 检测到用于分析的列: {content_like_columns}")
+    dtype = {col: str for col in content_like_columns}
+    for chunk in pd.read_csv(input_csv_path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        yield merge_content_columns(chunk, content_like_columns)
+
+def build_streaming_corpus(input_csv_path, work_dir, chunksize=50000, sentiment_workers=1):
+    """
+    流式读取CSV：逐块取出分词结果（来自分词结果存储）并情感打分，增量构建字典，再把词袋语料序列化为 MmCorpus。
+    返回 (dictionary, corpus, tokenized_texts, rows_path)，其中 corpus 和 tokenized_texts
+    都从磁盘迭代；rows_path 为带情感列的评论行，顺序与语料一致。
+    """
+    from gensim import corpora
+    os.makedirs(work_dir, exist_ok=True)
+    tokens_path = os.path.join(work_dir, 'tokens.jsonl')
+    rows_path = os.path.join(work_dir, 'rows.csv')
+    mm_path = os.path.join(work_dir, 'corpus.mm')
+
+    token_corpus = tokenize_comments(input_csv_path, lambda: (
+        text for chunk in iter_comment_chunks(input_csv_path, chunksize) for text in chunk['content'].astype(str)))
+    token_lists = iter(token_corpus)
+    dictionary = corpora.Dictionary()
+    num_docs = 0
+    with open(tokens_path, 'w', encoding='utf-8') as token_file:
+        for i, chunk in enumerate(iter_comment_chunks(input_csv_path, chunksize)):
+            texts = chunk['content'].astype(str).tolist()
+            tokenized = list(itertools.islice(token_lists, len(texts)))
+            dictionary.add_documents(tokenized)
+            for tokens in tokenized:
+                token_file.write(json.dumps(tokens, ensure_ascii=False) + '\n')
+
+            scores = score_texts(texts, workers=sentiment_workers)
+            chunk['sentiment'] = np.where(np.isnan(scores), 0.5, scores)
+            chunk['sentiment_category'] = sentiment_categories(scores)
+            chunk.to_csv(rows_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False, encoding='utf-8')
+            num_docs += len(chunk)
+
+    if num_docs == 0:
+        raise ValueError("输入CSV中没有非空评论。")
+    print(f"📖 共 {num_docs} 条评论，词典大小 {len(dictionary)}，正在序列化语料...")
+    dictionary.save(os.path.join(work_dir, 'dictionary.dict'))
+    corpora.MmCorpus.serialize(mm_path, (dictionary.doc2bow(tokens) for tokens in TokenStream(tokens_path)),
+                               id2word=dictionary)
+    return load_streaming_corpus(work_dir)
+
+def load_streaming_corpus(work_dir):
+    """从 build_streaming_corpus 写出的目录加载 (dictionary, corpus, tokenized_texts, rows_path)"""
+    from gensim import corpora
+    return (corpora.Dictionary.load(os.path.join(work_dir, 'dictionary.dict')),
+            corpora.MmCorpus(os.path.join(work_dir, 'corpus.mm')),
+            TokenStream(os.path.join(work_dir, 'tokens.jsonl')),
+            os.path.join(work_dir, 'rows.csv'))
+
+def assign_topics_streaming(lda_model, corpus, rows_path, output_base_dir, chunksize=50000,
+                            batch_size=2000, matrix_format=None):
+    """
+    按块推断主题并与评论行对齐，以追加方式写出结果CSV、各主题评论CSV以及可选的文档-主题矩阵。
+    返回 (结果CSV路径, 各主题词数)，后者供生成交互图使用。
+    """
+    result_csv_path = os.path.join(output_base_dir, '情感主题分析扩展结果.csv')
+    matrix = None
+    if matrix_format == 'npy':
+        matrix_path = os.path.join(output_base_dir, '文档主题分布.npy')
+        matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=np.float32,
+                                           shape=(len(corpus), lda_model.num_topics))
+    elif matrix_format == 'csv':
+        matrix_path = os.path.join(output_base_dir, '文档主题分布.csv')
+    elif matrix_format:
+        raise ValueError(f"不支持的矩阵保存格式: {matrix_format}，可选 'npy' 或 'csv'")
+
+    bows = iter(corpus)
+    topic_counts = {}
+    topic_freq = np.zeros(lda_model.num_topics, dtype=np.float64)
+    original_comments, offset = 0, 0
+    for i, chunk in enumerate(pd.read_csv(rows_path, chunksize=chunksize)):
+        chunk_bows = list(itertools.islice(bows, len(chunk)))
+        chunk_matrix = infer_document_topics(lda_model, chunk_bows, batch_size)
+        topic_freq += chunk_matrix.T @ document_lengths(chunk_bows)
+        chunk['topic'], chunk['topic_prob'] = main_topics(chunk_matrix)
+        original_comments += len(chunk)
+        classified = (chunk['topic'] != -1).to_numpy()
+        chunk = chunk[classified]
+        chunk_matrix = chunk_matrix[classified]
+        chunk.to_csv(result_csv_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False, encoding='utf-8-sig')
+
+        if matrix is not None:
+            matrix[offset:offset + len(chunk)] = chunk_matrix
+        elif matrix_format == 'csv':
+            columns = [f'topic_{k}' for k in range(lda_model.num_topics)]
+            pd.DataFrame(chunk_matrix, columns=columns).to_csv(
+                matrix_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False, encoding='utf-8-sig')
+        offset += len(chunk)
+
+        # 各主题的评论文本同样逐块追加
+        for topic_id, topic_comments in chunk.groupby('topic'):
+            topic_csv_path = os.path.join(output_base_dir, f'主题{topic_id}_评论文本.csv')
+            first = topic_id not in topic_counts
+            topic_comments[['content', 'sentiment', 'sentiment_category']].to_csv(
+                topic_csv_path, mode='w' if first else 'a', header=first, index=False, encoding='utf-8-sig')
+            topic_counts[topic_id] = topic_counts.get(topic_id, 0) + len(topic_comments)
+
+    if matrix is not None:
+        matrix.flush()
+        print(f"✅ 文档-主题分布矩阵已保存: {matrix_path}（前 {offset} 行与结果CSV对应）")
+    elif matrix_format:
+        print(f"✅ 文档-主题分布矩阵已保存: {matrix_path}")
+    print(f"🔍 过滤掉未归类主题的评论，剩余评论数量: {offset} (原:{original_comments})")
+    print(f"✅ 分析结果已保存: {result_csv_path}")
+    for topic_id in sorted(topic_counts):
+        print(f"✅ 主题{topic_id}的{topic_counts[topic_id]}条评论已保存: "
+              f"{os.path.join(output_base_dir, f'主题{topic_id}_评论文本.csv')}")
+    return result_csv_path, topic_freq
+
+# --- 中间结果缓存 ---
+
+# 分词、语料构建或缓存文件格式变化时递增，使旧缓存失效
+CACHE_VERSION = 2
+
+def open_cache(input_csv_path):
+    """按配置打开缓存目录，未启用时返回 None"""
+    if not CONFIG.get('use_cache', True):
+        return None
+    cache_dir = CONFIG.get('cache_dir') or os.path.join(os.path.dirname(os.path.abspath(input_csv_path)), '.lda_cache')
+    return ArtifactCache(cache_dir)
+
+def corpus_cache_key(input_csv_path, streaming):
+    """语料阶段的缓存键：输入CSV内容、停用词文件内容、读取的列和读取方式"""
+    return make_key('corpus', CACHE_VERSION, file_digest(input_csv_path), file_digest(stopwords_path()),
+                    CONFIG.get('extra_columns') or [], streaming)
+
+def model_cache_params():
+    """影响LDA模型和评估指标的参数"""
+    num_topics = CONFIG.get('num_topics')
+    return {
+        'num_topics': num_topics,
+        'topic_sweep': None if num_topics else list(CONFIG['topic_sweep']),
+        'sweep_metric': None if num_topics else CONFIG.get('sweep_metric', 'coherence'),
+        'workers': resolve_workers(CONFIG.get('workers', 1)),
+        'coherence_backend': CONFIG.get('coherence_backend', 'index'),
+        'coherence_sample_rate': CONFIG.get('coherence_sample_rate'),
+    }
+
+def save_corpus_artifacts(entry_dir, df, tokenized_texts, dictionary, corpus):
+    from gensim import corpora
+    df.to_pickle(os.path.join(entry_dir, 'rows.pkl'))
+    with open(os.path.join(entry_dir, 'tokens.jsonl'), 'w', encoding='utf-8') as f:
+        for tokens in tokenized_texts:
+            f.write(json.dumps(tokens, ensure_ascii=False) + '\n')
+    dictionary.save(os.path.join(entry_dir, 'dictionary.dict'))
+    corpora.MmCorpus.serialize(os.path.join(entry_dir, 'corpus.mm'), corpus, id2word=dictionary)
+
+def load_corpus_artifacts(entry_dir):
+    """返回 (df, tokenized_texts, dictionary, corpus)，与重新计算的结果一致"""
+    from gensim import corpora
+    df = pd.read_pickle(os.path.join(entry_dir, 'rows.pkl'))
+    tokenized_texts = list(TokenStream(os.path.join(entry_dir, 'tokens.jsonl')))
+    dictionary = corpora.Dictionary.load(os.path.join(entry_dir, 'dictionary.dict'))
+    # MmCorpus 中的计数为浮点数，还原为整数词袋
+    corpus = [[(word_id, int(count)) for word_id, count in bow]
+              for bow in corpora.MmCorpus(os.path.join(entry_dir, 'corpus.mm'))]
+    return df, tokenized_texts, dictionary, corpus
+
+def save_model_artifacts(entry_dir, lda_model, metrics, sweep_df=None):
+    lda_model.save(os.path.join(entry_dir, 'lda.model'))
+    with open(os.path.join(entry_dir, 'metrics.json'), 'w', encoding='utf-8') as f:
+        json.dump({key: float(value) for key, value in metrics.items()}, f, ensure_ascii=False, indent=2)
+    if sweep_df is not None:
+        sweep_df.to_csv(os.path.join(entry_dir, 'sweep.csv'), index=False, encoding='utf-8')
+
+def load_model_artifacts(entry_dir):
+    """返回 (lda_model, metrics, sweep_df)，固定主题数时 sweep_df 为 None"""
+    from gensim import models
+    lda_model = models.LdaModel.load(os.path.join(entry_dir, 'lda.model'))
+    with open(os.path.join(entry_dir, 'metrics.json'), 'r', encoding='utf-8') as f:
+        metrics = json.load(f)
+    sweep_path = os.path.join(entry_dir, 'sweep.csv')
+    sweep_df = pd.read_csv(sweep_path, float_precision='round_trip') if os.path.exists(sweep_path) else None
+    return lda_model, metrics, sweep_df
+
+# --- LDA 训练与主题数扫描 ---
+
+def resolve_workers(workers=None):
+    """解析进程数，None 表示 CPU核数-1（至少为1）"""
+    if workers is None:
+        workers = (os.cpu_count() or 2) - 1
+    return max(1, int(workers))
+
+def train_lda(corpus, dictionary, num_topics, workers=1):
+    """训练LDA模型，workers>1 时使用 LdaMulticore 多核训练"""
+    from gensim import models
+    if workers > 1:
+        return models.LdaMulticore(
+            corpus=corpus,
+            id2word=dictionary,
+            num_topics=num_topics,
+            passes=10,
+            random_state=42,
+            workers=workers
+        )
+    return models.LdaModel(
+        corpus=corpus,
+        id2word=dictionary,
+        num_topics=num_topics,
+        passes=10,
+        random_state=42
+    )
+
+def coherence_metrics(result):
+    """共现索引的打分结果转换为指标（抽样时含95%置信区间）"""
+    metrics = {'一致性c_v': result['coherence']}
+    if 'ci95' in result:
+        metrics['一致性95%下界'], metrics['一致性95%上界'] = result['ci95']
+    return metrics
+
+def evaluate_lda(lda_model, corpus, tokenized_texts, dictionary, processes=-1, coherence_index=None):
+    """计算一致性 c_v 和对数困惑度（每词似然下界），返回指标字典"""
+    if coherence_index is not None:
+        metrics = coherence_metrics(coherence_index.score_model(lda_model, 'c_v'))
+    else:
+        from gensim.models import CoherenceModel
+        coherence_model = CoherenceModel(
+            model=lda_model,
+            texts=tokenized_texts,
+            dictionary=dictionary,
+            coherence='c_v',
+            processes=processes
+        )
+        metrics = {'一致性c_v': coherence_model.get_coherence()}
+    metrics['对数困惑度'] = lda_model.log_perplexity(corpus)
+    return metrics
+
+def build_coherence_index(tokenized_texts, dictionary):
+    """
+    按配置创建共现索引（只记录分词文本，打分时才分块扫描，流式模式下从磁盘读取）；
+    使用 gensim 后端时返回None
+    """
+    if CONFIG.get('coherence_backend', 'index') != 'index':
+        return None
+    return CooccurrenceIndex(tokenized_texts, dictionary, sample_rate=CONFIG.get('coherence_sample_rate'))
+
+# 扫描子进程共享的数据，由 _init_sweep_worker 在每个进程启动时设置一次，避免每个任务重复传输语料
+_sweep_data = {}
+
+def _init_sweep_worker(corpus, tokenized_texts, dictionary):
+    _sweep_data['corpus'] = corpus
+    _sweep_data['tokenized_texts'] = tokenized_texts
+    _sweep_data['dictionary'] = dictionary
+
+def _sweep_one(num_topics):
+    """子进程中训练单个主题数的模型；没有分词文本时（一致性由主进程统一计算）只计算困惑度"""
+    corpus = _sweep_data['corpus']
+    dictionary = _sweep_data['dictionary']
+    lda_model = train_lda(corpus, dictionary, num_topics, workers=1)
+    if _sweep_data['tokenized_texts'] is None:
+        return num_topics, {'对数困惑度': lda_model.log_perplexity(corpus)}, lda_model
+    # 子进程内不再派生进程
+    metrics = evaluate_lda(lda_model, corpus, _sweep_data['tokenized_texts'], dictionary, processes=1)
+    return num_topics, metrics, lda_model
+
+def sweep_num_topics(corpus, tokenized_texts, dictionary, topic_range, metric='coherence', workers=None,
+                     coherence_index=None, telemetry=None):
+    """
+    在多个进程中并行扫描主题数，返回 (最佳模型, 扫描结果表)。
+    传入 coherence_index 时子进程只训练模型，全部训练完后由主进程对所有模型只扫描一次文本计算一致性
+    （计入 telemetry 的 coherence 阶段）；否则各子进程用 CoherenceModel 计算。
+    """
+    if metric not in ('coherence', 'perplexity'):
+        raise ValueError(f"不支持的扫描指标: {metric}，可选 'coherence' 或 'perplexity'")
+
+    topic_counts = list(topic_range)
+    workers = min(resolve_workers(workers), len(topic_counts))
+    print(f"🔁 并行扫描主题数 {topic_counts}（{workers} 个进程）...")
 
-# 扩展情感分析（分类为积极、中性、消极）
-def extended_sentiment_analysis(text):
-    """根据情感得分分类为 '积极', '中性', '消极'"""
+    # 使用共现索引时不向子进程传输分词文本；全部模型保留到一致性算完（大小只与主题数和词典有关）
+    results = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_sweep_worker,
+                             initargs=(corpus, tokenized_texts if coherence_index is None else None,
+                                       dictionary)) as executor:
+        futures = [executor.submit(_sweep_one, k) for k in topic_counts]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="主题数扫描"):
+            results.append(future.result())
+
+    if coherence_index is not None:
+        if telemetry is not None:
+            telemetry.start('coherence')
+            telemetry.set_items(len(corpus))
+        print(f"🧮 正在计算 {len(results)} 个模型的一致性（一次扫描分词文本）...")
+        scores = coherence_index.score_models([lda_model for _, _, lda_model in results], 'c_v')
+        results = [(num_topics, {**coherence_metrics(result), **metrics}, lda_model)
+                   for (num_topics, metrics, lda_model), result in zip(results, scores)]
+
+    rows = []
+    best_model, best_key = None, None
+    for num_topics, metrics, lda_model in results:
+        perplexity = float(np.exp2(-metrics['对数困惑度']))
+        rows.append({'主题数': num_topics, **metrics, '困惑度': perplexity})
+        key = metrics['一致性c_v'] if metric == 'coherence' else -perplexity
+        if best_key is None or key > best_key:
+            best_model, best_key = lda_model, key
+
+    sweep_df = pd.DataFrame(rows).sort_values('主题数').reset_index(drop=True)
+    sweep_df['是否选中'] = sweep_df['主题数'] == best_model.num_topics
+    return best_model, sweep_df
+
+def plot_topic_sweep(sweep_df, png_path):
+    """绘制主题数-一致性/困惑度对比曲线"""
+    import matplotlib.pyplot as plt
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+    ax1.plot(sweep_df['主题数'], sweep_df['一致性c_v'], marker='o', color='#0072B2', label='一致性 c_v')
+    ax1.set_xlabel('主题数', fontsize=11)
+    ax1.set_ylabel('一致性 c_v', fontsize=11, color='#0072B2')
+
+    ax2 = ax1.twinx()
+    ax2.plot(sweep_df['主题数'], sweep_df['困惑度'], marker='s', linestyle='--', color='#E69F00', label='困惑度')
+    ax2.set_ylabel('困惑度', fontsize=11, color='#E69F00')
+
+    selected = sweep_df[sweep_df['是否选中']]
+    for k in selected['主题数']:
+        ax1.axvline(k, color='#D55E00', linestyle=':', alpha=0.8)
+
+    ax1.set_xticks(sweep_df['主题数'])
+    ax1.grid(True, linestyle='--', alpha=0.3, color='#666666')
+    ax1.set_title('不同主题数的一致性与困惑度对比', fontsize=13, pad=15)
+    fig.tight_layout()
+    fig.savefig(png_path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+def setup_chinese_font():
+    """设置matplotlib中文字体"""
+    from matplotlib import rcParams, font_manager
     try:
-        score = SnowNLP(text).sentiments
-        if score > 0.7:
-            return "积极"
-        elif score < 0.3:
-            return "消极"
-        else:
-            return "中性"
-    except:
-        return "未知"
+        # 尝试多种中文字体路径
+        font_paths = [
+            '/Users/ziming_ye/Python/Simhei.ttf',
+            '/System/Library/Fonts/PingFang.ttc',
+            '/System/Library/Fonts/STHeiti Light.ttc',
+            '/System/Library/Fonts/STHeiti Medium.ttc'
+        ]
+
+        font_set = False
+        for font_path in font_paths:
+            if os.path.exists(font_path):
+                try:
+                    font_manager.fontManager.addfont(font_path)
+                    rcParams['font.sans-serif'] = ['SimHei', 'PingFang SC', 'STHeiti', 'Arial Unicode MS']
+                    font_set = True
+                    print(f"✅ 使用中文字体: {font_path}")
+                    break
+                except:
+                    continue
+
+        if not font_set:
+            # 使用系统默认中文字体
+            rcParams['font.sans-serif'] = ['PingFang SC', 'STHeiti', 'Arial Unicode MS', 'SimHei']
+            print("⚠️ 使用系统默认中文字体")
+
+    except Exception as e:
+        # 回退到系统默认中文字体
+        rcParams['font.sans-serif'] = ['PingFang SC', 'STHeiti', 'Arial Unicode MS', 'SimHei']
+        print(f"⚠️ 字体设置失败，使用默认字体: {e}")
+
+    rcParams['axes.unicode_minus'] = False
+
+# --- 主题推断 ---
+
+def infer_document_topics(lda_model, corpus, batch_size=2000):
+    """分批推断整个语料的文档-主题分布，返回 (文档数, 主题数) 的稠密矩阵，每行和为1"""
+    blocks = []
+    batch = []
+    for bow in tqdm(corpus, desc="主题推断"):
+        batch.append(bow)
+        if len(batch) >= batch_size:
+            blocks.append(_infer_batch(lda_model, batch))
+            batch = []
+    if batch:
+        blocks.append(_infer_batch(lda_model, batch))
+    if not blocks:
+        return np.zeros((0, lda_model.num_topics), dtype=np.float32)
+    return np.vstack(blocks)
+
+def _infer_batch(lda_model, batch):
+    # 与 get_document_topics 相同：对变分参数 gamma 按行归一化
+    gamma, _ = lda_model.inference(batch)
+    return (gamma / gamma.sum(axis=1, keepdims=True)).astype(np.float32)
+
+def main_topics(doc_topic_matrix):
+    """返回每篇文档的主主题编号与其概率；分布全为0（无法归类）的文档主题记为-1"""
+    if doc_topic_matrix.shape[0] == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+    topics = doc_topic_matrix.argmax(axis=1)
+    top_probs = doc_topic_matrix.max(axis=1)
+    topics[top_probs <= 0] = -1
+    return topics, top_probs
+
+def document_lengths(corpus):
+    """每篇文档的词数（词袋中各词计数之和）"""
+    return np.array([sum(count for _, count in bow) for bow in corpus], dtype=np.float64)
+
+def save_doc_topic_matrix(doc_topic_matrix, output_dir, fmt='npy'):
+    """保存文档-主题分布矩阵，行顺序与分析结果CSV一致"""
+    if fmt == 'npy':
+        path = os.path.join(output_dir, '文档主题分布.npy')
+        np.save(path, doc_topic_matrix)
+    elif fmt == 'csv':
+        path = os.path.join(output_dir, '文档主题分布.csv')
+        columns = [f'topic_{i}' for i in range(doc_topic_matrix.shape[1])]
+        pd.DataFrame(doc_topic_matrix, columns=columns).to_csv(path, index=False, encoding='utf-8-sig')
+    else:
+        raise ValueError(f"不支持的矩阵保存格式: {fmt}，可选 'npy' 或 'csv'")
+    return path
+
+# --- 结果汇总 ---
+
+SENTIMENT_CATEGORIES = ['积极', '中性', '消极']
+
+def summarize_topics(df):
+    """
+    一次分组遍历计算所有按主题的汇总量，复杂度为 O(行数)。
+    返回 (主题×情感类别 的评论数表, 主题情感得分统计表[mean, count])
+    """
+    grouped = df.groupby(['topic', 'sentiment_category'])['sentiment'].agg(['count', 'sum'])
+    category_counts = grouped['count'].unstack(fill_value=0)
+    totals = grouped.groupby(level='topic').sum()
+    sentiment_stats = pd.DataFrame({'mean': totals['sum'] / totals['count'], 'count': totals['count']})
+    return category_counts, sentiment_stats
+
+def build_topic_summary(category_counts, sentiment_stats, lda_model, num_words=5):
+    """由分组汇总结果生成主题汇总表，主题关键词只取一次"""
+    topic_words = dict(lda_model.show_topics(num_topics=-1, num_words=num_words, formatted=False))
+    counts = category_counts.reindex(columns=SENTIMENT_CATEGORIES, fill_value=0)
+    return pd.DataFrame({
+        '主题编号': sentiment_stats.index,
+        '关键词': [', '.join(word for word, prob in topic_words[topic_id]) for topic_id in sentiment_stats.index],
+        '评论数量': sentiment_stats['count'].to_numpy(),
+        '平均情感得分': sentiment_stats['mean'].to_numpy(),
+        '积极评论数': counts['积极'].to_numpy(),
+        '中性评论数': counts['中性'].to_numpy(),
+        '消极评论数': counts['消极'].to_numpy(),
+    })
 
 # --- 主流程函数 ---
 
@@ -99,147 +667,262 @@ def prepare_output_dir(input_csv_path, output_dir=None):
     return target_dir
 
 
-def main():
+def finish_run(telemetry, output_base_dir):
+    """打印各阶段耗时并写出运行报告"""
+    if CONFIG.get('telemetry', True):
+        telemetry.print_summary()
+        report_path = telemetry.save(os.path.join(output_base_dir, '运行报告.json'), config=CONFIG)
+        print(f"✅ 运行报告已保存: {report_path}")
+
+def run_sentiment():
+    """仅做情感分析：读取并合并评论列后批量打分，不加载 gensim、jieba、matplotlib 和 pyLDAvis"""
     input_csv_path = CONFIG['input_csv_path']
-    output_dir = CONFIG.get('output_root_dir')
-    # 1. 读取数据
+    output_base_dir = prepare_output_dir(input_csv_path, CONFIG.get('output_root_dir'))
+    telemetry = RunTelemetry(trace_memory=CONFIG.get('telemetry_tracemalloc', False))
+
     print("\n📚 正在读取数据...")
-    df = pd.read_csv(input_csv_path)
+    telemetry.start('reading')
+    df = load_comments(input_csv_path)
+    telemetry.set_items(len(df))
 
-    # 自动检测并合并所有以 content 开头的列
-    content_like_columns = [col for col in df.columns if str(col).lower().startswith('content')]
-    if len(content_like_columns) == 0:
-        raise ValueError("未在输入CSV中找到以 'content' 开头的列，请检查数据列名。")
+    print("\n💭 正在进行情感分析...")
+    telemetry.start('sentiment')
+    telemetry.set_items(len(df))
+    scores = score_texts(df['content'].astype(str).tolist(), workers=CONFIG.get('sentiment_workers', 1))
+    df['sentiment'] = np.where(np.isnan(scores), 0.5, scores)
+    df['sentiment_category'] = sentiment_categories(scores)
+    print("\n📊 情感分类分布：")
+    print(df['sentiment_category'].value_counts())
 
-    print(f"🔎 检测到用于分析的列: {content_like_columns}")
+    telemetry.start('csv_output')
+    telemetry.set_items(len(df))
+    sentiment_csv_path = os.path.join(output_base_dir, '情感分析结果.csv')
+    df.to_csv(sentiment_csv_path, index=False, encoding='utf-8-sig')
+    print(f"✅ 情感分析结果已保存: {sentiment_csv_path}")
+    finish_run(telemetry, output_base_dir)
+
+def main(until=None):
+    """
+    完整流程。until 为 'corpus' 时构建并缓存字典和语料后结束，为 'train' 时训练（或扫描）
+    并缓存模型、输出评估指标后结束；后续运行会从缓存继续。
+    """
+    from gensim import corpora
+    input_csv_path = CONFIG['input_csv_path']
+    output_dir = CONFIG.get('output_root_dir')
+    streaming = CONFIG.get('streaming', False)
+    chunksize = CONFIG.get('chunksize', 50000)
 
-    def merge_content_columns(row):
-        parts = []
-        for column_name in content_like_columns:
-            value = row.get(column_name)
-            if pd.notna(value):
-                parts.append(str(value))
-        return '。'.join(parts).strip()
+    # 准备输出目录
+    output_base_dir = prepare_output_dir(input_csv_path, output_dir)
+    telemetry = RunTelemetry(trace_memory=CONFIG.get('telemetry_tracemalloc', False))
 
-    df['content'] = df.apply(merge_content_columns, axis=1)
-    df = df[df['content'].astype(str).str.strip() != '']  # 去除空评论
-    texts = df['content'].astype(str).tolist()
+    # 中间结果缓存：语料阶段由输入CSV和停用词决定，模型阶段另加模型参数
+    cache = open_cache(input_csv_path)
+    corpus_key = corpus_cache_key(input_csv_path, streaming) if cache else None
+    cached_corpus = cache.lookup('corpus', corpus_key) if cache else None
+    if cached_corpus:
+        print(f"\n♻️ 使用缓存的字典和语料: {cached_corpus}")
 
-    # 2. 中文分词
-    print("✂️ 正在进行分词...")
-    tokenized_texts = [tokenize(text) for text in tqdm(texts, desc="分词中")]
+    if streaming:
+        # 1-3. 流式读取、分词、情感打分，并构建字典和磁盘语料
+        telemetry.start('streaming_corpus', cached=bool(cached_corpus))
+        if cached_corpus:
+            dictionary, corpus, tokenized_texts, rows_path = load_streaming_corpus(cached_corpus)
+        else:
+            print("\n📚 正在以流式模式读取数据并构建磁盘语料...")
+            build_args = dict(chunksize=chunksize, sentiment_workers=CONFIG.get('sentiment_workers', 1))
+            if cache:
+                # 直接在缓存条目中构建，完成后从缓存位置加载
+                with cache.store('corpus', corpus_key, {'input': input_csv_path, 'streaming': True}) as entry_dir:
+                    build_streaming_corpus(input_csv_path, entry_dir, **build_args)
+                dictionary, corpus, tokenized_texts, rows_path = load_streaming_corpus(cache.path('corpus', corpus_key))
+            else:
+                dictionary, corpus, tokenized_texts, rows_path = build_streaming_corpus(
+                    input_csv_path, os.path.join(output_base_dir, '流式语料'), **build_args)
+        telemetry.set_items(len(corpus))
+    elif cached_corpus:
+        telemetry.start('dictionary_corpus', cached=True)
+        df, tokenized_texts, dictionary, corpus = load_corpus_artifacts(cached_corpus)
+        texts = df['content'].astype(str).tolist()
+        telemetry.set_items(len(corpus))
+    else:
+        # 1. 读取数据
+        print("\n📚 正在读取数据...")
+        telemetry.start('reading')
+        # 自动检测并合并所有以 content 开头的列
+        df = load_comments(input_csv_path)
+        texts = df['content'].astype(str).tolist()
+        telemetry.set_items(len(texts))
 
-    # 3. 构建字典和语料库
-    print("📖 构建字典和语料库...")
-    dictionary = corpora.Dictionary(tokenized_texts)
-    corpus = [dictionary.doc2bow(text) for text in tokenized_texts]
+        # 2. 中文分词
+        print("✂️ 正在进行分词...")
+        telemetry.start('tokenization')
+        tokenized_texts = list(tokenize_comments(input_csv_path, lambda: texts))
+        telemetry.set_items(len(tokenized_texts))
 
+        # 3. 构建字典和语料库
+        print("📖 构建字典和语料库...")
+        telemetry.start('dictionary_corpus', cached=False)
+        dictionary = corpora.Dictionary(tokenized_texts)
+        corpus = [dictionary.doc2bow(text) for text in tokenized_texts]
+        telemetry.set_items(len(corpus))
+        if cache:
+            with cache.store('corpus', corpus_key, {'input': input_csv_path, 'streaming': False}) as entry_dir:
+                save_corpus_artifacts(entry_dir, df, tokenized_texts, dictionary, corpus)
+
+    if until == 'corpus':
+        print(f"✅ 字典和语料已构建: {len(corpus)} 篇文档，词典大小 {len(dictionary)}")
+        finish_run(telemetry, output_base_dir)
+        return
+
+    # 4. 构建LDA模型（固定主题数，或并行扫描主题数后选择最佳模型）
+    best_num_topics = CONFIG.get('num_topics')
+    workers = resolve_workers(CONFIG.get('workers', 1))
+    model_params = model_cache_params()
+    model_key = make_key('model', CACHE_VERSION, corpus_key, model_params) if cache else None
+    cached_model = cache.lookup('model', model_key) if cache else None
+    sweep_df = None
+    if cached_model:
+        telemetry.start('training', cached=True, sweep=not best_num_topics)
+        telemetry.set_items(len(corpus))
+        print(f"\n♻️ 使用缓存的LDA模型: {cached_model}")
+        lda_model, metrics, sweep_df = load_model_artifacts(cached_model)
+        best_num_topics = lda_model.num_topics
+        print(f"🎯 主题数目: {best_num_topics}")
+    elif best_num_topics:
+        telemetry.start('training', cached=False, sweep=False)
+        telemetry.set_items(len(corpus))
+        print(f"\n🔍 正在训练LDA模型（固定{best_num_topics}个主题）...")
+        print(f"🎯 使用固定主题数目: {best_num_topics}")
+        lda_model = train_lda(corpus, dictionary, best_num_topics, workers=workers)
+        print("✅ LDA模型训练完成！")
+
+        # 计算并显示模型评估指标
+        telemetry.start('coherence')
+        telemetry.set_items(len(corpus))
+        metrics = evaluate_lda(lda_model, corpus, tokenized_texts, dictionary,
+                               coherence_index=build_coherence_index(tokenized_texts, dictionary))
+    else:
+        print("\n🔍 正在扫描主题数并训练LDA模型...")
+        # 子进程并行训练计入 training；使用共现索引时主进程随后一次计算全部模型的一致性，计入 coherence
+        # （gensim 后端时一致性在子进程内计算，计入 training）
+        telemetry.start('training', cached=False, sweep=True)
+        telemetry.set_items(len(corpus))
+        lda_model, sweep_df = sweep_num_topics(
+            corpus, tokenized_texts, dictionary,
+            range(*CONFIG['topic_sweep']),
+            metric=CONFIG.get('sweep_metric', 'coherence'),
+            workers=CONFIG.get('sweep_workers'),
+            coherence_index=build_coherence_index(tokenized_texts, dictionary),
+            telemetry=telemetry
+        )
+        best_num_topics = lda_model.num_topics
+        print(f"🎯 选中的主题数目: {best_num_topics}")
+        selected = sweep_df[sweep_df['是否选中']].iloc[0]
+        metrics = selected.drop(['主题数', '困惑度', '是否选中']).to_dict()
+
+    if cache and not cached_model:
+        with cache.store('model', model_key, model_params) as entry_dir:
+            save_model_artifacts(entry_dir, lda_model, metrics, sweep_df)
+
+    telemetry.stop()
+
+    if sweep_df is not None:
+        print(sweep_df)
+        sweep_csv_path = os.path.join(output_base_dir, '主题数扫描结果.csv')
+        sweep_df.to_csv(sweep_csv_path, index=False, encoding='utf-8-sig')
+        print(f"✅ 主题数扫描结果已保存: {sweep_csv_path}")
+        setup_chinese_font()
+        sweep_png_path = os.path.join(output_base_dir, '主题数扫描曲线.png')
+        plot_topic_sweep(sweep_df, sweep_png_path)
+        print(f"✅ 主题数扫描曲线已保存: {sweep_png_path}")
 
-    # 4. 构建LDA模型（固定6个主题）
-    print("\n🔍 正在训练LDA模型（固定6个主题）...")
-    
-    # 固定主题数目为6
-    best_num_topics = 6
-    print(f"🎯 使用固定主题数目: {best_num_topics}")
-    
-    # 构建LDA模型
-    lda_model = models.LdaModel(
-        corpus=corpus,
-        id2word=dictionary,
-        num_topics=best_num_topics,
-        passes=10,
-        random_state=42
-    )
-    print("✅ LDA模型训练完成！")
-    
-    # 计算并显示模型评估指标
-    coherence_model = CoherenceModel(
-        model=lda_model,
-        texts=tokenized_texts,
-        dictionary=dictionary,
-        coherence='c_v'
-    )
-    coherence_score = coherence_model.get_coherence()
-    perplexity_score = lda_model.log_perplexity(corpus)
-    
     print(f"📊 模型评估指标:")
-    print(f"  一致性 c_v: {coherence_score:.4f}")
-    print(f"  困惑度: {perplexity_score:.2f}")
-    
-    # 准备输出目录
-    output_base_dir = prepare_output_dir(input_csv_path, output_dir)
+    print(f"  一致性 c_v: {metrics['一致性c_v']:.4f}")
+    if '一致性95%下界' in metrics:
+        print(f"  一致性 c_v 95%置信区间（抽样）: [{metrics['一致性95%下界']:.4f}, {metrics['一致性95%上界']:.4f}]")
+    print(f"  困惑度: {metrics['对数困惑度']:.2f}")
 
     print("\n🧠 LDA主题关键词展示：")
     for i, topic in lda_model.show_topics(num_words=10, formatted=True):
         print(f"主题 {i}: {topic}")
 
-    # 5. 情感分析
-    print("\n💭 正在进行情感分析...")
-    df['sentiment'] = df['content'].progress_apply(sentiment_score)
-    df['sentiment_category'] = df['content'].progress_apply(extended_sentiment_analysis)
-
-    # 6. 每条评论归类到主主题
-    print("\n📊 正在进行主题分类...")
-    def get_main_topic(text_content):
-        # 使用之前定义的tokenize函数
-        tokens = tokenize(text_content)
-        bow = dictionary.doc2bow(tokens)
-        topics = lda_model.get_document_topics(bow)
-        # 返回概率最大的主题编号
-        return max(topics, key=lambda x: x[1])[0] if topics else -1
-
-    df['topic'] = df['content'].progress_apply(get_main_topic)
-
-    # 确保情感主题数量与 LDA 主题数量一致 (过滤未归类的评论)
-    original_comments = len(df)
-    df = df[df['topic'] != -1]
-    print(f"🔍 过滤掉未归类主题的评论，剩余评论数量: {len(df)} (原:{original_comments})")
+    if until == 'train':
+        finish_run(telemetry, output_base_dir)
+        return
 
-    # 7. 按主题汇总情感得分
-    summary = df.groupby('topic')['sentiment'].agg(['mean', 'count']).reset_index()
+    if streaming:
+        # 5-6. 情感得分已在读取时逐块计算；逐块推断主题并追加写出结果
+        print("\n📊 正在进行主题分类（流式）...")
+        telemetry.start('topic_assignment', includes_csv_output=True)
+        telemetry.set_items(len(corpus))
+        result_csv_path, topic_freq = assign_topics_streaming(
+            lda_model, corpus, rows_path, output_base_dir,
+            chunksize=chunksize,
+            batch_size=CONFIG.get('inference_batch_size', 2000),
+            matrix_format=CONFIG.get('doc_topic_matrix_format')
+        )
+        # 后续汇总只需要三列
+        df = pd.read_csv(result_csv_path, usecols=['topic', 'sentiment', 'sentiment_category'])
+    else:
+        # 5. 情感分析
+        print("\n💭 正在进行情感分析...")
+        # 与 SnowNLP(text).sentiments 一致的批量打分，无法处理的评论记为中性0.5、类别'未知'
+        sentiment_key = make_key('sentiment', CACHE_VERSION, corpus_key) if cache else None
+        cached_sentiment = cache.lookup('sentiment', sentiment_key) if cache else None
+        telemetry.start('sentiment', cached=bool(cached_sentiment))
+        telemetry.set_items(len(texts))
+        if cached_sentiment:
+            print(f"♻️ 使用缓存的情感得分: {cached_sentiment}")
+            scores = np.load(os.path.join(cached_sentiment, 'sentiment.npy'))
+        else:
+            scores = score_texts(texts, workers=CONFIG.get('sentiment_workers', 1))
+            if cache:
+                with cache.store('sentiment', sentiment_key) as entry_dir:
+                    np.save(os.path.join(entry_dir, 'sentiment.npy'), scores)
+        df['sentiment'] = np.where(np.isnan(scores), 0.5, scores)
+        df['sentiment_category'] = sentiment_categories(scores)
+
+        # 6. 每条评论归类到主主题（分批推断整个语料的文档-主题分布）
+        print("\n📊 正在进行主题分类...")
+        telemetry.start('topic_assignment')
+        telemetry.set_items(len(corpus))
+        doc_topic_matrix = infer_document_topics(lda_model, corpus, CONFIG.get('inference_batch_size', 2000))
+        df['topic'], df['topic_prob'] = main_topics(doc_topic_matrix)
+        # 各主题的词数（交互图中主题圆的大小），按全部文档计算，与 gensimvis 一致
+        topic_freq = doc_topic_matrix.T @ document_lengths(corpus)
+
+        # 确保情感主题数量与 LDA 主题数量一致 (过滤未归类的评论)
+        original_comments = len(df)
+        classified = (df['topic'] != -1).to_numpy()
+        df = df[classified]
+        doc_topic_matrix = doc_topic_matrix[classified]
+        print(f"🔍 过滤掉未归类主题的评论，剩余评论数量: {len(df)} (原:{original_comments})")
+
+        matrix_format = CONFIG.get('doc_topic_matrix_format')
+        if matrix_format:
+            matrix_path = save_doc_topic_matrix(doc_topic_matrix, output_base_dir, matrix_format)
+            print(f"✅ 文档-主题分布矩阵已保存: {matrix_path}")
+
+    # 7. 按主题汇总情感得分（一次分组遍历得到后续所有按主题的统计量）
+    telemetry.start('aggregation')
+    telemetry.set_items(len(df))
+    category_counts, sentiment_stats = summarize_topics(df)
+    summary = sentiment_stats[['mean', 'count']].reset_index()
     summary.columns = ['主题', '平均情感', '评论数量']
     print("\n📊 每个主题的平均情感得分：")
     print(summary)
 
     # 8. 可视化情感分布 (保持原样)
     print("\n🔍 正在计算情感分布并可视化...")
-    sentiment_distribution = df.groupby(['topic', 'sentiment_category']).size().reset_index(name='count')
+    telemetry.start('plotting')
+    sentiment_distribution = category_counts.stack().reset_index(name='count')
+    sentiment_distribution = sentiment_distribution[sentiment_distribution['count'] > 0].reset_index(drop=True)
     print("\n📊 每个主题的情感类别分布：")
     print(sentiment_distribution)
 
     # 设置中文字体
-    try:
-        # 尝试多种中文字体路径
-        font_paths = [
-            '/Users/ziming_ye/Python/Simhei.ttf',
-            '/System/Library/Fonts/PingFang.ttc',
-            '/System/Library/Fonts/STHeiti Light.ttc',
-            '/System/Library/Fonts/STHeiti Medium.ttc'
-        ]
-        
-        font_set = False
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    font_manager.fontManager.addfont(font_path)
-                    rcParams['font.sans-serif'] = ['SimHei', 'PingFang SC', 'STHeiti', 'Arial Unicode MS']
-                    font_set = True
-                    print(f"✅ 使用中文字体: {font_path}")
-                    break
-                except:
-                    continue
-        
-        if not font_set:
-            # 使用系统默认中文字体
-            rcParams['font.sans-serif'] = ['PingFang SC', 'STHeiti', 'Arial Unicode MS', 'SimHei']
-            print("⚠️ 使用系统默认中文字体")
-            
-    except Exception as e:
-        # 回退到系统默认中文字体
-        rcParams['font.sans-serif'] = ['PingFang SC', 'STHeiti', 'Arial Unicode MS', 'SimHei']
-        print(f"⚠️ 字体设置失败，使用默认字体: {e}")
-    
-    rcParams['axes.unicode_minus'] = False
+    setup_chinese_font()
 
     # 学术论文友好且色盲安全的 Okabe–Ito 配色
     # 积极: 绿色  中性: 灰色  消极: 朱红
@@ -249,24 +932,18 @@ def main():
         '消极': '#D55E00'
     }
 
-    # 计算每个主题的情感分布比例
-    topic_sentiments = {}
-    for topic in sorted(sentiment_distribution['topic'].unique()): # 确保主题顺序
-        topic_data = sentiment_distribution[sentiment_distribution['topic'] == topic]
-        total = topic_data['count'].sum()
-        proportions = {}
-        for sentiment in ['积极', '中性', '消极']:
-            count = topic_data[topic_data['sentiment_category'] == sentiment]['count'].values
-            proportions[sentiment] = count[0] / total if len(count) > 0 else 0
-        topic_sentiments[topic] = proportions
+    # 计算每个主题的情感分布比例（分母包含'未知'类别）
+    topic_sentiments = category_counts.div(category_counts.sum(axis=1), axis=0)
+    topic_sentiments = topic_sentiments.reindex(columns=SENTIMENT_CATEGORIES, fill_value=0)
 
     # 绘制堆叠柱状图
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 7))
-    x = list(topic_sentiments.keys())
+    x = list(topic_sentiments.index)
     bottom = np.zeros(len(x))
 
-    for sentiment in ['积极', '中性', '消极']:
-        proportions = [topic_sentiments[topic][sentiment] for topic in x]
+    for sentiment in SENTIMENT_CATEGORIES:
+        proportions = topic_sentiments[sentiment].to_numpy()
         plt.bar(x, proportions, bottom=bottom,
                 label=sentiment,
                 color=morandi_colors[sentiment],
@@ -301,8 +978,8 @@ def main():
     # 添加数值标签
     for i in x:
         total = 0
-        for sentiment in ['积极', '中性', '消极']:
-            value = topic_sentiments[i][sentiment]
+        for sentiment in SENTIMENT_CATEGORIES:
+            value = topic_sentiments.at[i, sentiment]
             if value > 0.05:
                 plt.text(i, total + value/2, f'{value:.0%}',
                         ha='center', va='center',
@@ -319,21 +996,41 @@ def main():
     print(f"✅ 主题情感堆叠分布图已保存: {stacked_png_path}")
 
     # 9. 生成交互式LDA图
-    print("\n🔍 正在生成 LDA 的 HTML 图...")
-    # pyLDAvis.enable_notebook() # Only if running in a Jupyter Notebook
-    lda_vis = gensimvis.prepare(lda_model, corpus, dictionary, sort_topics=False)
-    html_path = os.path.join(output_base_dir, 'lda_topics_visualization.html')
-    pyLDAvis.save_html(lda_vis, html_path)
-    print(f"✅ LDA 的 HTML 图已保存为: {html_path}")
-
-    # 10. 数据保存
-    result_csv_path = os.path.join(output_base_dir, '情感主题分析扩展结果.csv')
-    df.to_csv(result_csv_path, index=False, encoding='utf-8-sig')
-    print(f"✅ 分析结果已保存: {result_csv_path}")
+    vis_mode = CONFIG.get('lda_vis', 'fast')
+    telemetry.start('pyldavis', mode=vis_mode)
+    html_path = os.path.join(output_base_dir, VIS_HTML_FILENAME)
+    if vis_mode == 'full':
+        print("\n🔍 正在生成 LDA 的 HTML 图...")
+        import pyLDAvis # 导入 pyLDAvis
+        import pyLDAvis.gensim_models as gensimvis # 导入 pyLDAvis 的 gensim 模块
+        # pyLDAvis.enable_notebook() # Only if running in a Jupyter Notebook
+        lda_vis = gensimvis.prepare(lda_model, corpus, dictionary, sort_topics=False)
+        pyLDAvis.save_html(lda_vis, html_path)
+        print(f"✅ LDA 的 HTML 图已保存为: {html_path}")
+    elif vis_mode in ('fast', 'defer'):
+        vis_inputs = collect_vis_inputs(lda_model, dictionary, topic_freq)
+        if vis_mode == 'fast':
+            print("\n🔍 正在生成 LDA 的 HTML 图（快速模式）...")
+            render_html(vis_inputs, html_path, n_jobs=CONFIG.get('vis_workers', -1))
+            print(f"✅ LDA 的 HTML 图已保存为: {html_path}")
+        else:
+            vis_inputs_path = save_vis_inputs(vis_inputs, output_base_dir)
+            print(f"\n⏭️ 已保存可视化输入: {vis_inputs_path}")
+            print(f"   稍后运行 python lda_vis.py \"{output_base_dir}\" 生成 HTML 图")
+    elif vis_mode != 'skip':
+        raise ValueError(f"不支持的交互图模式: {vis_mode}，可选 'full'、'fast'、'defer' 或 'skip'")
+
+    # 10. 数据保存（流式模式下已逐块写出）
+    telemetry.start('csv_output')
+    telemetry.set_items(len(df))
+    if not streaming:
+        result_csv_path = os.path.join(output_base_dir, '情感主题分析扩展结果.csv')
+        df.to_csv(result_csv_path, index=False, encoding='utf-8-sig')
+        print(f"✅ 分析结果已保存: {result_csv_path}")
 
     # 11. 生成单独的情感分类表 (基于过滤后的数据)
     print("\n🔍 正在生成单独的情感分类表...")
-    standalone_sentiment_distribution = df.groupby(['sentiment_category']).size().reset_index(name='count')
+    standalone_sentiment_distribution = category_counts.sum(axis=0).rename_axis('sentiment_category').reset_index(name='count')
     print("\n📊 单独的情感分类分布：")
     print(standalone_sentiment_distribution)
 
@@ -342,39 +1039,298 @@ def main():
     standalone_sentiment_distribution.to_csv(standalone_csv_path, index=False, encoding='utf-8-sig')
     print(f"✅ 单独情感分类结果已保存: {standalone_csv_path}")
 
-    # 12. 按主题保存评论文本
-    print("\n🔍 正在按主题保存评论文本...")
-    for topic_id in sorted(df['topic'].unique()):
-        topic_comments = df[df['topic'] == topic_id][['content', 'sentiment', 'sentiment_category']].copy()
-        topic_csv_path = os.path.join(output_base_dir, f'主题{topic_id}_评论文本.csv')
-        topic_comments.to_csv(topic_csv_path, index=False, encoding='utf-8-sig')
-        print(f"✅ 主题{topic_id}的{len(topic_comments)}条评论已保存: {topic_csv_path}")
-    
+    # 12. 按主题保存评论文本（流式模式下已逐块写出）
+    if not streaming:
+        print("\n🔍 正在按主题保存评论文本...")
+        for topic_id, topic_comments in df[['topic', 'content', 'sentiment', 'sentiment_category']].groupby('topic'):
+            topic_comments = topic_comments.drop(columns='topic')
+            topic_csv_path = os.path.join(output_base_dir, f'主题{topic_id}_评论文本.csv')
+            topic_comments.to_csv(topic_csv_path, index=False, encoding='utf-8-sig')
+            print(f"✅ 主题{topic_id}的{len(topic_comments)}条评论已保存: {topic_csv_path}")
+
     # 13. 生成主题汇总表（包含每个主题的关键词和评论数量）
     print("\n🔍 正在生成主题汇总表...")
-    topic_summary = []
-    for topic_id in sorted(df['topic'].unique()):
-        topic_comments = df[df['topic'] == topic_id]
-        topic_words = lda_model.show_topics(num_topics=best_num_topics, formatted=False)[topic_id]
-        top_words = ', '.join([word for word, prob in topic_words[1][:5]])  # 前5个关键词
-        
-        topic_summary.append({
-            '主题编号': topic_id,
-            '关键词': top_words,
-            '评论数量': len(topic_comments),
-            '平均情感得分': topic_comments['sentiment'].mean(),
-            '积极评论数': len(topic_comments[topic_comments['sentiment_category'] == '积极']),
-            '中性评论数': len(topic_comments[topic_comments['sentiment_category'] == '中性']),
-            '消极评论数': len(topic_comments[topic_comments['sentiment_category'] == '消极'])
-        })
-    
-    topic_summary_df = pd.DataFrame(topic_summary)
+    topic_summary_df = build_topic_summary(category_counts, sentiment_stats, lda_model)
     topic_summary_path = os.path.join(output_base_dir, '主题汇总表.csv')
     topic_summary_df.to_csv(topic_summary_path, index=False, encoding='utf-8-sig')
     print(f"✅ 主题汇总表已保存: {topic_summary_path}")
     print("\n📊 主题汇总表预览：")
     print(topic_summary_df)
 
+    # 保存模型、字典和已处理的行数，供之后增量更新
+    state_path = save_incremental_state(output_base_dir, lda_model, dictionary, input_csv_path)
+    print(f"✅ 增量更新所需的模型和状态已保存: {state_path}")
+
+    # 运行报告
+    finish_run(telemetry, output_base_dir)
+
+# --- 增量更新 ---
+
+INCREMENTAL_DIRNAME = '增量模型'
+
+def count_csv_rows(input_csv_path, chunksize=200000):
+    """CSV 数据行数（不含表头），与 pandas 的解析一致，可正确处理带换行的引号字段"""
+    return sum(len(chunk) for chunk in pd.read_csv(input_csv_path, usecols=[0], chunksize=chunksize))
+
+def save_incremental_state(output_base_dir, lda_model, dictionary, input_csv_path):
+    """
+    保存模型、字典和输入CSV的处理进度。进度记录已处理的数据行数，以及当时文件的大小和内容哈希，
+    增量更新时据此确认CSV只是在末尾追加了新行。
+    """
+    model_dir = os.path.join(output_base_dir, INCREMENTAL_DIRNAME)
+    os.makedirs(model_dir, exist_ok=True)
+    lda_model.save(os.path.join(model_dir, 'lda.model'))
+    dictionary.save(os.path.join(model_dir, 'dictionary.dict'))
+    processed_bytes = os.path.getsize(input_csv_path)
+    state = {
+        'input_csv_path': os.path.abspath(input_csv_path),
+        'processed_rows': count_csv_rows(input_csv_path),
+        'processed_bytes': processed_bytes,
+        'prefix_sha256': file_digest(input_csv_path, size=processed_bytes),
+        'num_topics': lda_model.num_topics,
+        'num_terms': len(dictionary),
+        'updated_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+    state_path = os.path.join(model_dir, 'state.json')
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    return state_path
+
+def grow_model_vocabulary(lda_model, dictionary):
+    """
+    字典新增词后扩展模型的词维度：新词的主题-词充分统计量为0、先验取原先验的均值，
+    即在见到含新词的文档前，新词在各主题中只有先验概率。
+    """
+    extra = len(dictionary) - lda_model.num_terms
+    if extra <= 0:
+        return 0
+    num_topics = lda_model.num_topics
+    eta = np.asarray(lda_model.eta, dtype=lda_model.dtype)
+    if eta.ndim == 2:
+        new_eta = np.hstack([eta, np.full((num_topics, extra), eta.mean(), dtype=lda_model.dtype)])
+    else:
+        new_eta = np.concatenate([eta, np.full(extra, eta.mean(), dtype=lda_model.dtype)])
+    lda_model.eta = new_eta
+    lda_model.state.eta = new_eta
+    lda_model.state.sstats = np.hstack([lda_model.state.sstats,
+                                        np.zeros((num_topics, extra), dtype=lda_model.state.sstats.dtype)])
+    lda_model.num_terms = len(dictionary)
+    lda_model.id2word = dictionary
+    lda_model.sync_state()
+    return extra
+
+def run_update():
+    """
+    增量更新：加载上次保存的字典和模型，只对输入CSV末尾新增的行分词，在线更新模型，
+    再只为新行计算情感和主题并追加到结果CSV，最后重写汇总表。已有行的主题不重新分配。
+    """
+    from gensim import corpora, models
+    input_csv_path = CONFIG['input_csv_path']
+    output_base_dir = prepare_output_dir(input_csv_path, CONFIG.get('output_root_dir'))
+    model_dir = os.path.join(output_base_dir, INCREMENTAL_DIRNAME)
+    state_path = os.path.join(model_dir, 'state.json')
+    result_csv_path = os.path.join(output_base_dir, '情感主题分析扩展结果.csv')
+    if not os.path.exists(state_path) or not os.path.exists(result_csv_path):
+        raise FileNotFoundError(f"未找到上次的模型或结果（{state_path}），请先运行完整流程。")
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+
+    # 确认输入CSV只是在末尾追加了新行
+    if (os.path.getsize(input_csv_path) < state['processed_bytes']
+            or file_digest(input_csv_path, size=state['processed_bytes']) != state['prefix_sha256']):
+        raise ValueError("输入CSV的已处理部分发生了变化（不是在末尾追加），请重新运行完整流程。")
+
+    telemetry = RunTelemetry(trace_memory=CONFIG.get('telemetry_tracemalloc', False))
+    print(f"\n📚 正在读取新增数据（跳过已处理的 {state['processed_rows']} 行）...")
+    telemetry.start('reading')
+    df = load_comments(input_csv_path, skip_rows=state['processed_rows'])
+    telemetry.set_items(len(df))
+    if df.empty:
+        print("✅ 没有新增评论，无需更新。")
+        return
+    texts = df['content'].astype(str).tolist()
+    print(f"🆕 新增非空评论 {len(df)} 条")
+
+    print("✂️ 正在对新增评论分词...")
+    telemetry.start('tokenization')
+    telemetry.set_items(len(texts))
+    tokenized_texts = [tokenize(text) for text in tqdm(texts, desc="分词中")]
+
+    print("🔄 正在在线更新LDA模型...")
+    telemetry.start('training', incremental=True)
+    telemetry.set_items(len(tokenized_texts))
+    dictionary = corpora.Dictionary.load(os.path.join(model_dir, 'dictionary.dict'))
+    lda_model = models.LdaModel.load(os.path.join(model_dir, 'lda.model'))
+    if CONFIG.get('grow_vocabulary', False):
+        dictionary.add_documents(tokenized_texts)
+        added = grow_model_vocabulary(lda_model, dictionary)
+        print(f"📖 词典新增 {added} 个词，当前大小 {len(dictionary)}")
+    corpus = [dictionary.doc2bow(text) for text in tokenized_texts]
+    lda_model.update(corpus)
+    print("✅ LDA模型更新完成！")
+
+    print("\n💭 正在对新增评论进行情感分析...")
+    telemetry.start('sentiment')
+    telemetry.set_items(len(texts))
+    scores = score_texts(texts, workers=CONFIG.get('sentiment_workers', 1))
+    df['sentiment'] = np.where(np.isnan(scores), 0.5, scores)
+    df['sentiment_category'] = sentiment_categories(scores)
+
+    print("\n📊 正在对新增评论进行主题分类...")
+    telemetry.start('topic_assignment')
+    telemetry.set_items(len(corpus))
+    doc_topic_matrix = infer_document_topics(lda_model, corpus, CONFIG.get('inference_batch_size', 2000))
+    df['topic'], df['topic_prob'] = main_topics(doc_topic_matrix)
+    df = df[df['topic'] != -1]
+
+    # 追加到结果CSV（列顺序与已有文件一致）和各主题评论CSV
+    telemetry.start('csv_output')
+    telemetry.set_items(len(df))
+    header = pd.read_csv(result_csv_path, nrows=0).columns
+    df.reindex(columns=header).to_csv(result_csv_path, mode='a', header=False, index=False, encoding='utf-8')
+    print(f"✅ {len(df)} 条新评论已追加到: {result_csv_path}")
+    for topic_id, topic_comments in df.groupby('topic'):
+        topic_csv_path = os.path.join(output_base_dir, f'主题{topic_id}_评论文本.csv')
+        first = not os.path.exists(topic_csv_path)
+        topic_comments[['content', 'sentiment', 'sentiment_category']].to_csv(
+            topic_csv_path, mode='w' if first else 'a', header=first, index=False,
+            encoding='utf-8-sig' if first else 'utf-8')
+        print(f"✅ 主题{topic_id}新增{len(topic_comments)}条评论: {topic_csv_path}")
+
+    # 汇总表基于全部结果重写（主题关键词来自更新后的模型）
+    telemetry.start('aggregation')
+    all_results = pd.read_csv(result_csv_path, usecols=['topic', 'sentiment', 'sentiment_category'])
+    telemetry.set_items(len(all_results))
+    category_counts, sentiment_stats = summarize_topics(all_results)
+    standalone_csv_path = os.path.join(output_base_dir, '单独情感分类结果.csv')
+    category_counts.sum(axis=0).rename_axis('sentiment_category').reset_index(name='count').to_csv(
+        standalone_csv_path, index=False, encoding='utf-8-sig')
+    topic_summary_df = build_topic_summary(category_counts, sentiment_stats, lda_model)
+    topic_summary_path = os.path.join(output_base_dir, '主题汇总表.csv')
+    topic_summary_df.to_csv(topic_summary_path, index=False, encoding='utf-8-sig')
+    print(f"✅ 主题汇总表已更新: {topic_summary_path}")
+    print(topic_summary_df)
+
+    save_incremental_state(output_base_dir, lda_model, dictionary, input_csv_path)
+    print(f"✅ 模型和处理进度已更新: {state_path}")
+    finish_run(telemetry, output_base_dir)
+
+# --- 流式模式校验 ---
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def _cached_model(cache_dir):
+    """校验用：缓存目录中最近写入的模型条目 (lda_model, metrics, sweep_df)"""
+    entries = [meta for meta in ArtifactCache(cache_dir).entries() if meta['stage'] == 'model']
+    return load_model_artifacts(entries[-1]['path'])
+
+def check_streaming(fixture_dir=FIXTURE_DIR, tolerance=1e-9):
+    """
+    用评论样例 fixtures/lda_comments.csv 以默认配置（共现索引一致性、固定主题数、缓存、pyLDAvis fast）
+    在流式模式下运行完整流程，再流式扫描主题数 2-4。校验：
+    - 一致性由共现索引从磁盘上的分词结果分块计算，与 CoherenceModel 一致（扫描时为选中的模型）；
+    - 每条非空评论都写入结果CSV，主题和情感与内存模式的结果逐行一致。
+    返回流式运行的一致性 c_v。
+    """
+    import tempfile
+    from gensim.models import CoherenceModel
+
+    input_csv_path = os.path.join(fixture_dir, 'lda_comments.csv')
+    saved_config = dict(CONFIG)
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(name, **options):
+            CONFIG.clear()
+            CONFIG.update(saved_config, input_csv_path=input_csv_path, output_root_dir=os.path.join(tmp, name),
+                          stopwords_path=os.path.join(fixture_dir, 'lda_stopwords.txt'),
+                          cache_dir=os.path.join(tmp, name, 'cache'), token_store_dir=os.path.join(tmp, 'tokens'),
+                          **options)
+            main()
+            lda_model, metrics, sweep_df = _cached_model(CONFIG['cache_dir'])
+            corpus_entry = [meta for meta in ArtifactCache(CONFIG['cache_dir']).entries() if meta['stage'] == 'corpus']
+            results = pd.read_csv(os.path.join(CONFIG['output_root_dir'], '情感主题分析扩展结果.csv'))
+            return lda_model, metrics, sweep_df, corpus_entry[-1]['path'], results
+
+        try:
+            streamed = run('streaming', streaming=True)
+            swept = run('sweep', streaming=True, num_topics=None, topic_sweep=(2, 5, 1), sweep_workers=2)
+            in_memory = run('in_memory', streaming=False)
+        finally:
+            CONFIG.clear()
+            CONFIG.update(saved_config)
+
+        for label, (lda_model, metrics, _, corpus_dir, _) in (('流式', streamed), ('流式扫描', swept)):
+            dictionary, _, tokenized_texts, _ = load_streaming_corpus(corpus_dir)
+            if not isinstance(tokenized_texts, TokenStream):
+                raise AssertionError(f"{label}模式的分词结果应从磁盘逐行读取")
+            expected = CoherenceModel(model=lda_model, texts=tokenized_texts, dictionary=dictionary,
+                                      coherence='c_v', processes=1).get_coherence()
+            if abs(metrics['一致性c_v'] - expected) > tolerance:
+                raise AssertionError(f"{label}模式的一致性 {metrics['一致性c_v']} 与 CoherenceModel {expected} 不一致")
+        if sorted(swept[2]['主题数']) != [2, 3, 4] or swept[2]['是否选中'].sum() != 1:
+            raise AssertionError(f"主题数扫描结果不符:\n{swept[2]}")
+
+    comments = pd.read_csv(input_csv_path, dtype={'content': str})
+    expected_rows = int(comments['content'].fillna('').str.strip().ne('').sum())
+    columns = ['content', 'topic', 'sentiment_category']
+    stream_results, memory_results = streamed[4], in_memory[4]
+    if len(stream_results) != expected_rows:
+        raise AssertionError(f"结果CSV应有 {expected_rows} 行，实际 {len(stream_results)} 行")
+    if not stream_results[columns].equals(memory_results[columns]):
+        raise AssertionError("流式模式的主题或情感分类与内存模式不一致")
+    return streamed[1]['一致性c_v']
+
+# --- 命令行 ---
+
+def parse_args(argv=None):
+    """解析命令行；不带子命令时等同于 run"""
+    # 各子命令共用的选项，未指定时沿用 CONFIG
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--input', dest='input_csv_path', default=argparse.SUPPRESS, help='输入CSV路径')
+    common.add_argument('--output', dest='output_root_dir', default=argparse.SUPPRESS, help='输出目录')
+    common.add_argument('--stopwords', dest='stopwords_path', default=argparse.SUPPRESS, help='停用词文件路径')
+    common.add_argument('--num-topics', type=int, default=argparse.SUPPRESS, help='主题数，0 表示按 topic_sweep 扫描')
+    common.add_argument('--streaming', action='store_true', default=argparse.SUPPRESS, help='流式模式')
+    common.add_argument('--no-cache', dest='use_cache', action='store_false', default=argparse.SUPPRESS,
+                        help='不使用中间结果缓存')
+    common.add_argument('--lda-vis', choices=['full', 'fast', 'defer', 'skip'], default=argparse.SUPPRESS,
+                        help='交互图生成方式')
+
+    parser = argparse.ArgumentParser(description='LDA 主题建模与情感分析', parents=[common])
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', parents=[common], help='完整流程（默认）')
+    subparsers.add_parser('corpus', parents=[common], help='只分词并构建、缓存字典和语料')
+    subparsers.add_parser('train', parents=[common], help='训练或扫描LDA模型并缓存（语料从缓存读取或重新构建）')
+    subparsers.add_parser('sentiment', parents=[common], help='只做情感分析，不加载 gensim 和 pyLDAvis')
+    subparsers.add_parser('vis', parents=[common], help='由 defer 模式保存的输入生成 pyLDAvis 交互图')
+    subparsers.add_parser('check', help='用评论样例以默认配置校验流式模式（一致性与 CoherenceModel、结果与内存模式一致）')
+    update_parser = subparsers.add_parser('update', parents=[common],
+                                          help='增量更新：只处理输入CSV新增的行，在线更新模型并追加结果')
+    update_parser.add_argument('--grow-vocab', dest='grow_vocabulary', action='store_true', default=argparse.SUPPRESS,
+                               help='把新词加入词典并扩展模型')
+    return parser.parse_args(argv)
+
+def cli(argv=None):
+    args = vars(parse_args(argv))
+    command = args.pop('command', None) or 'run'
+    if 'num_topics' in args:
+        args['num_topics'] = args['num_topics'] or None
+    CONFIG.update(args)
+
+    if command == 'check':
+        coherence = check_streaming()
+        print(f"✅ 流式模式校验通过：一致性 c_v {coherence:.4f} 与 CoherenceModel 一致，结果与内存模式逐行一致")
+    elif command == 'sentiment':
+        run_sentiment()
+    elif command == 'update':
+        run_update()
+    elif command == 'vis':
+        output_base_dir = prepare_output_dir(CONFIG['input_csv_path'], CONFIG.get('output_root_dir'))
+        html_path = render_html(load_vis_inputs(output_base_dir), os.path.join(output_base_dir, VIS_HTML_FILENAME),
+                                n_jobs=CONFIG.get('vis_workers', -1))
+        print(f"✅ LDA 的 HTML 图已保存为: {html_path}")
+    else:
+        main(until=None if command == 'run' else command)
+
 if __name__ == '__main__':
     freeze_support() # 用于在Windows多进程环境下防止递归创建进程
-    main()
\ No newline at end of file
+    cli()
\ No newline at end of file
@@ -1,49 +1,371 @@
+import os
+import re
+import json
+import time
+import heapq
+import argparse
+import functools
 import docx
 import jieba
+import numpy as np
+import pandas as pd
 from wordcloud import WordCloud
 from collections import Counter
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import freeze_support
+from artifact_cache import file_digest
+from token_store import TokenStore, csv_column_key, dataset_key, default_store_dir, filter_tokens, iter_csv_column
+
+# 词云样式（单图与批量渲染共用）
+WORDCLOUD_SETTINGS = {
+    'width': 1200,
+    'height': 800,
+    'background_color': 'white',
+    'max_words': 200,
+}
 
 def read_docx(file_path):
     doc = docx.Document(file_path)
     return "\n".join([para.text for para in doc.paragraphs])
 
+def read_document(file_path):
+    """读取 docx 或 txt 文档（txt 先按 utf-8，失败再按 gbk 解码）"""
+    if file_path.lower().endswith('.docx'):
+        return read_docx(file_path)
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    try:
+        return raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return raw.decode('gbk', errors='ignore')
+
 def load_stopwords(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         return set(line.strip() for line in f)
 
 def process_text(text, stopwords):
-    words = jieba.lcut(text)
-    return [word for word in words if len(word) > 1 
-            and word not in stopwords 
-            and not word.isspace()]
+    # 长度大于1、非停用词、非空白（规则定义在 token_store.FILTERS['wordcloud']）
+    return filter_tokens(jieba.lcut(text), 'wordcloud', stopwords)
 
 def generate_wordcloud(word_freq, font_path):
-    wc = WordCloud(
-        font_path=font_path,
-        width=1200,
-        height=800,
-        background_color='white',
-        max_words=200
-    )
+    import matplotlib.pyplot as plt  # 只有交互显示时才需要 matplotlib
+    wc = WordCloud(font_path=font_path, **WORDCLOUD_SETTINGS)
     wc.generate_from_frequencies(word_freq)
     plt.figure(figsize=(12, 8))
     plt.imshow(wc, interpolation='bilinear')
     plt.axis('off')
     plt.show()
+
+# --- 批量词频统计（多进程 map-reduce） ---
+
+def find_documents(input_dir, extensions=('.docx', '.txt')):
+    """递归查找目录下的 docx/txt 文档（跳过 Word 的 ~$ 临时文件），按路径排序"""
+    paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(extensions) and not name.startswith('~$'):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+def prune_counter(counter, capacity):
+    """
+    Misra-Gries 可合并摘要：词数超过 capacity 时，所有计数减去第 capacity+1 大的计数并丢弃非正值。
+    这样最多保留 capacity 个词，每个词的计数至多被低估 总词数/(capacity+1)，
+    出现频率高于该值的高频词一定保留；词表不超过 capacity 时计数是精确的。
+    """
+    if len(counter) <= capacity:
+        return counter
+    threshold = heapq.nlargest(capacity + 1, counter.values())[-1]
+    return Counter({word: count - threshold for word, count in counter.items() if count > threshold})
+
+# 子进程中的停用词与词表容量，由 _init_worker 在每个进程启动时设置一次
+_worker_stopwords = None
+_worker_capacity = None
+
+def _init_worker(stopwords_path, capacity):
+    global _worker_stopwords, _worker_capacity
+    _worker_stopwords = load_stopwords(stopwords_path)
+    _worker_capacity = capacity
+
+def _count_documents(paths):
+    """map：统计一批文档的词频，返回 (Counter 分片, 成功文档数, 失败文档列表)"""
+    shard = Counter()
+    done, failed = 0, []
+    for path in paths:
+        try:
+            shard.update(process_text(read_document(path), _worker_stopwords))
+            done += 1
+        except Exception as e:
+            failed.append((path, str(e)))
+        # 分片内也限制词表，内存与文档数量无关
+        if len(shard) > 2 * _worker_capacity:
+            shard = prune_counter(shard, _worker_capacity)
+    return prune_counter(shard, _worker_capacity), done, failed
+
+def count_documents(paths, stopwords_path, workers=None, capacity=50000, batch_size=32):
+    """
+    多进程统计多个文档的词频：每个任务处理 batch_size 个文档得到一个 Counter 分片，
+    主进程边接收边合并（reduce）。分片和合并结果都用 prune_counter 限制在 capacity 个词以内。
+    返回合并后的 Counter。
+    """
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    total = Counter()
+    done, failed = 0, []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(stopwords_path, capacity)) as executor:
+        for i, (shard, shard_done, shard_failed) in enumerate(executor.map(_count_documents, batches), 1):
+            total.update(shard)
+            if len(total) > 2 * capacity:
+                total = prune_counter(total, capacity)
+            done += shard_done
+            failed.extend(shard_failed)
+            print(f"\r📊 已统计 {done}/{len(paths)} 个文档（{i}/{len(batches)} 批）", end='', flush=True)
+    print()
+    for path, error in failed:
+        print(f"⚠️ 读取失败，已跳过: {path}（{error}）")
+    return prune_counter(total, capacity)
+
+# --- 从共用的分词结果存储统计（与 LDA、词共现共用，不重复分词） ---
+
+def _read_documents(paths):
+    """逐个读取文档，读取失败的跳过（与 count_documents 一致，不当作空文档）"""
+    for path in paths:
+        try:
+            yield read_document(path)
+        except Exception as e:
+            print(f"⚠️ 读取失败，已跳过: {path}（{e}）")
+
+def count_documents_from_store(paths, stopwords_path, store_dir=None, workers=None, capacity=50000):
+    """
+    通过分词结果存储统计多个文档的词频：文档内容和停用词不变时直接读取已保存的分词结果，
+    否则多进程分词并保存。store_dir 为 None 时不保存。
+    返回 Counter（次数相同的词按首次出现顺序），与 count_documents 一样用 prune_counter 限制在 capacity 个词以内。
+    """
+    readable, digests = [], []
+    for path in paths:
+        try:
+            digests.append(file_digest(path))
+            readable.append(path)
+        except OSError as e:
+            print(f"⚠️ 读取失败，已跳过: {path}（{e}）")
+    key = dataset_key('documents', digests)
+    corpus = TokenStore(store_dir, workers=workers).tokens(key, lambda: _read_documents(readable),
+                                                           'wordcloud', stopwords_path)
+    return prune_counter(Counter(dict(zip(corpus.vocab, corpus.word_counts().tolist()))), capacity)
+
+def group_word_counts(corpus, groups):
+    """
+    由分词结果按组统计词频。groups 为 group_rows 的结果 [(组名, 文档序号)]，
+    返回 [(组名, 文档数, Counter)]，Counter 中次数相同的词按组内首次出现顺序，与逐条统计一致。
+    """
+    doc_group = np.full(len(corpus), -1, dtype=np.int64)
+    for index, (_, rows) in enumerate(groups):
+        doc_group[rows] = index
+    token_group = np.repeat(doc_group, corpus.lengths)
+    ids = np.asarray(corpus.ids, dtype=np.int64)
+    in_group = token_group >= 0
+    # 以 (组, 词) 为键只排序一次：键按组连续排列，再按组切开
+    keys = token_group[in_group] * len(corpus.vocab) + ids[in_group]
+    unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    bounds = np.searchsorted(unique // len(corpus.vocab), np.arange(len(groups) + 1))
+    result = []
+    for index, (name, rows) in enumerate(groups):
+        part = slice(bounds[index], bounds[index + 1])
+        order = np.argsort(first[part])
+        words = (unique[part] % len(corpus.vocab))[order].tolist()
+        result.append((name, len(rows), Counter(dict(zip((corpus.vocab[i] for i in words),
+                                                         counts[part][order].tolist())))))
+    return result
+
+# --- 批量渲染（无界面服务器） ---
+
+class _CachedImageFont:
+    """
+    替换 wordcloud 模块引用的 PIL.ImageFont：布局时每尝试一个字号都会重新加载字体文件，
+    这里同一字体和字号只加载一次，其余属性（如 TransposedFont）照常转发
+    """
+
+    def __init__(self, image_font):
+        self._image_font = image_font
+        self.truetype = functools.lru_cache(maxsize=None)(image_font.truetype)
+
+    def __getattr__(self, name):
+        return getattr(self._image_font, name)
+
+# 子进程中的共享资源，由 _init_renderer 在每个进程启动时创建一次
+_renderer = None
+
+def _init_renderer(font_path, mask_path, stopwords_path, settings):
+    global _renderer
+    import wordcloud.wordcloud as wordcloud_module
+    if not isinstance(wordcloud_module.ImageFont, _CachedImageFont):
+        wordcloud_module.ImageFont = _CachedImageFont(wordcloud_module.ImageFont)
+    mask = None
+    if mask_path:
+        from PIL import Image
+        mask = np.array(Image.open(mask_path).convert('L'))
+    _renderer = {
+        # 同一个 WordCloud 对象重复生成不同词频，字体和遮罩只加载一次
+        'wordcloud': WordCloud(font_path=font_path, mask=mask, **settings),
+        'stopwords': load_stopwords(stopwords_path),
+    }
+
+def _safe_filename(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(name)).strip('_') or 'empty'
+
+def _render_texts(name, texts, output_dir, formats):
+    """分词统计一组文本后渲染词云"""
+    word_counts = Counter()
+    for text in texts:
+        word_counts.update(process_text(text, _renderer['stopwords']))
+    return _render_group(name, len(texts), word_counts, output_dir, formats)
+
+def _render_group(name, documents, word_counts, output_dir, formats):
+    """按词频渲染一组的词云，返回清单条目"""
+    start = time.perf_counter()
+    entry = {'name': name, 'documents': documents, 'tokens': sum(word_counts.values()), 'files': {}}
+    if not word_counts:
+        entry['skipped'] = '没有可用的词'
+        return entry
+
+    wc = _renderer['wordcloud']
+    wc.generate_from_frequencies(dict(word_counts.most_common(wc.max_words)))
+    base = os.path.join(output_dir, _safe_filename(name))
+    if 'png' in formats:
+        wc.to_file(base + '.png')
+        entry['files']['png'] = base + '.png'
+    if 'svg' in formats:
+        with open(base + '.svg', 'w', encoding='utf-8') as f:
+            f.write(wc.to_svg())
+        entry['files']['svg'] = base + '.svg'
+    entry['top_words'] = word_counts.most_common(10)
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+def _grouped(csv_path, text_column, group_by, month_column):
+    """读取文本列和分组列（去除空文本，行号从0连续编号），逐组产出 (组名, 组内各行)"""
+    usecols = [text_column, *group_by] + ([month_column] if month_column else [])
+    df = pd.read_csv(csv_path, usecols=list(dict.fromkeys(usecols)), dtype={text_column: str})
+    df = df[df[text_column].notna()].reset_index(drop=True)
+    keys = list(group_by)
+    if month_column:
+        df['month'] = pd.to_datetime(df[month_column], errors='coerce').dt.strftime('%Y-%m')
+        keys.append('month')
+    if not keys:
+        yield 'all', df
+        return
+    for values, group in df.groupby(keys, dropna=False):
+        values = values if isinstance(values, tuple) else (values,)
+        yield '_'.join(f'{key}={value}' for key, value in zip(keys, values)), group
+
+def group_texts(csv_path, text_column='content', group_by=(), month_column=None):
+    """
+    按列分组文本（如主题、平台），month_column 指定日期列时另按月份分组。
+    返回 [(组名, 文本列表)]；不指定分组列时整个文件为一组。
+    """
+    return [(name, group[text_column].tolist())
+            for name, group in _grouped(csv_path, text_column, group_by, month_column)]
+
+def group_rows(csv_path, text_column='content', group_by=(), month_column=None):
+    """同 group_texts，但返回 [(组名, 文档序号数组)]，序号与 iter_csv_column 产出的文本一一对应"""
+    return [(name, group.index.to_numpy())
+            for name, group in _grouped(csv_path, text_column, group_by, month_column)]
+
+def render_wordclouds(groups, output_dir, font_path, stopwords_path, mask_path=None,
+                      formats=('png',), workers=None, settings=None):
+    """
+    多进程批量渲染词云：每个进程只加载一次字体、遮罩和停用词，直接写出 PNG/SVG，
+    不使用 matplotlib 显示。生成的文件和统计写入 output_dir/manifest.json，返回清单。
+    groups 的元素为 (组名, 文本列表)（在子进程中分词统计），
+    或 group_word_counts 给出的 (组名, 文档数, Counter)（已统计好，直接渲染）。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    settings = {**WORDCLOUD_SETTINGS, **(settings or {})}
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer,
+                             initargs=(font_path, mask_path, stopwords_path, settings)) as executor:
+        futures = [executor.submit(_render_texts if len(group) == 2 else _render_group, *group, output_dir, formats)
+                   for group in groups]
+        for i, future in enumerate(as_completed(futures), 1):
+            entries.append(future.result())
+            print(f"\r🎨 已渲染 {i}/{len(futures)} 个词云", end='', flush=True)
+    print()
+
+    entries.sort(key=lambda entry: entry['name'])
+    manifest = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'font_path': font_path,
+        'mask_path': mask_path,
+        'settings': settings,
+        'formats': list(formats),
+        'wordclouds': entries,
+    }
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"✅ 共生成 {sum(1 for entry in entries if entry['files'])} 个词云，清单已保存: {manifest_path}")
+    return manifest
+
 if __name__ == "__main__":
+    freeze_support() # 用于在Windows多进程环境下防止递归创建进程
+
     # 配置参数（需要根据实际情况修改路径）
     doc_path = "/Volumes/ZimingYe/Python/input.docx"        # Word文档路径
     stopwords_path = "/Volumes/ZimingYe/Python/cn_all_stopwords.txt"  # 停用词文件路径
     font_path = "/Volumes/ZimingYe/Python/Simhei.ttf"       # 中文字体文件路径
-    
-    # 文本处理流程
-    text = read_docx(doc_path)
-    stopwords = load_stopwords(stopwords_path)
-    filtered_words = process_text(text, stopwords)  # 正确在此定义变量
-    
+
+    parser = argparse.ArgumentParser(description='中文词云')
+    parser.add_argument('--doc', default=doc_path, help='单个 docx/txt 文档路径')
+    parser.add_argument('--input-dir', help='批量模式：统计该目录下（递归）所有 docx/txt 文档')
+    parser.add_argument('--stopwords', default=stopwords_path, help='停用词文件路径')
+    parser.add_argument('--font', default=font_path, help='中文字体文件路径')
+    parser.add_argument('--workers', type=int, default=None, help='批量模式的进程数，默认为CPU核数')
+    parser.add_argument('--capacity', type=int, default=50000, help='批量模式最多保留的词数（高频词摘要大小）')
+    # 批量渲染：按列分组的CSV（如LDA结果的 topic、平台、日期列），每组一张词云，写出文件而不显示
+    parser.add_argument('--csv', help='批量渲染模式：输入CSV')
+    parser.add_argument('--text-column', default='content', help='文本列名')
+    parser.add_argument('--group-by', nargs='*', default=[], help='分组列，如 topic platform')
+    parser.add_argument('--month-column', help='日期列，指定时另按月份分组')
+    parser.add_argument('--mask', help='遮罩图片路径')
+    parser.add_argument('--formats', nargs='+', choices=['png', 'svg'], default=['png'], help='输出格式')
+    parser.add_argument('--output-dir', default='wordclouds', help='批量渲染的输出目录')
+    # 分词结果存储：与 LDA+Sentiment.py、词共现网络.py 共用，同一数据不重复分词
+    parser.add_argument('--token-store', help='分词结果存储目录；--csv 模式默认为输入文件同目录下的 .token_store，'
+                                              '--input-dir 模式只在指定时使用')
+    parser.add_argument('--no-token-store', action='store_true', help='不使用分词结果存储，直接分词')
+    args = parser.parse_args()
+    use_store = not args.no_token_store
+
+    if args.csv:
+        if use_store:
+            store = TokenStore(args.token_store or default_store_dir(args.csv), workers=args.workers)
+            corpus = store.tokens(csv_column_key(args.csv, args.text_column),
+                                  lambda: iter_csv_column(args.csv, args.text_column), 'wordcloud', args.stopwords)
+            groups = group_word_counts(corpus, group_rows(args.csv, args.text_column, args.group_by, args.month_column))
+        else:
+            groups = group_texts(args.csv, args.text_column, args.group_by, args.month_column)
+        print(f"📁 共 {len(groups)} 组文本")
+        render_wordclouds(groups, args.output_dir, args.font, args.stopwords, mask_path=args.mask,
+                          formats=args.formats, workers=args.workers)
+        raise SystemExit
+
+    if args.input_dir:
+        paths = find_documents(args.input_dir)
+        print(f"📁 找到 {len(paths)} 个文档")
+        if use_store and args.token_store:
+            # 批量模式：读取（或多进程生成）共用的分词结果统计词频
+            word_counts = count_documents_from_store(paths, args.stopwords, args.token_store,
+                                                     workers=args.workers, capacity=args.capacity)
+        else:
+            # 批量模式：多进程分词并合并词频分片
+            word_counts = count_documents(paths, args.stopwords, workers=args.workers, capacity=args.capacity)
+    else:
+        # 文本处理流程
+        text = read_document(args.doc)
+        stopwords = load_stopwords(args.stopwords)
+        filtered_words = process_text(text, stopwords)  # 正确在此定义变量
+        word_counts = Counter(filtered_words)
+
     # 词云生成
-    word_counts = Counter(filtered_words)
     top_words = dict(word_counts.most_common(200))
-    generate_wordcloud(top_words, font_path)
- 
\ No newline at end of file
+    generate_wordcloud(top_words, args.font)
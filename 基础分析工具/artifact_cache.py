@@ -0,0 +1,155 @@
+"""
+按内容寻址的中间结果缓存
+
+每个缓存条目是缓存目录下的一个子目录 <阶段>-<键>，键由输入数据的哈希和影响该阶段结果的参数
+共同计算得到：输入数据、停用词或参数不变时直接复用，任何一项变化都会得到新的键并重新计算。
+条目先写入临时目录，完成后再原子地重命名，中途失败不会留下不完整的缓存。
+
+用法:
+    python artifact_cache.py <缓存目录> list
+    python artifact_cache.py <缓存目录> evict [--stage 阶段] [--key 键前缀] [--older-than 天数] [--all]
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+META_FILENAME = 'meta.json'
+
+
+def file_digest(path, block_size=1 << 20, size=None):
+    """文件内容的 SHA-256；指定 size 时只计算前 size 个字节（用于确认文件只是在末尾追加）"""
+    digest = hashlib.sha256()
+    remaining = size
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """由任意可JSON序列化的部分（哈希、参数字典等）计算缓存键"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    """缓存目录：查找、写入、列出和清理条目"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, stage, key):
+        return os.path.join(self.root, f'{stage}-{key[:16]}')
+
+    def lookup(self, stage, key):
+        """命中时返回条目目录，否则返回 None"""
+        entry_dir = self.path(stage, key)
+        meta_path = os.path.join(entry_dir, META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('key') != key:
+                return None
+        return entry_dir
+
+    @contextmanager
+    def store(self, stage, key, params=None):
+        """
+        写入条目：在 with 块中向返回的临时目录写文件，正常结束后才登记为缓存。
+            with cache.store('model', key, params) as entry_dir:
+                lda_model.save(os.path.join(entry_dir, 'lda.model'))
+        """
+        tmp_dir = tempfile.mkdtemp(prefix=f'.{stage}-', dir=self.root)
+        try:
+            yield tmp_dir
+            meta = {'stage': stage, 'key': key, 'params': params or {}, 'created': time.time()}
+            with open(os.path.join(tmp_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+            entry_dir = self.path(stage, key)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+    def entries(self):
+        """列出所有条目的元数据（含目录和占用字节数），按创建时间排序"""
+        result = []
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            meta_path = os.path.join(entry_dir, META_FILENAME)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['path'] = entry_dir
+            meta['size'] = sum(os.path.getsize(os.path.join(dirpath, filename))
+                               for dirpath, _, filenames in os.walk(entry_dir) for filename in filenames)
+            result.append(meta)
+        return sorted(result, key=lambda meta: meta['created'])
+
+    def evict(self, stage=None, key_prefix=None, older_than=None):
+        """
+        删除满足全部条件的条目，条件均为 None 时清空缓存。
+        older_than: 秒数，只删除创建时间早于此的条目。返回被删除的条目列表。
+        """
+        now = time.time()
+        removed = []
+        for meta in self.entries():
+            if stage is not None and meta['stage'] != stage:
+                continue
+            if key_prefix is not None and not meta['key'].startswith(key_prefix):
+                continue
+            if older_than is not None and now - meta['created'] < older_than:
+                continue
+            shutil.rmtree(meta['path'])
+            removed.append(meta)
+        return removed
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f}{unit}'
+        size /= 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='查看或清理中间结果缓存')
+    parser.add_argument('cache_dir', help='缓存目录')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='列出缓存条目')
+    evict_parser = subparsers.add_parser('evict', help='删除缓存条目')
+    evict_parser.add_argument('--stage', help='只删除该阶段的条目')
+    evict_parser.add_argument('--key', help='只删除键以此开头的条目')
+    evict_parser.add_argument('--older-than', type=float, help='只删除早于此天数创建的条目')
+    evict_parser.add_argument('--all', action='store_true', help='清空整个缓存')
+    args = parser.parse_args()
+
+    cache = ArtifactCache(args.cache_dir)
+    if args.command == 'list':
+        entries = cache.entries()
+        for meta in entries:
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['created']))
+            print(f"{meta['stage']:<10} {meta['key'][:16]}  {created}  {_format_size(meta['size']):>9}  "
+                  f"{json.dumps(meta['params'], ensure_ascii=False)}")
+        print(f"共 {len(entries)} 个条目，{_format_size(sum(meta['size'] for meta in entries))}")
+    else:
+        if not (args.all or args.stage or args.key or args.older_than is not None):
+            parser.error('evict 需要指定 --stage、--key、--older-than 或 --all')
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        removed = cache.evict(stage=args.stage, key_prefix=args.key, older_than=older_than)
+        print(f"🗑️ 已删除 {len(removed)} 个缓存条目")
@@ -0,0 +1,297 @@
+"""
+基于共现索引的快速主题一致性评估
+
+gensim 的 CoherenceModel 每计算一个模型都要用滑动窗口重新扫描全部分词文本，并统计全部词的出现。
+这里把一批主题（例如主题数扫描中全部模型的主题）一起计算：只扫描一次文本，并且只统计这批主题的
+主题词。文本按文档分块读取，每块把各文档/窗口包含哪些主题词存成稀疏的 上下文×主题词 布尔矩阵，
+切出每个主题的列做一次矩阵乘法，累加到该主题的共现计数后即丢弃。内存只与块大小和主题词数有关，
+与语料大小和词典大小无关，分词文本可以是从磁盘逐行读取的流（见 LDA+Sentiment.TokenStream）。
+
+支持的一致性指标（与 gensim 定义一致）:
+    c_v     滑动窗口 110，NPMI 间接余弦相似度
+    c_npmi  滑动窗口 10，NPMI
+    u_mass  文档级共现，对数条件概率
+
+可按比例抽样文档以加快计算，并通过对文档的泊松自助法（bootstrap）给出一致性的标准误和95%置信区间。
+
+    python coherence_index.py --check   使用 fixtures 中的评论样例校验与 CoherenceModel 的一致性
+"""
+
+import os
+
+import numpy as np
+import scipy.sparse as sps
+
+EPSILON = 1e-12
+
+# 指标 -> (上下文类型, 窗口大小)
+MEASURES = {
+    'c_v': ('window', 110),
+    'c_npmi': ('window', 10),
+    'u_mass': ('document', None),
+}
+
+# 每块读取的词数（按整篇文档划分）；c_v 的每个主题词最多展开为 110 个窗口，块越大越快、内存越多
+CHUNK_TOKENS = 1 << 17
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class CooccurrenceIndex:
+    """共现索引：对一批主题只分块扫描一次分词文本，只统计这批主题的主题词之间的共现"""
+
+    def __init__(self, tokenized_texts, dictionary, sample_rate=None, seed=42, chunk_tokens=CHUNK_TOKENS):
+        """
+        tokenized_texts: 可重复迭代的分词文本（列表或逐行读取的流），每次打分遍历一次，不整体载入内存
+        dictionary: gensim Dictionary，主题词编号与其一致
+        sample_rate: 文档抽样比例 (0, 1]，None 表示使用全部文档
+        chunk_tokens: 每块读取的词数
+        """
+        if sample_rate is not None and not 0 < sample_rate <= 1:
+            raise ValueError(f"抽样比例必须在 (0, 1] 之间: {sample_rate}")
+        self.tokenized_texts = tokenized_texts
+        self.dictionary = dictionary
+        self.sample_rate = sample_rate
+        self.seed = seed
+        self.chunk_tokens = chunk_tokens
+
+    def _chunks(self, token2local):
+        """按块产出 (各文档的主题词局部编号, 文档长度)；非主题词保留位置记为-1，窗口划分与 gensim 一致"""
+        rng = np.random.default_rng(self.seed)
+        ids_parts, lengths, size = [], [], 0
+        self.total_docs = 0
+        for text in self.tokenized_texts:
+            self.total_docs += 1
+            if self.sample_rate is not None and rng.random() >= self.sample_rate:
+                continue
+            ids_parts.append(np.fromiter((token2local.get(w, -1) for w in text), dtype=np.int64, count=len(text)))
+            lengths.append(len(text))
+            size += len(text)
+            if size >= self.chunk_tokens:
+                yield np.concatenate(ids_parts), np.array(lengths, dtype=np.int64)
+                ids_parts, lengths, size = [], [], 0
+        if lengths:
+            yield np.concatenate(ids_parts), np.array(lengths, dtype=np.int64)
+
+    @staticmethod
+    def _context_matrix(tokens, doc_lengths, num_words, context, window_size):
+        """
+        一块文档的 (上下文×主题词 的 CSC 布尔矩阵, 每个上下文所属文档在块内的编号)。
+        tokens 为主题词局部编号（-1 为其他词），num_words 为主题词数
+        """
+        num_docs = len(doc_lengths)
+        doc_of_token = np.repeat(np.arange(num_docs), doc_lengths)
+        doc_starts = np.concatenate([[0], np.cumsum(doc_lengths)[:-1]])
+        present = tokens >= 0
+        word_ids = tokens[present]
+        docs = doc_of_token[present]
+
+        if context == 'document':
+            num_contexts = num_docs
+            rows = docs
+            context_doc = np.arange(num_docs)
+        else:
+            # 长度不足窗口的文档视为一个窗口
+            windows_per_doc = np.maximum(1, doc_lengths - window_size + 1)
+            window_starts = np.concatenate([[0], np.cumsum(windows_per_doc)[:-1]])
+            num_contexts = int(windows_per_doc.sum())
+            positions = np.flatnonzero(present) - doc_starts[docs]
+            lo = np.maximum(0, positions - window_size + 1)
+            # 与 gensim 的 WordOccurrenceAccumulator 保持一致：窗口滑动时左边缘的词被直接移除，
+            # 即使窗口内还有它的其他出现。因此第 p 个词从窗口 lo 起算，持续到同一文档中
+            # 位置不小于 lo 的该词首次出现处为止（正确的滑动窗口应持续到 p）。
+            # 这只涉及同一个词的各次出现，所以只保留主题词不影响结果
+            order = np.lexsort((positions, word_ids, docs))
+            sorted_keys = docs[order] * num_words + word_ids[order]
+            group = np.concatenate([[0], np.cumsum(sorted_keys[1:] != sorted_keys[:-1])])
+            stride = int(doc_lengths.max()) + 1
+            sorted_codes = group * stride + positions[order]
+            group_of = np.empty_like(group)
+            group_of[order] = group
+            first_after = order[np.searchsorted(sorted_codes, group_of * stride + lo)]
+            hi = np.minimum(positions[first_after], windows_per_doc[docs] - 1)
+            spans = hi - lo + 1
+            owner = np.repeat(np.arange(len(positions)), spans)
+            within = np.arange(int(spans.sum())) - np.repeat(np.cumsum(spans) - spans, spans)
+            rows = window_starts[docs[owner]] + lo[owner] + within
+            word_ids = word_ids[owner]
+            context_doc = np.repeat(np.arange(num_docs), windows_per_doc)
+
+        matrix = sps.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, word_ids)),
+            shape=(num_contexts, num_words)
+        )
+        matrix.data[:] = 1.0  # 同一上下文中重复出现只计一次
+        return matrix.tocsc(), context_doc
+
+    def _topic_ids(self, topics):
+        topic_ids = []
+        for topic in topics:
+            ids = [self.dictionary.token2id[w] if isinstance(w, str) else int(w) for w in topic]
+            topic_ids.append(np.array(ids, dtype=np.int64))
+        return topic_ids
+
+    def score_many(self, topic_sets, measure='c_v', n_bootstrap=None):
+        """
+        一次扫描文本，计算多组主题（如扫描中的各个模型）的一致性，返回与 topic_sets 对应的结果列表。
+        每组主题为主题词列表（词或词编号）的列表；结果字典见 score。
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"不支持的一致性指标: {measure}，可选 {list(MEASURES)}")
+        context, window_size = MEASURES[measure]
+        if n_bootstrap is None:
+            n_bootstrap = 30 if self.sample_rate is not None else 0
+
+        # 全部主题词（各组的并集）编为局部编号 0..U-1，每个主题记录其词的局部编号
+        topic_ids = [self._topic_ids(topics) for topics in topic_sets]
+        uniq = np.unique(np.concatenate([ids for ids_list in topic_ids for ids in ids_list]))
+        token2local = {self.dictionary[int(word_id)]: local for local, word_id in enumerate(uniq)}
+        local = [np.searchsorted(uniq, ids) for ids_list in topic_ids for ids in ids_list]
+
+        # 第 0 份为原始计数，其余为自助法的各份重抽样；同一文档的所有上下文共享权重
+        replicates = 1 + n_bootstrap
+        counts = [np.zeros((replicates, len(idx), len(idx))) for idx in local]
+        num_contexts = np.zeros(replicates)
+        boot_rng = np.random.default_rng(self.seed)
+        self.num_docs = 0
+        for tokens, doc_lengths in self._chunks(token2local):
+            self.num_docs += len(doc_lengths)
+            matrix, context_doc = self._context_matrix(tokens, doc_lengths, len(uniq), context, window_size)
+            doc_weights = np.ones((replicates, len(doc_lengths)))
+            doc_weights[1:] = boot_rng.poisson(1.0, (n_bootstrap, len(doc_lengths)))
+            context_weights = doc_weights[:, context_doc]
+            num_contexts += context_weights.sum(axis=1)
+            for idx, topic_counts in zip(local, counts):
+                sub = matrix[:, idx]
+                topic_counts[0] += (sub.T @ sub).toarray()
+                for b in range(1, replicates):
+                    topic_counts[b] += (sub.T @ sub.multiply(context_weights[b][:, None])).toarray()
+        if self.num_docs == 0:
+            raise ValueError("没有可用于计算一致性的文档。")
+
+        results, start = [], 0
+        for ids_list in topic_ids:
+            set_counts = counts[start:start + len(ids_list)]
+            start += len(ids_list)
+            per_topic = np.array([_confirm(measure, topic_counts[0], num_contexts[0])
+                                  for topic_counts in set_counts])
+            result = {
+                'measure': measure,
+                'coherence': float(np.mean(per_topic)),
+                'per_topic': per_topic.tolist(),
+                'num_docs': self.num_docs,
+                'total_docs': self.total_docs,
+            }
+            if n_bootstrap > 0:
+                boot = np.array([np.mean([_confirm(measure, topic_counts[b], num_contexts[b])
+                                          for topic_counts in set_counts]) for b in range(1, replicates)])
+                result['stderr'] = float(np.std(boot, ddof=1))
+                result['ci95'] = (float(np.percentile(boot, 2.5)), float(np.percentile(boot, 97.5)))
+            results.append(result)
+        return results
+
+    def score(self, topics, measure='c_v', n_bootstrap=None):
+        """
+        计算一组主题的一致性。topics 为主题词列表（词或词编号）的列表。
+        返回字典：coherence（总体均值）、per_topic、num_docs、total_docs，
+        抽样或指定 n_bootstrap 时另含 stderr 与 ci95。
+        """
+        return self.score_many([topics], measure=measure, n_bootstrap=n_bootstrap)[0]
+
+    def score_models(self, lda_models, measure='c_v', topn=20, n_bootstrap=None):
+        """一次扫描文本计算多个LDA模型的一致性，主题词取每个主题概率最高的 topn 个词（与 CoherenceModel 一致）"""
+        topic_sets = [[np.argsort(-topic)[:topn] for topic in lda_model.get_topics()] for lda_model in lda_models]
+        return self.score_many(topic_sets, measure=measure, n_bootstrap=n_bootstrap)
+
+    def score_model(self, lda_model, measure='c_v', topn=20, n_bootstrap=None):
+        """计算单个LDA模型的一致性（见 score_models）"""
+        return self.score_models([lda_model], measure=measure, topn=topn, n_bootstrap=n_bootstrap)[0]
+
+
+def _npmi(counts, num_contexts):
+    """由共现计数矩阵计算两两 NPMI（对角线为词自身的出现次数）"""
+    joint = counts / num_contexts
+    marginal = np.diag(joint)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmi = np.log((joint + EPSILON) / np.outer(marginal, marginal))
+        npmi = pmi / -np.log(joint + EPSILON)
+    return np.nan_to_num(npmi, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _confirm(measure, counts, num_contexts):
+    """由一个主题的主题词共现计数（按主题词顺序，对角线为出现次数）计算该主题的一致性"""
+    if measure == 'c_v':
+        # 单词 w' 的上下文向量与整个主题词集合的上下文向量的余弦相似度
+        vectors = _npmi(counts, num_contexts)
+        topic_vector = vectors.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims = vectors @ topic_vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(topic_vector))
+        return np.mean(sims)
+    if measure == 'c_npmi':
+        pairs = _npmi(counts, num_contexts)
+        off_diagonal = ~np.eye(len(counts), dtype=bool)
+        return np.mean(pairs[off_diagonal])
+    # u_mass: 每个词与排在它之前的词 log((D(w', w*) / N + eps) / (D(w*) / N))
+    pairs = counts / num_contexts
+    marginal = np.diag(pairs)
+    lower = np.tril_indices(len(counts), k=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.log((pairs[lower] + EPSILON) / marginal[lower[1]])
+    return np.mean(np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0))
+
+
+def load_fixture_texts(fixture_dir=FIXTURE_DIR):
+    """评论样例（lda_comments.csv 的 content 列）按 LDA 流程的规则分词，停用词为 lda_stopwords.txt"""
+    import csv
+    import jieba
+    from token_store import filter_tokens, load_stopwords
+    stopwords = load_stopwords(os.path.join(fixture_dir, 'lda_stopwords.txt'))
+    with open(os.path.join(fixture_dir, 'lda_comments.csv'), 'r', encoding='utf-8', newline='') as f:
+        return [filter_tokens(jieba.lcut(row['content']), 'lda', stopwords) for row in csv.DictReader(f)]
+
+
+def check_against_gensim(fixture_dir=FIXTURE_DIR, tolerance=1e-9):
+    """
+    在评论样例上训练几个主题数不同的模型，校验各指标与 CoherenceModel 一致（一次和分成很多小块扫描
+    结果相同），以及抽样时给出置信区间。返回最大绝对误差。
+    """
+    from gensim import corpora, models
+    from gensim.models import CoherenceModel
+
+    texts = load_fixture_texts(fixture_dir)
+    dictionary = corpora.Dictionary(texts)
+    corpus = [dictionary.doc2bow(text) for text in texts]
+    lda_models = [models.LdaModel(corpus, num_topics=k, id2word=dictionary, passes=5, random_state=42)
+                  for k in (3, 5)]
+
+    max_error = 0.0
+    for measure in MEASURES:
+        expected = np.array([CoherenceModel(model=lda_model, texts=texts, corpus=corpus, dictionary=dictionary,
+                                            coherence=measure, processes=1).get_coherence()
+                             for lda_model in lda_models])
+        for chunk_tokens in (CHUNK_TOKENS, 50):
+            index = CooccurrenceIndex(texts, dictionary, chunk_tokens=chunk_tokens)
+            scores = np.array([result['coherence'] for result in index.score_models(lda_models, measure)])
+            max_error = max(max_error, float(np.max(np.abs(scores - expected))))
+        if max_error > tolerance:
+            raise AssertionError(f"{measure} 与 CoherenceModel 的最大误差 {max_error:.3g} 超过容差 {tolerance:.0e}")
+
+    sampled = CooccurrenceIndex(texts, dictionary, sample_rate=0.5, chunk_tokens=50).score_model(lda_models[0])
+    low, high = sampled['ci95']
+    if not 0 < sampled['num_docs'] < sampled['total_docs'] == len(texts) or not low <= high or sampled['stderr'] <= 0:
+        raise AssertionError(f"抽样结果不符: {sampled}")
+    return max_error
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='基于共现索引的主题一致性评估')
+    parser.add_argument('--check', action='store_true', help='使用评论样例校验与 CoherenceModel 的一致性')
+    parser.add_argument('--tolerance', type=float, default=1e-9, help='允许的最大绝对误差')
+    args = parser.parse_args()
+
+    if args.check:
+        error = check_against_gensim(tolerance=args.tolerance)
+        print(f"✅ c_v、c_npmi、u_mass 均与 CoherenceModel 一致，最大绝对误差: {error:.3g}")
+    else:
+        parser.print_help()
@@ -0,0 +1,231 @@
+"""
+基于整数编号和稀疏矩阵的词共现统计
+
+词共现网络.py 原先对每个词及其 ±5 窗口在 Python 列表中查找目标词、累加到嵌套字典，
+只能处理 30 个左右的高频词。这里先把词映射为整数编号，对每个距离 d=1..window
+一次性取出所有相距 d 的词对，用稀疏矩阵累加计数，高频词数可以到数千。
+
+计数规则与原脚本一致：
+- 高频词按 Counter.most_common 的顺序（次数相同时按首次出现顺序）取前 K 个；
+- 同一文档内相距不超过 window 的两个不同的目标词记一次共现，
+  symmetric=True 时 (a, b) 与 (b, a) 都计数（原脚本的行为），False 时只计前词→后词；
+- 输出的边按高频词顺序排列（先按 Source，再按 Target）。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sps
+
+
+def encode_documents(token_lists, word2id=None):
+    """
+    把分词结果编码为整数编号。编号按首次出现顺序分配，可传入已有的 word2id 继续编号。
+    返回 (ids, doc_lengths, word2id)，ids 为所有文档首尾相接的编号数组。
+    """
+    word2id = {} if word2id is None else word2id
+    setdefault = word2id.setdefault
+    lengths = []
+    ids = []
+    for tokens in token_lists:
+        lengths.append(len(tokens))
+        ids.extend(setdefault(word, len(word2id)) for word in tokens)
+    return np.array(ids, dtype=np.int64), np.array(lengths, dtype=np.int64), word2id
+
+
+def word_counts(ids, num_words):
+    """各编号的出现次数"""
+    return np.bincount(ids, minlength=num_words)
+
+
+def top_k(counts, k):
+    """与 Counter.most_common(k) 顺序相同的前 k 个编号（次数相同按编号即首次出现顺序）"""
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    return order[:k]
+
+
+def cooccurrence_matrix(ids, doc_lengths, num_words, window=5, symmetric=True, targets=None):
+    """
+    统计窗口内共现次数，返回 CSR 稀疏矩阵。
+    targets 为 None 时统计全部词（num_words×num_words）；否则只统计这些编号，
+    矩阵行列按 targets 的顺序排列（len(targets)×len(targets)）。
+    """
+    if targets is not None:
+        # 非目标词映射为 -1，矩阵下标改为目标词的序号
+        index = np.full(num_words, -1, dtype=np.int64)
+        index[np.asarray(targets, dtype=np.int64)] = np.arange(len(targets))
+        local = index[ids] if len(ids) else ids
+        size = len(targets)
+    else:
+        local = ids
+        size = num_words
+    doc_of = np.repeat(np.arange(len(doc_lengths)), doc_lengths)
+
+    rows, cols = [], []
+    for d in range(1, window + 1):
+        if d >= len(local):
+            break
+        left, right = local[:-d], local[d:]
+        keep = (doc_of[:-d] == doc_of[d:]) & (left != right)
+        if targets is not None:
+            keep &= (left >= 0) & (right >= 0)
+        rows.append(left[keep])
+        cols.append(right[keep])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    if symmetric:
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+    matrix = sps.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(size, size))
+    return matrix.tocsr()  # 转换时合并重复项，即累加计数
+
+
+def edge_list(matrix, words):
+    """
+    把共现矩阵转为 [(Source, Target, count)]，按行、列顺序排列，只含 count>0 的边。
+    words 为与矩阵行列对应的词列表。数值转为 Python int，便于 csv 写出。
+    """
+    coo = matrix.tocoo()
+    order = np.lexsort((coo.col, coo.row))
+    return [(words[r], words[c], int(v))
+            for r, c, v in zip(coo.row[order], coo.col[order], coo.data[order]) if v > 0]
+
+
+def top_k_cooccurrence(token_lists, k=30, window=5, symmetric=True):
+    """
+    一步完成：编码、取前 k 个高频词并统计它们之间的共现。
+    返回 (target_words, matrix)，matrix 行列顺序与 target_words 一致。
+    """
+    ids, doc_lengths, word2id = encode_documents(token_lists)
+    vocab = list(word2id)
+    targets = top_k(word_counts(ids, len(vocab)), k)
+    matrix = cooccurrence_matrix(ids, doc_lengths, len(vocab), window=window, symmetric=symmetric, targets=targets)
+    return [vocab[i] for i in targets], matrix
+
+
+# --- 全部词的共现计数（按块 map-reduce） ---
+
+class CooccurrenceCounts:
+    """全部词的词频与共现计数（编号按首次出现顺序），可从中取任意 K 的高频词网络"""
+
+    def __init__(self, vocab, counts, matrix, symmetric=True):
+        self.vocab = vocab
+        self.counts = counts
+        self.matrix = matrix
+        self.symmetric = symmetric
+
+    def top_k(self, k):
+        """返回 (target_words, matrix)，与 top_k_cooccurrence 的结果相同"""
+        targets = top_k(self.counts, k)
+        return [self.vocab[i] for i in targets], self.matrix[targets][:, targets]
+
+    def edge_table(self, k):
+        """
+        前 k 个高频词之间的边表（顺序同 edge_list），列为 Source, Target, Weight, PMI, NPMI, LLR。
+        关联度的边缘分布取自全部词的共现矩阵，而不只是这 k 个词之间的计数。
+        """
+        targets = top_k(self.counts, k)
+        coo = self.matrix[targets][:, targets].tocoo()
+        order = np.lexsort((coo.col, coo.row))
+        rows, cols, weights = targets[coo.row[order]], targets[coo.col[order]], coo.data[order]
+        keep = weights > 0
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+        row_totals = np.asarray(self.matrix.sum(axis=1)).ravel()
+        col_totals = np.asarray(self.matrix.sum(axis=0)).ravel()
+        # 双向计数时每次共现被记了两次，折半后才是实际的观测次数（影响 LLR，不影响 PMI/NPMI）
+        scale = 0.5 if self.symmetric else 1.0
+        measures = association_measures(weights * scale, row_totals[rows] * scale,
+                                        col_totals[cols] * scale, self.matrix.sum() * scale)
+        return pd.DataFrame({
+            'Source': [self.vocab[i] for i in rows],
+            'Target': [self.vocab[i] for i in cols],
+            'Weight': weights,
+            **measures,
+        })
+
+
+def association_measures(pair_counts, row_totals, col_totals, total):
+    """
+    由共现次数和边缘次数按数组批量计算关联度，返回 {'PMI', 'NPMI', 'LLR'}：
+        PMI  = log(p(x,y) / (p(x) p(y)))
+        NPMI = PMI / -log p(x,y)，取值 [-1, 1]
+        LLR  = Dunning 对数似然比 G²（2×2 列联表），越大越不可能是偶然共现；
+               它不区分正负关联，需要时配合 NPMI>0 使用
+    """
+    from scipy.special import xlogy
+
+    k11 = np.asarray(pair_counts, dtype=np.float64)
+    row_totals = np.asarray(row_totals, dtype=np.float64)
+    col_totals = np.asarray(col_totals, dtype=np.float64)
+    total = float(total)
+    if total <= 0:
+        empty = np.zeros(0)
+        return {'PMI': empty, 'NPMI': empty, 'LLR': empty}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmi = np.log(k11 * total / (row_totals * col_totals))
+        joint = k11 / total
+        npmi = np.where(joint < 1, pmi / -np.log(joint), 1.0)
+
+    k12 = row_totals - k11
+    k21 = col_totals - k11
+    k22 = total - row_totals - col_totals + k11
+    observed = (k11, k12, k21, k22)
+    expected = (row_totals * col_totals, row_totals * (total - col_totals),
+                (total - row_totals) * col_totals, (total - row_totals) * (total - col_totals))
+    llr = np.zeros_like(k11)
+    for k, e in zip(observed, expected):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            llr += xlogy(k, k * total / np.where(e > 0, e, 1))
+    llr = np.maximum(2 * llr, 0)  # 消除浮点误差带来的微小负数
+    return {'PMI': pmi, 'NPMI': npmi, 'LLR': llr}
+
+
+def prune_edges(table, thresholds):
+    """按阈值过滤边表，thresholds 形如 {'Weight': 2, 'NPMI': 0.0, 'LLR': 3.84}，值为 None 的项不过滤"""
+    keep = np.ones(len(table), dtype=bool)
+    for column, minimum in thresholds.items():
+        if minimum is not None:
+            keep &= table[column].to_numpy() >= minimum
+    return table[keep].reset_index(drop=True)
+
+
+def _count_chunk(ids, lengths, num_words, window, symmetric):
+    """map：统计一块文档的共现（词编号已是全局编号，各块结果直接相加）"""
+    return cooccurrence_matrix(np.asarray(ids, dtype=np.int64), np.asarray(lengths, dtype=np.int64), num_words,
+                               window=window, symmetric=symmetric)
+
+
+def count_corpus(corpus, window=5, symmetric=True, workers=None, max_tokens=1 << 22):
+    """
+    由 token_store 中过滤后的分词结果统计全部词的词频和共现（词编号已按首次出现顺序分配），不重新分词。
+    语料按文档边界切成约 max_tokens 个词的块，交给子进程统计（map），主进程依次累加（reduce），
+    同时在途的块不超过 2×进程数。workers=1 时在本进程中逐块统计。返回 CooccurrenceCounts。
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    num_words = len(corpus.vocab)
+    matrix = sps.csr_matrix((num_words, num_words), dtype=np.int64)
+    chunks = ((corpus.ids[corpus.offsets[start]:corpus.offsets[end]], corpus.lengths[start:end])
+              for start, end in corpus.chunks(max_tokens))
+
+    if workers == 1:
+        for ids, lengths in chunks:
+            matrix = matrix + _count_chunk(ids, lengths, num_words, window, symmetric)
+    else:
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for ids, lengths in chunks:
+                # 内存映射的切片复制为普通数组后再交给子进程
+                pending.append(executor.submit(_count_chunk, np.array(ids), np.array(lengths), num_words,
+                                               window, symmetric))
+                if len(pending) >= 2 * workers:
+                    matrix = matrix + pending.popleft().result()
+            while pending:
+                matrix = matrix + pending.popleft().result()
+    return CooccurrenceCounts(list(corpus.vocab), corpus.word_counts().astype(np.int64), matrix,
+                              symmetric=symmetric)
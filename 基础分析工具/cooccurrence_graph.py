@@ -0,0 +1,104 @@
+"""
+词共现网络的图分析与导出
+
+由 cooccurrence.CooccurrenceCounts.edge_table 得到的边表构建 networkx 图，计算节点中心性并划分社区，
+再导出为 Gephi 等工具可直接打开的 GEXF / GraphML。所用算法在上万节点的网络上也能在可接受的时间内完成：
+- 度、加权度（strength）：线性时间；
+- PageRank：基于 scipy 稀疏矩阵的幂迭代；
+- 介数中心性：节点数超过 betweenness_samples 时随机抽样这么多个源点近似计算；
+- 社区：Louvain 算法（固定随机种子，结果可复现）。
+"""
+
+import os
+
+
+def build_graph(words, frequencies, table, weight='Weight', directed=False):
+    """
+    words / frequencies: 节点及其词频（所有高频词都作为节点，即使剪枝后没有边）
+    table: 边表（Source, Target, Weight 及关联度列），weight 指定作为边权的列，须全部为正数（见 check_weights）
+    """
+    import networkx as nx
+
+    check_weights(table[weight], weight)
+    graph = nx.DiGraph() if directed else nx.Graph()
+    for word, frequency in zip(words, frequencies):
+        graph.add_node(word, label=word, frequency=int(frequency))
+    measure_columns = [column for column in table.columns if column not in ('Source', 'Target')]
+    for row in table.to_dict('records'):
+        # 原始共现次数记为 count，weight 留给选定的边权
+        attributes = {('count' if column == 'Weight' else column.lower()): float(row[column])
+                      for column in measure_columns}
+        attributes['weight'] = float(row[weight])
+        graph.add_edge(row['Source'], row['Target'], **attributes)
+    return graph
+
+
+def check_weights(values, name='weight'):
+    """
+    边权须全部为正：介数中心性用 1/weight 作距离，PageRank 和 Louvain 也要求非负权重。
+    PMI / NPMI 可能为 0 或负数，作为边权时须在剪枝阈值中设置大于 0 的下限。
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    bad = ~(values > 0)  # 同时排除 NaN
+    if bad.any():
+        raise ValueError(f"边权列 {name} 有 {int(bad.sum())} 条边不是正数（最小值 {np.nanmin(values) if len(values) else ''}），"
+                         f"无法计算距离和中心性；请改用 Weight / LLR，或在剪枝阈值中为 {name} 设置大于 0 的下限")
+
+
+def analyze_graph(graph, betweenness_samples=500, seed=42):
+    """计算中心性和社区，写入节点属性；返回社区列表（按规模从大到小）"""
+    import networkx as nx
+
+    if graph.number_of_nodes() == 0:
+        return []
+    # 介数中心性按"距离"计算，共现越强距离越近
+    check_weights([data['weight'] for _, _, data in graph.edges(data=True)])
+    for _, _, data in graph.edges(data=True):
+        data['distance'] = 1.0 / data['weight']
+
+    strength = dict(graph.degree(weight='weight'))
+    pagerank = nx.pagerank(graph, weight='weight') if graph.number_of_edges() else {}
+    num_nodes = graph.number_of_nodes()
+    k = betweenness_samples if betweenness_samples and num_nodes > betweenness_samples else None
+    betweenness = nx.betweenness_centrality(graph, k=k, weight='distance', seed=seed)
+    communities = sorted(nx.community.louvain_communities(graph, weight='weight', seed=seed),
+                         key=len, reverse=True)
+    community_of = {node: index for index, members in enumerate(communities) for node in members}
+
+    for node, data in graph.nodes(data=True):
+        data['degree'] = int(graph.degree(node))
+        data['strength'] = float(strength[node])
+        data['pagerank'] = float(pagerank.get(node, 1.0 / num_nodes))
+        data['betweenness'] = float(betweenness[node])
+        data['community'] = int(community_of[node])
+    for _, _, data in graph.edges(data=True):
+        del data['distance']
+    return communities
+
+
+def node_table(graph):
+    """节点属性表，列名采用 Gephi 导入节点表时识别的 Id / Label"""
+    import pandas as pd
+
+    rows = [{'Id': node, 'Label': data.get('label', node),
+             **{key: value for key, value in data.items() if key != 'label'}}
+            for node, data in graph.nodes(data=True)]
+    return pd.DataFrame(rows)
+
+
+def export_graph(graph, output_base, formats=('gexf', 'graphml')):
+    """导出为 <output_base>.gexf / .graphml，返回写出的路径列表"""
+    import networkx as nx
+
+    writers = {'gexf': nx.write_gexf, 'graphml': nx.write_graphml}
+    paths = []
+    for fmt in formats:
+        if fmt not in writers:
+            raise ValueError(f"不支持的图格式: {fmt}（可选 {', '.join(writers)}）")
+        path = f'{output_base}.{fmt}'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        writers[fmt](graph, path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,146 @@
+"""
+批量情感打分 - 与 SnowNLP 情感模型兼容的向量化实现
+
+SnowNLP(text).sentiments 每次调用都会构建 BM25 对象并逐词在 Python 中累加对数概率。
+这里只加载一次 SnowNLP 自带的朴素贝叶斯情感模型（sentiment.marshal），把每个词的
+正负类对数概率差存成数组，整批文档用一次向量化求和完成打分。
+
+用法:
+    python fast_sentiment.py --check   使用回归样例校验与 SnowNLP 的一致性
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# 回归样例：文本与 SnowNLP 0.12.3 的参考得分
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sentiment_regression.csv')
+
+# 情感类别阈值，与原 extended_sentiment_analysis 一致
+POSITIVE_THRESHOLD = 0.7
+NEGATIVE_THRESHOLD = 0.3
+
+
+def snownlp_tokenize(text):
+    """与 SnowNLP 情感模块相同的预处理：SnowNLP分词 + 去除其内置停用词"""
+    from snownlp import seg, normal
+    return normal.filter_stop(seg.seg(text))
+
+
+class BatchSentimentScorer:
+    """将 SnowNLP 朴素贝叶斯情感模型转为数组形式并批量打分"""
+
+    def __init__(self, model_path=None):
+        from snownlp.classification.bayes import Bayes
+        if model_path is None:
+            import snownlp
+            model_path = os.path.join(os.path.dirname(snownlp.__file__), 'sentiment', 'sentiment.marshal')
+        bayes = Bayes()
+        bayes.load(model_path)
+        pos, neg = bayes.d['pos'], bayes.d['neg']
+
+        # 词 -> 编号；编号 len(vocab) 留给未登录词
+        vocab = sorted(set(pos.d) | set(neg.d))
+        self.word2id = {word: i for i, word in enumerate(vocab)}
+        pos_counts = np.array([pos.d.get(w, pos.none) for w in vocab] + [pos.none], dtype=np.float64)
+        neg_counts = np.array([neg.d.get(w, neg.none) for w in vocab] + [neg.none], dtype=np.float64)
+        # 每个词对 log P(pos|doc) - log P(neg|doc) 的贡献
+        self.log_ratio = (np.log(pos_counts) - np.log(pos.getsum())) - (np.log(neg_counts) - np.log(neg.getsum()))
+        self.prior = np.log(pos.getsum()) - np.log(neg.getsum())
+        self.oov_id = len(vocab)
+
+    def score_tokenized(self, docs):
+        """对已分词的文档批量打分，返回 0~1 的积极概率数组"""
+        lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+        get = self.word2id.get
+        oov = self.oov_id
+        ids = np.fromiter((get(w, oov) for doc in docs for w in doc), dtype=np.int64, count=int(lengths.sum()))
+        doc_index = np.repeat(np.arange(len(docs)), lengths)
+        logit = self.prior + np.bincount(doc_index, weights=self.log_ratio[ids], minlength=len(docs))
+        with np.errstate(over='ignore'):
+            return 1.0 / (1.0 + np.exp(-logit))
+
+    def score_texts(self, texts, tokenizer=snownlp_tokenize):
+        """对原始文本批量打分；无法处理的文本得分为 NaN"""
+        docs, failed = [], []
+        for i, text in enumerate(texts):
+            try:
+                # SnowNLP 对空字符串会抛出异常，这里同样视为无法处理
+                if not text:
+                    raise ValueError('空文本')
+                docs.append(tokenizer(text))
+            except Exception:
+                docs.append([])
+                failed.append(i)
+        scores = self.score_tokenized(docs)
+        scores[failed] = np.nan
+        return scores
+
+
+# 子进程中的打分器，由 _init_worker 在每个进程启动时加载一次
+_worker_scorer = None
+
+def _init_worker(model_path):
+    global _worker_scorer
+    _worker_scorer = BatchSentimentScorer(model_path)
+
+def _score_chunk(texts):
+    return _worker_scorer.score_texts(texts)
+
+
+def score_texts(texts, workers=1, chunk_size=5000, model_path=None):
+    """批量计算情感得分，workers>1 时按块分发到多个进程（分词是主要耗时）"""
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if not chunks:
+        return np.zeros(0, dtype=np.float64)
+    if workers <= 1:
+        scorer = BatchSentimentScorer(model_path)
+        parts = [scorer.score_texts(chunk) for chunk in tqdm(chunks, desc="情感打分")]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as executor:
+            parts = list(tqdm(executor.map(_score_chunk, chunks), total=len(chunks), desc="情感打分"))
+    return np.concatenate(parts)
+
+
+def sentiment_categories(scores):
+    """根据得分分类为 '积极', '中性', '消极'；得分为 NaN 的记为 '未知'"""
+    scores = np.asarray(scores, dtype=np.float64)
+    return np.select(
+        [np.isnan(scores), scores > POSITIVE_THRESHOLD, scores < NEGATIVE_THRESHOLD],
+        ['未知', '积极', '消极'],
+        default='中性'
+    )
+
+
+def check_against_snownlp(fixture_path=FIXTURE_PATH, tolerance=1e-6):
+    """使用回归样例校验批量打分与 SnowNLP 参考得分的一致性，返回最大绝对误差"""
+    fixture = pd.read_csv(fixture_path, keep_default_na=False)
+    scores = score_texts(fixture['text'].astype(str).tolist())
+    expected = pd.to_numeric(fixture['snownlp_sentiment'], errors='coerce').to_numpy()
+    # 参考得分为空表示 SnowNLP 本身无法处理该文本，批量打分也应返回 NaN
+    if not np.array_equal(np.isnan(scores), np.isnan(expected)):
+        raise AssertionError("无法处理的文本与 SnowNLP 不一致")
+    valid = ~np.isnan(expected)
+    max_error = float(np.max(np.abs(scores[valid] - expected[valid])))
+    if max_error > tolerance:
+        raise AssertionError(f"与 SnowNLP 的最大误差 {max_error:.3g} 超过容差 {tolerance:.0e}")
+    return max_error
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='与 SnowNLP 兼容的批量情感打分')
+    parser.add_argument('--check', action='store_true', help='使用回归样例校验与 SnowNLP 的一致性')
+    parser.add_argument('--fixture', default=FIXTURE_PATH, help='回归样例CSV（列 text, snownlp_sentiment）')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='允许的最大绝对误差')
+    args = parser.parse_args()
+
+    if args.check:
+        error = check_against_snownlp(args.fixture, args.tolerance)
+        print(f"✅ 与 SnowNLP 一致，最大绝对误差: {error:.3g}")
+    else:
+        parser.print_help()
@@ -0,0 +1,146 @@
+"""
+LDA 交互式可视化（pyLDAvis）的快速/延迟生成
+
+gensimvis.prepare(lda_model, corpus, dictionary) 会重新遍历整个语料统计词频、重新推断每篇文档的
+主题分布，并在完整词表上计算相关度和 MDS，词表很大时要跑很多分钟。快速模式直接复用流程中已有的
+统计量：
+
+- pyLDAvis 只用 文档-主题分布 与 文档长度 计算各主题的词数（topic_freq），因此只需传入一个
+  汇总后的“文档”即可得到相同的主题比例；
+- 词表只保留在任意 λ 下可能进入某主题前 R 个相关词、或默认视图前 R 个显著词的词，
+  这些候选词用 NumPy 在完整词表上一次算出，其余计算在很小的词表上完成；
+- 相关度计算使用多进程（n_jobs）。
+
+可视化输入也可以先保存为 npz，稍后单独生成 HTML:
+    python lda_vis.py <输出目录> [--jobs N] [--R 30]
+"""
+
+import os
+import json
+import argparse
+
+import numpy as np
+
+VIS_INPUTS_FILENAME = 'lda_vis_inputs.npz'
+VIS_HTML_FILENAME = 'lda_topics_visualization.html'
+
+
+def collect_vis_inputs(lda_model, dictionary, topic_freq):
+    """
+    汇总生成可视化所需的统计量。
+    topic_freq: 各主题的词数，即 文档-主题分布矩阵.T @ 文档长度
+    """
+    topic_term = lda_model.state.get_lambda()
+    topic_term = topic_term / topic_term.sum(axis=1, keepdims=True)
+    vocab = [dictionary[i] for i in range(len(dictionary))]
+    term_frequency = np.array([dictionary.cfs.get(i, 0) for i in range(len(dictionary))], dtype=np.float64)
+    return {
+        'topic_term_dists': topic_term.astype(np.float64),
+        'topic_freq': np.asarray(topic_freq, dtype=np.float64),
+        'vocab': np.array(vocab, dtype=object),
+        'term_frequency': term_frequency,
+    }
+
+
+def save_vis_inputs(inputs, output_dir):
+    """保存可视化输入，供之后单独生成 HTML"""
+    path = os.path.join(output_dir, VIS_INPUTS_FILENAME)
+    np.savez_compressed(
+        path,
+        topic_term_dists=inputs['topic_term_dists'],
+        topic_freq=inputs['topic_freq'],
+        term_frequency=inputs['term_frequency'],
+        vocab=np.array(json.dumps(list(inputs['vocab']), ensure_ascii=False))
+    )
+    return path
+
+
+def load_vis_inputs(output_dir):
+    with np.load(os.path.join(output_dir, VIS_INPUTS_FILENAME)) as data:
+        return {
+            'topic_term_dists': data['topic_term_dists'],
+            'topic_freq': data['topic_freq'],
+            'term_frequency': data['term_frequency'],
+            'vocab': np.array(json.loads(str(data['vocab'])), dtype=object),
+        }
+
+
+def _candidate_terms(topic_term_dists, topic_freq, term_frequency, R, lambda_step):
+    """给定词的边际频数（蓝色条），各主题在任意 λ 下相关度前R的词 + 默认视图显著度前R的词"""
+    term_proportion = term_frequency / term_frequency.sum()
+    with np.errstate(divide='ignore'):
+        log_ttd = np.log(topic_term_dists)
+        log_lift = log_ttd - np.log(term_proportion)
+
+    selected = set()
+    for lambda_ in np.arange(0, 1 + lambda_step, lambda_step):
+        relevance = lambda_ * log_ttd + (1 - lambda_) * log_lift
+        top = np.argpartition(-relevance, R - 1, axis=1)[:, :R]
+        selected.update(top.ravel().tolist())
+
+    # 默认视图：显著度 = 词比例 × 区分度
+    topic_proportion = topic_freq / topic_freq.sum()
+    topic_given_term = topic_term_dists / topic_term_dists.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kernel = topic_given_term * np.log(topic_given_term / topic_proportion[:, None])
+    saliency = term_proportion * np.nansum(kernel, axis=0)
+    selected.update(np.argpartition(-saliency, R - 1)[:R].tolist())
+    return selected
+
+
+def relevant_terms(topic_term_dists, topic_freq, term_frequency, R=30, lambda_step=0.01):
+    """
+    返回在任意 λ 下可能被 pyLDAvis 展示的词编号（各主题相关度前R + 默认视图显著度前R）。
+    term_frequency 为传给 pyLDAvis 的词频；部分 pyLDAvis 版本会改用 topic_freq @ topic_term_dists
+    重新计算词频，两种边际下的候选词都保留，所选词表对两类版本都成立。
+    """
+    num_terms = topic_term_dists.shape[1]
+    R = min(R, num_terms)
+    selected = _candidate_terms(topic_term_dists, topic_freq, np.asarray(term_frequency, dtype=np.float64),
+                                R, lambda_step)
+    selected |= _candidate_terms(topic_term_dists, topic_freq, topic_freq @ topic_term_dists, R, lambda_step)
+    return np.array(sorted(selected))
+
+
+def prepare_fast(inputs, R=30, n_jobs=-1, mds='pcoa', sort_topics=False):
+    """在缩减后的词表上调用 pyLDAvis.prepare，返回 PreparedData"""
+    import pyLDAvis
+
+    topic_term = inputs['topic_term_dists']
+    topic_freq = inputs['topic_freq']
+    terms = relevant_terms(topic_term, topic_freq, inputs['term_frequency'], R=R)
+    reduced = topic_term[:, terms]
+    reduced = reduced / reduced.sum(axis=1, keepdims=True)
+    total = topic_freq.sum()
+    return pyLDAvis.prepare(
+        topic_term_dists=reduced,
+        # 一个“汇总文档”即可得到与逐文档输入相同的主题词数
+        doc_topic_dists=(topic_freq / total)[None, :],
+        doc_lengths=np.array([total]),
+        vocab=inputs['vocab'][terms],
+        term_frequency=inputs['term_frequency'][terms],
+        R=R,
+        mds=mds,
+        n_jobs=n_jobs,
+        sort_topics=sort_topics
+    )
+
+
+def render_html(inputs, html_path, R=30, n_jobs=-1):
+    """快速生成 pyLDAvis HTML"""
+    import pyLDAvis
+    pyLDAvis.save_html(prepare_fast(inputs, R=R, n_jobs=n_jobs), html_path)
+    return html_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='由保存的可视化输入生成 LDA 的 pyLDAvis HTML')
+    parser.add_argument('output_dir', help=f'包含 {VIS_INPUTS_FILENAME} 的输出目录')
+    parser.add_argument('--jobs', type=int, default=-1, help='并行进程数，-1 表示全部核心')
+    parser.add_argument('--R', type=int, default=30, help='每个主题展示的词数')
+    args = parser.parse_args()
+
+    html_path = render_html(load_vis_inputs(args.output_dir),
+                            os.path.join(args.output_dir, VIS_HTML_FILENAME),
+                            R=args.R, n_jobs=args.jobs)
+    print(f"✅ LDA 的 HTML 图已保存为: {html_path}")
@@ -0,0 +1,152 @@
+"""
+流程各阶段的耗时与内存记录
+
+按顺序标记阶段即可：telemetry.start('training') 会结束上一个阶段并开始新阶段，
+也可以用 with telemetry.stage('plotting'): ... 包住一段代码。每个阶段记录
+    wall_seconds        墙钟时间
+    cpu_seconds         本进程 CPU 时间
+    child_cpu_seconds   已结束的子进程（多进程训练/打分）的 CPU 时间
+    peak_rss_mb         阶段内的峰值常驻内存（Linux 上按阶段重置；其他系统为截至该阶段的进程峰值）
+    peak_traced_mb      开启 trace_memory 时 tracemalloc 记录的阶段内 Python 分配峰值
+    items / items_per_second  处理的条目数与吞吐量
+最后由 save() 写出 JSON 运行报告。
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource  # Windows 上不可用
+except ImportError:
+    resource = None
+
+
+def _children_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_rss():
+    """Linux 上清零进程的峰值常驻内存（VmHWM），成功时返回 True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class RunTelemetry:
+    """记录一次运行中各阶段的资源消耗"""
+
+    def __init__(self, trace_memory=False):
+        """trace_memory: 是否用 tracemalloc 追踪 Python 内存分配（更精确，但会明显拖慢分词等纯Python阶段）"""
+        self.trace_memory = trace_memory
+        self.started_at = time.time()
+        self._start_wall = time.perf_counter()
+        self.stages = []
+        self._current = None
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, name, **info):
+        """结束当前阶段（如有）并开始名为 name 的新阶段，info 为附加说明（如是否命中缓存）"""
+        self.stop()
+        rss_scope = 'stage' if _reset_peak_rss() else 'process'
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._current = {
+            'name': name,
+            'info': info,
+            'items': None,
+            'rss_scope': rss_scope,
+            'wall': time.perf_counter(),
+            'cpu': time.process_time(),
+            'children': _children_cpu_seconds(),
+        }
+
+    def set_items(self, items):
+        """设置当前阶段处理的条目数，用于计算吞吐量"""
+        if self._current is not None:
+            self._current['items'] = int(items)
+
+    def stop(self):
+        current = self._current
+        if current is None:
+            return None
+        self._current = None
+        wall = time.perf_counter() - current['wall']
+        record = {
+            'stage': current['name'],
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(time.process_time() - current['cpu'], 4),
+            'child_cpu_seconds': round(_children_cpu_seconds() - current['children'], 4),
+            'peak_rss_mb': _peak_rss_mb(),
+            'peak_rss_scope': current['rss_scope'],
+        }
+        if self.trace_memory:
+            record['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        if current['items'] is not None:
+            record['items'] = current['items']
+            record['items_per_second'] = round(current['items'] / wall, 2) if wall > 0 else None
+        record.update(current['info'])
+        self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name, **info):
+        self.start(name, **info)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def report(self, **extra):
+        """汇总为可JSON序列化的字典"""
+        self.stop()
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'total_wall_seconds': round(time.perf_counter() - self._start_wall, 4),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            **extra,
+            'stages': self.stages,
+        }
+
+    def save(self, path, **extra):
+        """写出 JSON 运行报告，extra 中的字段（如配置）一并写入"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(**extra), f, ensure_ascii=False, indent=2, default=str)
+        return path
+
+    def print_summary(self):
+        self.stop()
+        total = sum(record['wall_seconds'] for record in self.stages) or 1.0
+        print("\n⏱️ 各阶段耗时：")
+        for record in self.stages:
+            peak = record['peak_rss_mb']
+            peak_text = f"{peak:8.1f} MB" if peak is not None else '       -'
+            print(f"  {record['stage']:<18} {record['wall_seconds']:8.2f}s  {record['wall_seconds'] / total:6.1%}  峰值内存 {peak_text}")
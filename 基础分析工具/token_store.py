@@ -0,0 +1,315 @@
+"""
+LDA、词云和词共现共用的分词结果存储
+
+同一份评论数据往往要先后跑 LDA+Sentiment.py、WordCloud.py 和 词共现网络.py，每个工具都重新 jieba 分词。
+这里把分词拆成两步并分别缓存：
+1. 分词（segments）：jieba 原始分词结果，按数据集（输入文件内容和取文本的方式）和 jieba 版本计算键，
+   多进程分词，只做一次；
+2. 过滤（tokens）：由分词结果按各工具的过滤规则和停用词表得到，键另含过滤规则名称、版本和停用词文件哈希。
+   过滤只需对词表逐词判断一次，再用数组映射全部词编号，不重新分词。
+
+存储为列式的紧凑格式：vocab.json（词表）、ids.bin（全部文档首尾相接的词编号，uint32）、
+lengths.bin（每篇文档的词数，int64），读取时用内存映射，不整体载入内存。
+过滤后的词编号按首次出现顺序重新分配，与 cooccurrence.encode_documents 的编号一致。
+
+各工具的过滤规则保持原样，见 FILTERS。缓存目录可用 artifact_cache.py 查看和清理：
+    python artifact_cache.py <存储目录> list
+"""
+
+import os
+import json
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from artifact_cache import ArtifactCache, file_digest, make_key
+
+# 存储格式或分词方式变化时递增，使旧的分词结果失效
+STORE_VERSION = 1
+STORE_DIRNAME = '.token_store'
+IDS_DTYPE = np.dtype('<u4')
+LENGTHS_DTYPE = np.dtype('<i8')
+
+
+# --- 过滤规则：词 → 保留下来的词列表（通常为空或该词本身） ---
+
+def _lda_filter(word, stopwords):
+    """LDA+Sentiment.py：去除停用词和单个字符"""
+    return [word] if word not in stopwords and len(word.strip()) > 1 else []
+
+def _wordcloud_filter(word, stopwords):
+    """WordCloud.py：长度大于1、非停用词、非空白"""
+    return [word] if len(word) > 1 and word not in stopwords and not word.isspace() else []
+
+def _cooccurrence_filter(word, stopwords):
+    """词共现网络.py：去除停用词后按空白切分（原脚本先以空格拼接再 split）"""
+    return word.split() if word not in stopwords else []
+
+FILTERS = {
+    'lda': _lda_filter,
+    'wordcloud': _wordcloud_filter,
+    'cooccurrence': _cooccurrence_filter,
+}
+
+# 修改某条过滤规则时递增其版本，使对应的过滤结果失效
+FILTER_VERSIONS = {'lda': 1, 'wordcloud': 1, 'cooccurrence': 1}
+
+
+def filter_tokens(words, filter_name, stopwords):
+    """对一篇文档的分词结果应用过滤规则（不经过存储时使用，如增量更新的少量新行）"""
+    rule = FILTERS[filter_name]
+    return [kept for word in words for kept in rule(word, stopwords)]
+
+
+def load_stopwords(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f)
+
+
+def default_store_dir(path):
+    """数据文件（或目录）同级的 .token_store"""
+    path = os.path.abspath(path)
+    return os.path.join(path if os.path.isdir(path) else os.path.dirname(path), STORE_DIRNAME)
+
+
+def dataset_key(*parts):
+    """
+    数据集键：由决定文本内容的各部分计算，如 ('csv', file_digest(路径), 文本列)。
+    同一个数据集在各工具中用相同的 parts 即可共享分词结果。
+    """
+    import jieba
+    return make_key('segments', STORE_VERSION, jieba.__version__, *parts)
+
+
+def csv_column_key(csv_path, column):
+    """单个文本列（即 iter_csv_column 产出的文本）的数据集键"""
+    return dataset_key('csv-column', file_digest(csv_path), column)
+
+
+def iter_csv_column(csv_path, column, chunksize=50000):
+    """按块读取CSV的一个文本列，去除空值后逐条产出"""
+    import pandas as pd
+    for chunk in pd.read_csv(csv_path, usecols=[column], dtype={column: str}, chunksize=chunksize):
+        yield from chunk[column].dropna().tolist()
+
+
+# --- 分词后的语料 ---
+
+class TokenizedCorpus:
+    """词表 + 词编号 + 每篇文档词数；可迭代得到每篇文档的词列表"""
+
+    def __init__(self, vocab, ids, lengths):
+        self.vocab = vocab
+        self.ids = ids
+        self.lengths = lengths
+        self.offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        vocab = self.vocab
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield [vocab[i] for i in self.ids[start:end].tolist()]
+
+    def chunks(self, max_tokens=1 << 22):
+        """按文档边界切块，产出 (文档起始序号, 文档结束序号)，每块约 max_tokens 个词"""
+        start = 0
+        while start < len(self):
+            end = int(np.searchsorted(self.offsets, self.offsets[start] + max_tokens, side='right')) - 1
+            end = min(max(end, start + 1), len(self))
+            yield start, end
+            start = end
+
+    def word_counts(self):
+        return np.bincount(self.ids, minlength=len(self.vocab))
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'vocab.json'), 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        return cls(vocab, _map_array(os.path.join(directory, 'ids.bin'), IDS_DTYPE),
+                   _map_array(os.path.join(directory, 'lengths.bin'), LENGTHS_DTYPE))
+
+    def filtered(self, filter_name, stopwords, directory=None):
+        """按过滤规则得到新的语料（文档数不变，词编号按首次出现顺序重新分配）"""
+        return filter_corpus(self, filter_name, stopwords, directory)
+
+
+def _map_array(path, dtype):
+    if os.path.getsize(path) == 0:  # 空文件无法内存映射
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class _CorpusWriter:
+    """
+    逐块接收 (词编号, 文档词数)，按首次出现顺序重新编号后写入目录（或保存在内存中）。
+    传入的词编号指向 source_vocab；source_vocab 可随块增长。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.source_vocab = []
+        self.vocab = []
+        self.rank = np.zeros(0, dtype=np.int64)  # 源编号 → 新编号（-1 表示尚未出现）
+        self._ids, self._lengths = [], []
+        if directory:
+            self._ids_file = open(os.path.join(directory, 'ids.bin'), 'wb')
+            self._lengths_file = open(os.path.join(directory, 'lengths.bin'), 'wb')
+
+    def write(self, ids, lengths):
+        if len(self.rank) < len(self.source_vocab):
+            self.rank = np.concatenate([self.rank, np.full(len(self.source_vocab) - len(self.rank), -1, dtype=np.int64)])
+        unique, first = np.unique(ids, return_index=True)
+        unseen = self.rank[unique] < 0
+        new = unique[unseen][np.argsort(first[unseen], kind='stable')]  # 本块新出现的词按出现先后编号
+        self.rank[new] = np.arange(len(self.vocab), len(self.vocab) + len(new))
+        self.vocab.extend(self.source_vocab[i] for i in new.tolist())
+        ids = self.rank[ids].astype(IDS_DTYPE)
+        lengths = np.asarray(lengths, dtype=LENGTHS_DTYPE)
+        if self.directory:
+            ids.tofile(self._ids_file)
+            lengths.tofile(self._lengths_file)
+        else:
+            self._ids.append(ids)
+            self._lengths.append(lengths)
+
+    def corpus(self):
+        """写入完成，返回 TokenizedCorpus"""
+        if self.directory:
+            self._ids_file.close()
+            self._lengths_file.close()
+            with open(os.path.join(self.directory, 'vocab.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.vocab, f, ensure_ascii=False)
+            return TokenizedCorpus.load(self.directory)
+        ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=IDS_DTYPE)
+        lengths = np.concatenate(self._lengths) if self._lengths else np.zeros(0, dtype=LENGTHS_DTYPE)
+        return TokenizedCorpus(self.vocab, ids, lengths)
+
+
+def filter_corpus(corpus, filter_name, stopwords, directory=None):
+    """
+    先对词表逐词应用过滤规则，得到每个词保留下来的词（0 个或多个），
+    再按块用数组把全部词编号展开为过滤后的编号，不重新分词。
+    """
+    rule = FILTERS[filter_name]
+    word2id = {}
+    kept_counts = np.zeros(len(corpus.vocab), dtype=np.int64)
+    flat = []
+    for i, word in enumerate(corpus.vocab):
+        kept = rule(word, stopwords)
+        kept_counts[i] = len(kept)
+        flat.extend(word2id.setdefault(w, len(word2id)) for w in kept)
+    flat = np.array(flat, dtype=np.int64)
+    starts = np.cumsum(kept_counts) - kept_counts
+
+    writer = _CorpusWriter(directory)
+    writer.source_vocab = list(word2id)
+    for doc_start, doc_end in corpus.chunks():
+        token_start = corpus.offsets[doc_start]
+        ids = np.asarray(corpus.ids[token_start:corpus.offsets[doc_end]], dtype=np.int64)
+        counts = kept_counts[ids]
+        cumulative = np.concatenate([[0], np.cumsum(counts)])
+        position = np.arange(cumulative[-1]) - np.repeat(cumulative[:-1], counts)
+        new_ids = flat[np.repeat(starts[ids], counts) + position]
+        doc_offsets = corpus.offsets[doc_start:doc_end + 1] - token_start
+        writer.write(new_ids, np.diff(cumulative[doc_offsets]))
+    return writer.corpus()
+
+
+# --- 多进程分词 ---
+
+def _segment_batch(texts):
+    """子进程：jieba 分词一批文本，返回 (本批词表, 词编号, 每篇词数)"""
+    import jieba
+    word2id = {}
+    setdefault = word2id.setdefault
+    ids, lengths = [], []
+    for text in texts:
+        words = jieba.lcut(text)
+        lengths.append(len(words))
+        ids.extend(setdefault(word, len(word2id)) for word in words)
+    return list(word2id), np.array(ids, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def segment_texts(texts, directory=None, workers=None, batch_size=2000):
+    """
+    多进程 jieba 分词。texts 为任意文本可迭代对象（可以是逐块读取的生成器），按批分发给子进程，
+    同时在途的批不超过 2×进程数，按原顺序合并。directory 为 None 时结果保存在内存中。
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = _CorpusWriter(directory)
+    word2id = {}
+
+    def merge(result):
+        local_vocab, local_ids, lengths = result
+        mapping = np.array([word2id.setdefault(word, len(word2id)) for word in local_vocab], dtype=np.int64)
+        writer.source_vocab = list(word2id)
+        writer.write(mapping[local_ids], lengths)
+
+    texts = iter(texts)
+    batches = iter(lambda: list(itertools.islice(texts, batch_size)), [])
+    if workers == 1:
+        for batch in batches:
+            merge(_segment_batch(batch))
+        return writer.corpus()
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in batches:
+            pending.append(executor.submit(_segment_batch, batch))
+            if len(pending) >= 2 * workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+    return writer.corpus()
+
+
+# --- 存储 ---
+
+class TokenStore:
+    """
+    分词结果存储。root 为 None 时不落盘，每次都重新分词（等同于不使用存储）。
+        store = TokenStore(default_store_dir(csv_path))
+        corpus = store.tokens(csv_column_key(csv_path, '内容'), lambda: iter_csv_column(csv_path, '内容'),
+                              'cooccurrence', stopwords_path)
+    """
+
+    def __init__(self, root=None, workers=None):
+        self.cache = ArtifactCache(root) if root else None
+        self.workers = workers
+
+    def segments(self, key, texts_factory):
+        """原始分词结果；未命中时调用 texts_factory() 取得文本并分词"""
+        if self.cache is None:
+            return segment_texts(texts_factory(), workers=self.workers)
+        entry_dir = self.cache.lookup('segments', key)
+        if entry_dir:
+            print(f"♻️ 使用已保存的分词结果: {entry_dir}")
+            return TokenizedCorpus.load(entry_dir)
+        print("✂️ 正在分词（结果将保存供其他工具复用）...")
+        with self.cache.store('segments', key) as entry_dir:
+            corpus = segment_texts(texts_factory(), directory=entry_dir, workers=self.workers)
+            summary = f"{len(corpus)} 篇文档，{int(corpus.offsets[-1])} 个词"
+            del corpus  # 释放内存映射后再移动目录
+        print(f"✅ 分词完成: {summary}")
+        return TokenizedCorpus.load(self.cache.path('segments', key))
+
+    def tokens(self, key, texts_factory, filter_name, stopwords_path):
+        """按过滤规则和停用词过滤后的分词结果"""
+        token_key = make_key('tokens', key, filter_name, FILTER_VERSIONS[filter_name], file_digest(stopwords_path))
+        if self.cache is not None:
+            entry_dir = self.cache.lookup('tokens', token_key)
+            if entry_dir:
+                print(f"♻️ 使用已保存的分词结果: {entry_dir}")
+                return TokenizedCorpus.load(entry_dir)
+        segments = self.segments(key, texts_factory)
+        stopwords = load_stopwords(stopwords_path)
+        if self.cache is None:
+            return segments.filtered(filter_name, stopwords)
+        with self.cache.store('tokens', token_key, {'filter': filter_name, 'stopwords': stopwords_path}) as entry_dir:
+            segments.filtered(filter_name, stopwords, directory=entry_dir)
+        return TokenizedCorpus.load(self.cache.path('tokens', token_key))
@@ -1,117 +1,108 @@
-import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-from collections import Counter
-import jieba
+import csv
+from multiprocessing import freeze_support
+
 import matplotlib
 from matplotlib import font_manager
-
-# 设置 matplotlib 使用指定路径的 SimHei 字体
-font_path = '/Users/ziming_ye/Python/Simhei.ttf'
-font = font_manager.FontProperties(fname=font_path)
-matplotlib.rcParams['font.sans-serif'] = font.get_name()
-matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-
-# 获取所有词并计算频率
-# 读取停用词
-with open('/Volumes/ZimingYe/Python/cn_all_stopwords.txt', 'r', encoding='utf-8') as f:
-    stop_words = set([line.strip() for line in f])
-
-# 读取CSV文件并预处理
-df = pd.read_csv('/Volumes/ZimingYe/非学术论文写作/A项目/上海科技馆/豆瓣 - 肖申克.csv')
-df = df.dropna(subset=['内容'])       # 去除空评论
-texts = df['内容'].astype(str).tolist()
-
-# 将'text'列添加到DataFrame中
-df['text'] = texts
-all_words = []
-for text in df['text']:
-    words = text.split()  # 假设文本已经预处理过
-    all_words.extend(words)
-
-# 去除停用词
-# 使用 jieba 分词并去除停用词
-filtered_texts = []
-for text in texts:
-    words = jieba.lcut(text)  # 使用 jieba 分词
-    filtered_words = [word for word in words if word not in stop_words]
-    filtered_texts.append(' '.join(filtered_words))
-
-# 更新 DataFrame 中的 'text' 列
-df['text'] = filtered_texts
-
-# 确保停用词过滤正确
-all_words = []
-for text in filtered_texts:  # 使用过滤后的文本
-    words = text.split()
-    all_words.extend(words)
-
-# 获取前30个高频词
-target_words = [word for word, count in Counter(all_words).most_common(30)]
-
-# 创建空的共现矩阵
-cooccurrence_matrix = {word1: {word2: 0 for word2 in target_words} for word1 in target_words}
-
-# 计算共现频率
-for text in filtered_texts:  # 使用过滤后的文本
-    words = text.split()
-    for i, word1 in enumerate(words):
-        if word1 in target_words:
-            for word2 in words[max(0, i-5):i+6]:  # 考虑词的上下文窗口
-                if word2 in target_words and word1 != word2:
-                    cooccurrence_matrix[word1][word2] += 1
-
-# 转换共现矩阵为CSV格式
-edges = []
-for word1, connections in cooccurrence_matrix.items():
-    for word2, count in connections.items():
-        if count > 0:
-            edges.append([word1, word2, count])
-
-# 保存为CSV文件
-output_path = '/Users/ziming_ye/Python/网页数据采集-数据新闻教材/top30_cooccurrence.csv'
-import csv
-with open(output_path, 'w', encoding='utf-8', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['Source', 'Target', 'Weight'])
-    writer.writerows(edges)
-
-print(f"共现数据已保存到 {output_path}")
-
-# 归一化边权重
-max_weight = max([count for connections in cooccurrence_matrix.values() for count in connections.values()])
-normalized_edges = []
-for word1, connections in cooccurrence_matrix.items():
-    for word2, count in connections.items():
-        if count > 0:
-            normalized_weight = count / max_weight  # 归一化处理
-            normalized_edges.append([word1, word2, normalized_weight])
-
-# 保存归一化结果为CSV文件
-output_path = '/Users/ziming_ye/Python/网页数据采集-数据新闻教材/top30_cooccurrence_normalized.csv'
-import csv
-with open(output_path, 'w', encoding='utf-8', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['Source', 'Target', 'Normalized Weight'])
-    writer.writerows(normalized_edges)
-
-print(f"归一化共现数据已保存到 {output_path}")
-
-# 保存源节点为CSV文件
-source_nodes_path = '/Users/ziming_ye/Python/网页数据采集-数据新闻教材/source_nodes.csv'
-with open(source_nodes_path, 'w', encoding='utf-8', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['Source'])
-    writer.writerows([[word] for word in target_words])
-
-print(f"源节点数据已保存到 {source_nodes_path}")
-
-# 保存边节点为CSV文件
-edges_path = '/Users/ziming_ye/Python/网页数据采集-数据新闻教材/edges.csv'
-with open(edges_path, 'w', encoding='utf-8', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['Source', 'Target', 'Weight'])
-    writer.writerows(edges)
-
-print(f"边节点数据已保存到 {edges_path}")
\ No newline at end of file
+from cooccurrence import count_corpus, edge_list, prune_edges, top_k
+from token_store import TokenStore, csv_column_key, default_store_dir, iter_csv_column
+from cooccurrence_graph import build_graph, analyze_graph, node_table, export_graph
+
+# 网络参数：高频词数量、共现窗口（前后各几个词）、是否双向计数
+TOP_K = 30
+WINDOW = 5
+SYMMETRIC = True
+
+# 剪枝阈值：边需同时满足，None 表示不按该项过滤
+# NPMI>0 只保留比随机更常共现的词对；LLR≥3.84 对应 p<0.05，≥10.83 对应 p<0.001
+PRUNE_THRESHOLDS = {'Weight': 1, 'NPMI': 0.0, 'LLR': 3.84}
+# 网络图的边权（Weight / PMI / NPMI / LLR），社区划分和中心性都按它计算；
+# 边权须为正数，选 PMI / NPMI 时把上面对应的阈值设为大于 0（如 NPMI: 0.1）
+GRAPH_WEIGHT = 'Weight'
+# 介数中心性抽样的源点数，节点更多时按抽样近似计算
+BETWEENNESS_SAMPLES = 500
+GRAPH_FORMATS = ('gexf', 'graphml')
+
+# 每块读取的评论条数、分词和共现统计的进程数（None 为CPU核数）
+CHUNKSIZE = 20000
+WORKERS = None
+# 分词结果存储目录（与 LDA、词云共用），None 表示输入CSV同目录下的 .token_store
+TOKEN_STORE_DIR = None
+
+INPUT_CSV = '/Volumes/ZimingYe/非学术论文写作/A项目/上海科技馆/豆瓣 - 肖申克.csv'
+TEXT_COLUMN = '内容'
+STOPWORDS_PATH = '/Volumes/ZimingYe/Python/cn_all_stopwords.txt'
+OUTPUT_DIR = '/Users/ziming_ye/Python/网页数据采集-数据新闻教材'
+
+
+def setup_font():
+    # 设置 matplotlib 使用指定路径的 SimHei 字体
+    font_path = '/Users/ziming_ye/Python/Simhei.ttf'
+    font = font_manager.FontProperties(fname=font_path)
+    matplotlib.rcParams['font.sans-serif'] = font.get_name()
+    matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+
+
+def save_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def main():
+    setup_font()
+
+    # 读取共用的分词结果（没有时分块读取CSV、多进程分词并保存），去除停用词后分块多进程统计全部词的词频和共现
+    store = TokenStore(TOKEN_STORE_DIR or default_store_dir(INPUT_CSV), workers=WORKERS)
+    corpus = store.tokens(csv_column_key(INPUT_CSV, TEXT_COLUMN),
+                          lambda: iter_csv_column(INPUT_CSV, TEXT_COLUMN, CHUNKSIZE),
+                          'cooccurrence', STOPWORDS_PATH)
+    counts = count_corpus(corpus, window=WINDOW, symmetric=SYMMETRIC, workers=WORKERS)
+    print(f"📊 共统计 {len(corpus)} 条评论，{len(counts.vocab)} 个词")
+
+    # 以下输出都来自同一份合并结果：前 TOP_K 个高频词及它们之间的共现
+    target_words, cooccurrence_matrix = counts.top_k(TOP_K)
+    frequencies = counts.counts[top_k(counts.counts, TOP_K)]
+
+    # 转换共现矩阵为边列表 [Source, Target, Weight]
+    edges = edge_list(cooccurrence_matrix, target_words)
+
+    # 保存为CSV文件
+    output_path = f'{OUTPUT_DIR}/top{TOP_K}_cooccurrence.csv'
+    save_csv(output_path, ['Source', 'Target', 'Weight'], edges)
+    print(f"共现数据已保存到 {output_path}")
+
+    # 归一化边权重
+    max_weight = max(count for _, _, count in edges) if edges else 0
+    normalized_edges = [[word1, word2, count / max_weight] for word1, word2, count in edges]  # 归一化处理
+
+    # 保存归一化结果为CSV文件
+    output_path = f'{OUTPUT_DIR}/top{TOP_K}_cooccurrence_normalized.csv'
+    save_csv(output_path, ['Source', 'Target', 'Normalized Weight'], normalized_edges)
+    print(f"归一化共现数据已保存到 {output_path}")
+
+    # 保存源节点为CSV文件
+    source_nodes_path = f'{OUTPUT_DIR}/source_nodes.csv'
+    save_csv(source_nodes_path, ['Source'], [[word] for word in target_words])
+    print(f"源节点数据已保存到 {source_nodes_path}")
+
+    # 计算 PMI / NPMI / LLR 并按阈值剪枝，保存为边表（Source, Target, Weight 之后是各关联度）
+    table = prune_edges(counts.edge_table(TOP_K), PRUNE_THRESHOLDS)
+    edges_path = f'{OUTPUT_DIR}/edges.csv'
+    table.to_csv(edges_path, index=False, encoding='utf-8')
+    print(f"剪枝后的 {len(table)} 条边及关联度已保存到 {edges_path}")
+
+    # 构建网络，计算中心性与社区，导出节点表和 GEXF / GraphML
+    graph = build_graph(target_words, frequencies, table, weight=GRAPH_WEIGHT, directed=not SYMMETRIC)
+    communities = analyze_graph(graph, betweenness_samples=BETWEENNESS_SAMPLES)
+    print(f"🕸️ 网络共 {graph.number_of_nodes()} 个节点、{graph.number_of_edges()} 条边，{len(communities)} 个社区")
+    nodes_path = f'{OUTPUT_DIR}/top{TOP_K}_nodes.csv'
+    node_table(graph).to_csv(nodes_path, index=False, encoding='utf-8')
+    print(f"节点中心性与社区已保存到 {nodes_path}")
+    for path in export_graph(graph, f'{OUTPUT_DIR}/top{TOP_K}_network', formats=GRAPH_FORMATS):
+        print(f"网络图已导出到 {path}")
+
+
+if __name__ == '__main__':
+    freeze_support()
+    main()
@@ -1,58 +1,347 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import argparse
+import asyncio
 import csv
-import time
-import re
+
+from async_fetcher import Fetcher, FetchError
+from crawl_state import ResponseCache, Frontier
+from douban_parser import (parse_movies, BACKENDS, DEFAULT_BACKEND, REVIEW_FIELDS, parse_subject_links,
+                           parse_subject, parse_reviews, full_review_url, parse_full_review)
 
 # 请求头设置
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
 }
 
-def get_movies():
-    # 创建CSV文件
-    with open('douban_top250.csv', 'w', newline='', encoding='utf-8-sig') as file:
-        writer = csv.writer(file)
-        writer.writerow(['排名', '电影名称', '评分', '导演', '主演', '年份', '国家', '类型', '简介'])
-
-        # 分页爬取（每页25条，共10页）
-        for i in range(0, 250, 25):
-            url = f'https://movie.douban.com/top250?start={i}'
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # 解析每个电影条目
-            for item in soup.find_all('div', class_='item'):
-                index = item.find('em').text  # 排名
-                title = item.find('span', class_='title').text  # 中文标题
-                rating = item.find('span', class_='rating_num').text  # 评分
-                
-                # 处理包含多个信息的bd段落
-                bd = item.find('div', class_='bd')
-                info = bd.find('p').text.strip()
-                info_parts = info.split('\n')
-                
-                # 提取导演和主演信息
-                director_actors = info_parts[0].strip().split('   ')
-                director = director_actors[0].replace('导演: ', '')
-                actors = director_actors[1].replace('主演: ', '') if len(director_actors) > 1 else ''
-                
-                # 提取年份、国家和类型
-                misc_info = re.search(r'(\d+) / (.*?) / (.*)', info_parts[1].strip())
-                year = misc_info.group(1) if misc_info else ''
-                country = misc_info.group(2) if misc_info else ''
-                genre = misc_info.group(3) if misc_info else ''
-                
-                # 处理可能不存在的简介
-                quote = item.find('span', class_='inq')
-                quote = quote.text if quote else ''
-
-                # 写入数据
-                writer.writerow([index, title, rating, director, actors, year, country, genre, quote])
-
-            print(f'已爬取第 {i//25+1} 页数据')
-            time.sleep(2)  # 添加延迟防止被封
+BASE_URL = 'https://movie.douban.com'
+OUTPUT_CSV = 'douban_top250.csv'
+# 抓取状态目录：HTTP 响应缓存（http_cache/）和抓取队列（frontier.sqlite3），中断后据此续抓
+STATE_DIR = 'douban_crawl'
+CSV_HEADER = ['排名', '电影名称', '评分', '导演', '主演', '年份', '国家', '类型', '简介']
+# 列表页解析后端（见 douban_parser.py）：'lxml'（默认，最快）、'strainer'、'bs4'（原实现）
+PARSER = DEFAULT_BACKEND
+
+# 抓取参数：每秒请求数（0.5 即平均每 2 秒一次，与原先的 time.sleep(2) 相当）、突发上限、
+# 同时保持的连接数、失败重试次数
+RATE = 0.5
+BURST = 2
+CONNECTIONS = 4
+RETRIES = 4
+
+# 影评抓取模式（--reviews）：依次跟随 列表页 → 详情页 → 影评列表页（逐页翻）→ 每条影评的全文，
+# 结果写入 REVIEWS_CSV，其中「内容」列即 词共现网络.py 等分析脚本读取的文本列
+REVIEWS_CSV = 'douban_reviews.csv'
+# 并发工作协程数；任务队列和结果队列的容量（队列满时上游等待，内存占用不随影评数量增长）
+WORKERS = 8
+QUEUE_SIZE = 32
+# 是否逐条请求影评全文（否则只保存列表页上的摘要）
+FULL_TEXT = True
+
+# --check：用 fixtures/douban 中保存的页面在本地服务器上校验影评抓取（见 fixture_server.py）。
+# 列表页只有前两页有条目，其余为空页；没有保存全文的影评返回 404，应保留列表页上的摘要
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CHECK_ROUTES = {
+    **{f'/top250?start={start}': 'douban/top250_empty.html' for start in range(50, 250, 25)},
+    '/top250?start=0': 'douban/top250_start0.html',
+    '/top250?start=25': 'douban/top250_start25.html',
+    '/subject/1292052/': 'douban/subject_1292052.html',
+    '/subject/1291546/': 'douban/subject_1291546.html',
+    '/subject/1292052/reviews': 'douban/reviews_1292052_start0.html',
+    '/subject/1292052/reviews?start=20': 'douban/reviews_1292052_start20.html',
+    '/subject/1291546/reviews': 'douban/reviews_1291546_start0.html',
+    '/j/review/1000369/full': 'douban/review_full_1000369.json',
+    '/j/review/1010237/full': 'douban/review_full_1010237.json',
+    '/j/review/1023470/full': 'douban/review_full_1023470.json',
+}
+CHECK_EXPECTED = os.path.join(FIXTURE_DIR, 'douban', 'reviews_expected.csv')
+
+def list_urls(base_url=BASE_URL):
+    # 分页爬取（每页25条，共10页）
+    return [f'{base_url}/top250?start={i}' for i in range(0, 250, 25)]
+
+def open_state(state_dir, frontier_name='frontier'):
+    """返回 (响应缓存, 抓取队列)；各抓取模式的队列分开保存，响应缓存共用"""
+    return (ResponseCache(os.path.join(state_dir, 'http_cache')),
+            Frontier(os.path.join(state_dir, f'{frontier_name}.sqlite3')))
+
+def open_output(output_csv, header):
+    """以追加方式打开CSV，新文件写入表头，返回 (文件, writer)"""
+    new = not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0
+    file = open(output_csv, 'a', newline='', encoding='utf-8-sig' if new else 'utf-8')
+    writer = csv.writer(file)
+    if new:
+        writer.writerow(header)
+    return file, writer
+
+def append_rows(file, writer, rows):
+    """写入并落盘，之后才在抓取队列中标记完成，中断时不会丢行"""
+    writer.writerows(rows)
+    file.flush()
+    os.fsync(file.fileno())
+
+async def crawl(base_url=BASE_URL, output_csv=OUTPUT_CSV, state_dir=STATE_DIR, restart=False, rate=RATE,
+                burst=BURST, connections=CONNECTIONS, retries=RETRIES, parser=PARSER):
+    """
+    并发抓取各列表页（共用连接池，按主机限速，429/5xx 自动退避重试），按页码顺序追加写入CSV。
+    已完成的页面记录在抓取队列中，重新运行时只抓取未完成的页面；页面未变化时服务器返回 304，
+    直接使用缓存的正文。restart=True 时清空队列和CSV重新开始（缓存仍然有效）。
+    返回本次写入的行数。
+    """
+    cache, frontier = open_state(state_dir)
+    with frontier:
+        if restart or not os.path.exists(output_csv):
+            frontier.reset()
+            if os.path.exists(output_csv):
+                os.remove(output_csv)
+        frontier.add(list_urls(base_url), kind='list')
+        pending = [url for url, _ in frontier.pending('list')]
+        if not pending:
+            print('所有页面均已抓取完成（重新抓取请使用 --restart）')
+            return 0
+        print(f'待抓取 {len(pending)} 页，已完成 {frontier.counts("list").get("done", 0)} 页')
+
+        count = 0
+        file, writer = open_output(output_csv, CSV_HEADER)
+        async with Fetcher(rate=rate, burst=burst, headers=headers, connections=connections,
+                           connections_per_host=connections, retries=retries, cache=cache) as fetcher:
+
+            async def fetch_page(url):
+                result = await fetcher.fetch(url)
+                if result.status != 200:
+                    raise FetchError(url, f'HTTP {result.status}')
+                return parse_movies(result.text, parser)
+
+            # 所有页面同时开始抓取，按页码顺序等待并写入
+            tasks = [asyncio.create_task(fetch_page(url)) for url in pending]
+            with file:
+                for url, task in zip(pending, tasks):
+                    try:
+                        rows = await task
+                    except FetchError as e:
+                        frontier.mark_failed(url, e)
+                        print(f'⚠️ 抓取失败，下次运行时重试：{e}')
+                        continue
+                    append_rows(file, writer, rows)
+                    frontier.mark_done(url)
+                    count += len(rows)
+                    print(f'已爬取 {url} （{len(rows)} 条）')
+
+        stats = fetcher.stats
+        print(f"📊 请求 {stats['requests']} 次，重试 {stats['retries']} 次，未变化（304）{stats['not_modified']} 页")
+        return count
+
+async def fetch_ok(fetcher, url):
+    result = await fetcher.fetch(url)
+    if result.status != 200:
+        raise FetchError(url, f'HTTP {result.status}')
+    return result.text
+
+async def process_page(fetcher, kind, url, meta, max_movies=None, full_text=FULL_TEXT):
+    """
+    处理抓取队列中的一个页面，返回 (要写入的影评行, 新发现的页面 [(kind, url, meta)])。
+    list → 各电影详情页；subject → 影评列表第一页；reviews → 本页影评，以及下一页。
+    """
+    html = await fetch_ok(fetcher, url)
+    if kind == 'list':
+        links = parse_subject_links(html, url)
+        return [], [('subject', link, {'rank': rank, 'movie': title}) for rank, title, link in links
+                    if not max_movies or int(rank) <= max_movies]
+    if kind == 'subject':
+        subject = parse_subject(html, url)
+        meta = dict(meta, movie=meta.get('movie') or subject['title'])
+        return [], [('reviews', subject['reviews_url'], meta)]
+
+    reviews, next_url = parse_reviews(html, url)
+    if full_text:
+        # 全文请求失败时保留摘要，不影响整页
+        texts = await asyncio.gather(*(fetch_ok(fetcher, full_review_url(url, review['id'])) for review in reviews),
+                                     return_exceptions=True)
+        for review, text in zip(reviews, texts):
+            if not isinstance(text, BaseException):
+                review['content'] = parse_full_review(text) or review['content']
+    rows = [[meta.get('rank', ''), meta.get('movie', ''), review['id'], review['user'], review['rating'],
+             review['time'], review['title'], review['content'], review['useful'], review['url']]
+            for review in reviews]
+    return rows, [('reviews', next_url, meta)] if next_url else []
+
+async def crawl_reviews(base_url=BASE_URL, output_csv=REVIEWS_CSV, state_dir=STATE_DIR, restart=False, rate=RATE,
+                        burst=BURST, connections=CONNECTIONS, retries=RETRIES, workers=WORKERS,
+                        queue_size=QUEUE_SIZE, max_movies=None, full_text=FULL_TEXT):
+    """
+    影评抓取：workers 个工作协程从有界任务队列取页面，结果经有界结果队列交给唯一的写入协程，
+    由它写入CSV、把新发现的页面加入抓取队列并标记完成。分发协程按 影评页 → 详情页 → 列表页
+    的优先级从抓取队列取待处理页面，先把已发现的影评翻完，待处理页面不会大量堆积。
+    中断后重新运行会从未完成的页面继续；返回本次写入的影评数。
+    """
+    cache, frontier = open_state(state_dir, 'reviews_frontier')
+    with frontier:
+        if restart or not os.path.exists(output_csv):
+            frontier.reset()
+            if os.path.exists(output_csv):
+                os.remove(output_csv)
+        frontier.add(list_urls(base_url), kind='list')
+        frontier.retry_failed()
+
+        tasks = asyncio.Queue(maxsize=queue_size)
+        results = asyncio.Queue(maxsize=queue_size)
+        progress = asyncio.Event()
+        in_flight = set()
+        count = 0
+
+        async def worker():
+            while True:
+                kind, url, meta = await tasks.get()
+                try:
+                    result = await process_page(fetcher, kind, url, meta, max_movies, full_text)
+                except FetchError as e:
+                    result = e
+                except Exception as e:  # 页面结构异常等，记为失败，不中断其他页面
+                    result = FetchError(url, f'{type(e).__name__}: {e}')
+                await results.put((url, result))
+
+        async def write():
+            nonlocal count
+            while True:
+                url, result = await results.get()
+                if isinstance(result, FetchError):
+                    frontier.mark_failed(url, result)
+                    print(f'⚠️ 抓取失败，下次运行时重试：{result}')
+                else:
+                    rows, discovered = result
+                    for kind, new_url, meta in discovered:
+                        frontier.add([new_url], kind=kind, meta=meta)
+                    if rows:
+                        append_rows(file, writer, rows)
+                        count += len(rows)
+                        print(f'已爬取 {url} （{len(rows)} 条影评，累计 {count} 条）')
+                    frontier.mark_done(url)
+                in_flight.discard(url)
+                progress.set()
+
+        async def until(awaitable):
+            """等待 awaitable；写入协程异常退出时抛出其异常，避免永久等待"""
+            waiter = asyncio.ensure_future(awaitable)
+            await asyncio.wait({waiter, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                waiter.cancel()
+                writer_task.result()
+            return waiter.result()
+
+        file, writer = open_output(output_csv, REVIEW_FIELDS)
+        async with Fetcher(rate=rate, burst=burst, headers=headers, connections=connections,
+                           connections_per_host=connections, retries=retries, cache=cache) as fetcher:
+            worker_tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+            writer_task = asyncio.create_task(write())
+            with file:
+                try:
+                    while True:
+                        progress.clear()
+                        dispatched = 0
+                        for kind in ('reviews', 'subject', 'list'):
+                            # 多取 len(in_flight) 条，跳过正在处理的页面后仍有足够的新页面
+                            for url, meta in frontier.pending(kind, include_failed=False,
+                                                              limit=len(in_flight) + queue_size):
+                                if url in in_flight:
+                                    continue
+                                in_flight.add(url)
+                                dispatched += 1
+                                await until(tasks.put((kind, url, meta or {})))
+                        if not dispatched:
+                            if not in_flight:
+                                break
+                            await until(progress.wait())
+                finally:
+                    for task in worker_tasks + [writer_task]:
+                        task.cancel()
+                    await asyncio.gather(*worker_tasks, writer_task, return_exceptions=True)
+
+        stats = fetcher.stats
+        print(f"📊 请求 {stats['requests']} 次，重试 {stats['retries']} 次，未变化（304）{stats['not_modified']} 页；"
+              f"抓取队列 {frontier.counts()}")
+        return count
+
+def read_reviews(path):
+    """读取影评CSV，按影评ID排序（并发抓取时各页写入的先后不固定）"""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        return sorted(list(csv.reader(f))[1:], key=lambda row: row[2])
+
+async def check_reviews_crawl(retries=1):
+    """
+    在本地测试服务器上运行三次影评抓取：
+    1. 第二页影评持续失败（超过重试次数），一个详情页失败一次后重试成功；
+    2. 续抓：只请求上次失败的页面及其影评全文，补齐影评；
+    3. 全部完成，不再发出请求。
+    每条影评只写入一次，结果与 reviews_expected.csv 一致。返回影评数。
+    """
+    import tempfile
+    from fixture_server import FixtureServer
+
+    failing = '/subject/1292052/reviews?start=20'
+    fail = {failing: retries + 1, '/subject/1291546/': 1}
+    with tempfile.TemporaryDirectory() as tmp:
+        output_csv = os.path.join(tmp, REVIEWS_CSV)
+        options = dict(output_csv=output_csv, state_dir=os.path.join(tmp, STATE_DIR), rate=None, retries=retries,
+                       max_movies=2)
+        async with FixtureServer(CHECK_ROUTES, FIXTURE_DIR, origin=BASE_URL, fail=fail) as server:
+            counts, requests = [], []
+            for _ in range(3):
+                start = len(server.hits)
+                counts.append(await crawl_reviews(server.base_url, **options))
+                requests.append(server.hits[start:])
+        # 链接中的本地服务器地址换回站点地址后再比较
+        rows = [[value.replace(server.base_url, BASE_URL) for value in row] for row in read_reviews(output_csv)]
+    expected = read_reviews(CHECK_EXPECTED)
+
+    if requests[0].count('/subject/1291546/') != 2:
+        raise AssertionError(f"失败一次的详情页应在同一次运行中重试成功: {requests[0]}")
+    resumed = {failing, '/j/review/1010237/full', '/j/review/5436981/full'}
+    if set(requests[1]) != resumed or len(requests[1]) != len(resumed):
+        raise AssertionError(f"续抓应只请求失败的页面及其影评全文: {requests[1]}")
+    if requests[2]:
+        raise AssertionError(f"全部完成后不应再发出请求: {requests[2]}")
+    if counts != [len(expected) - 2, 2, 0]:
+        raise AssertionError(f"各次写入的影评数不符: {counts}")
+    if rows != expected:
+        raise AssertionError("影评CSV与 reviews_expected.csv 不一致")
+    return len(rows)
+
+def get_movies(**kwargs):
+    return asyncio.run(crawl(**kwargs))
+
+def get_reviews(**kwargs):
+    return asyncio.run(crawl_reviews(**kwargs))
 
 if __name__ == '__main__':
-    get_movies()
-    print('数据爬取完成！')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='豆瓣电影 Top250 采集')
+    parser.add_argument('--base-url', default=BASE_URL, help='站点地址（可指向本地测试服务器）')
+    parser.add_argument('--output', default=None, help=f'输出CSV路径（默认 {OUTPUT_CSV}，影评模式 {REVIEWS_CSV}）')
+    parser.add_argument('--state-dir', default=STATE_DIR, help='抓取状态目录（HTTP缓存与抓取队列）')
+    parser.add_argument('--restart', action='store_true', help='清空抓取队列和输出CSV，重新抓取')
+    parser.add_argument('--rate', type=float, default=RATE, help='每秒请求数')
+    parser.add_argument('--burst', type=int, default=BURST, help='突发请求数上限')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS, help='并发连接数')
+    parser.add_argument('--retries', type=int, default=RETRIES, help='失败重试次数')
+    parser.add_argument('--parser', choices=list(BACKENDS), default=PARSER, help='列表页解析后端')
+    parser.add_argument('--reviews', action='store_true', help='影评抓取模式：跟随详情页和影评页，抓取影评全文')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='影评模式的并发工作协程数')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='影评模式的任务/结果队列容量')
+    parser.add_argument('--max-movies', type=int, default=None, help='影评模式只抓取排名前 N 的电影')
+    parser.add_argument('--no-full-text', action='store_true', help='影评模式只保存列表页上的影评摘要')
+    parser.add_argument('--check', action='store_true', help='用保存的页面在本地服务器上校验影评抓取的续抓和失败重试')
+    args = parser.parse_args()
+
+    if args.check:
+        count = asyncio.run(check_reviews_crawl())
+        print(f'✅ 影评抓取校验通过：失败重试和续抓后共 {count} 条影评，无重复')
+        raise SystemExit
+
+    common = dict(base_url=args.base_url, state_dir=args.state_dir, restart=args.restart, rate=args.rate,
+                  burst=args.burst, connections=args.connections, retries=args.retries)
+    if args.reviews:
+        count = get_reviews(output_csv=args.output or REVIEWS_CSV, workers=args.workers,
+                            queue_size=args.queue_size, max_movies=args.max_movies,
+                            full_text=not args.no_full_text, **common)
+        print(f'影评爬取完成！本次新增 {count} 条影评')
+    else:
+        count = get_movies(output_csv=args.output or OUTPUT_CSV, parser=args.parser, **common)
+        print(f'数据爬取完成！本次新增 {count} 部电影')
@@ -0,0 +1,191 @@
+"""
+异步抓取引擎：连接池复用、按主机限速、失败重试
+
+- 同一个 aiohttp 会话内复用 keep-alive 连接，限制总连接数和单主机连接数；
+- 每个主机一个令牌桶（平均 rate 次/秒，允许突发 burst 次），取代固定的 time.sleep；
+- 遇到 429、5xx、连接错误或超时时按指数退避（带随机抖动）重试，服务器给出 Retry-After 时以其为准；
+- 其余 4xx 不重试，直接返回结果由调用方处理。
+
+用法:
+    async with Fetcher(rate=0.5, headers=HEADERS) as fetcher:
+        result = await fetcher.fetch(url)
+        print(result.status, result.text[:100])
+
+传入 cache（crawl_state.ResponseCache）时自动发送条件请求，304 时返回缓存的正文。
+base_url 等由调用方拼接，指向本地 HTTP 服务器即可离线测试。
+"""
+
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+# 需要重试的状态码
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class FetchError(Exception):
+    """重试次数用尽仍未成功"""
+
+    def __init__(self, url, reason):
+        super().__init__(f'{url}: {reason}')
+        self.url = url
+        self.reason = reason
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    text: str
+    headers: CIMultiDict = field(default_factory=CIMultiDict)  # 不区分大小写
+    attempts: int = 1
+    from_cache: bool = False
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # 加锁使等待者按先来后到取得令牌
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """每个主机（host:port）各自一个令牌桶；rate 为 None 时不限速"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    async def acquire(self, url):
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+
+def _retry_after(headers):
+    """解析 Retry-After（秒数形式），无法解析时返回 None"""
+    value = headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Fetcher:
+    """
+    共享连接池和限速器的抓取器，需在 async with 中使用。
+    rate / burst: 每个主机每秒的平均请求数与突发上限；
+    connections / connections_per_host: 连接池大小；
+    retries: 最多重试次数；backoff: 第 n 次重试前等待 backoff×2^(n-1) 秒（上限 max_backoff，另加随机抖动）；
+    cache: 可选的 crawl_state.ResponseCache。
+    """
+
+    def __init__(self, rate=1.0, burst=1, headers=None, connections=20, connections_per_host=4,
+                 timeout=30, retries=4, backoff=1.0, max_backoff=60.0, encoding=None, cache=None):
+        self.limiter = HostRateLimiter(rate, burst)
+        self.headers = headers or {}
+        self.connections = connections
+        self.connections_per_host = connections_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.encoding = encoding
+        self.cache = cache
+        self.session = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'cache_hits': 0, 'not_modified': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.connections_per_host,
+                                         keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def _delay(self, attempt, headers=None):
+        retry_after = _retry_after(headers or {})
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * (0.5 + random.random() / 2)
+
+    async def fetch(self, url, headers=None):
+        """
+        GET 一个URL，返回 FetchResult；429/5xx/网络错误重试 retries 次后仍失败则抛出 FetchError。
+        有缓存时：未过期直接返回缓存，否则发送条件请求，304 时返回缓存的正文（from_cache=True）。
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if cached:
+            if self.cache.is_fresh(cached):
+                self.stats['cache_hits'] += 1
+                return FetchResult(url, cached['status'], cached['text'], attempts=0, from_cache=True)
+            headers = {**self.cache.validators(cached), **(headers or {})}
+
+        result = await self._fetch(url, headers)
+        if self.cache:
+            if result.status == 304 and cached:
+                self.stats['not_modified'] += 1
+                self.cache.touch(url, cached)
+                return FetchResult(url, cached['status'], cached['text'], result.headers, result.attempts,
+                                   from_cache=True)
+            if result.status == 200:
+                self.cache.put(url, result.status, result.text, result.headers)
+        return result
+
+    async def _fetch(self, url, headers):
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.limiter.acquire(url)
+            self.stats['requests'] += 1
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    text = await response.text(encoding=self.encoding, errors='replace')
+                    result = FetchResult(url, response.status, text, CIMultiDict(response.headers), attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason, retry_headers = f'{type(e).__name__}: {e}', None
+            else:
+                if result.status not in RETRY_STATUSES:
+                    return result
+                reason, retry_headers = f'HTTP {result.status}', result.headers
+
+            if attempt > self.retries:
+                self.stats['failures'] += 1
+                raise FetchError(url, reason)
+            self.stats['retries'] += 1
+            delay = self._delay(attempt, retry_headers)
+            print(f"⚠️ {url} {reason}，{delay:.1f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(delay)
+
+    async def fetch_all(self, urls):
+        """并发抓取多个URL，按输入顺序返回结果；失败的位置为 FetchError 实例"""
+        return await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
@@ -0,0 +1,351 @@
+"""
+采集状态：磁盘上的 HTTP 响应缓存与 SQLite 抓取队列（frontier）
+
+ResponseCache 按 URL 保存响应正文和 ETag / Last-Modified。再次请求时带上 If-None-Match /
+If-Modified-Since，服务器返回 304 时直接使用缓存的正文，未变化的页面不会重复下载；
+指定 fresh_for 时，保存时间不超过该秒数的页面完全不发请求。
+
+Frontier 在 SQLite 中记录每个 URL 的状态（pending / done / failed）。中断后重新运行时
+只处理未完成的 URL，已完成的页面不再抓取，结果文件以追加方式续写。
+
+SeenIndex 是结果CSV中已有 URL 的持久索引，跨运行去重时无需每次读取整个CSV；
+记录CSV的大小和指纹，CSV 被替换或编辑后自动重建。
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+
+
+class ResponseCache:
+    """每个 URL 一个 JSON 文件（正文与校验头），写入时先写临时文件再原子替换"""
+
+    def __init__(self, directory, fresh_for=None):
+        self.directory = directory
+        self.fresh_for = fresh_for
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    def get(self, url):
+        """返回缓存条目（dict：url, status, text, etag, last_modified, stored_at），没有时返回 None"""
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry):
+        return self.fresh_for is not None and time.time() - entry['stored_at'] <= self.fresh_for
+
+    @staticmethod
+    def validators(entry):
+        """条件请求头"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, status, text, headers):
+        """保存响应；没有 ETag 和 Last-Modified 的响应也保存，可用于 fresh_for 和离线重新解析"""
+        entry = {
+            'url': url,
+            'status': status,
+            'text': text,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return entry
+
+    def touch(self, url, entry):
+        """304 后更新保存时间（正文不变）"""
+        entry = dict(entry, stored_at=time.time())
+        return self.put(url, entry['status'], entry['text'],
+                        {'ETag': entry.get('etag'), 'Last-Modified': entry.get('last_modified')})
+
+
+class Frontier:
+    """
+    抓取队列。每个 URL 一行：kind（页面类型）、status、seq（加入顺序）、meta（JSON，如所属电影）、
+    attempts、error。同一 URL 只会加入一次。
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL DEFAULT 'pending',
+                seq INTEGER NOT NULL,
+                meta TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL
+            )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status, kind, seq)')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, urls, kind='', meta=None):
+        """加入新 URL（已存在的忽略），返回实际新增的数量"""
+        return self.add_items([(url, meta) for url in urls], kind)
+
+    def add_items(self, items, kind=''):
+        """加入 [(url, meta)]，各 URL 的 meta 不同时使用（同一事务），返回实际新增的数量"""
+        with self.conn:
+            start = self.conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM frontier').fetchone()[0]
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO frontier (url, kind, seq, meta, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(url, kind, start + i, json.dumps(meta, ensure_ascii=False) if meta is not None else None,
+                  time.time()) for i, (url, meta) in enumerate(items)])
+            return self.conn.total_changes - before
+
+    def pending(self, kind=None, include_failed=True, limit=None, max_attempts=None):
+        """待处理的 URL [(url, meta)]，按加入顺序；默认包括之前失败的，max_attempts 限制已尝试次数"""
+        statuses = ('pending', 'failed') if include_failed else ('pending',)
+        sql = f"SELECT url, meta FROM frontier WHERE status IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+        if kind is not None:
+            sql += ' AND kind = ?'
+            params.append(kind)
+        if max_attempts is not None:
+            sql += ' AND attempts < ?'
+            params.append(max_attempts)
+        sql += ' ORDER BY seq'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return [(url, json.loads(meta) if meta else None) for url, meta in self.conn.execute(sql, params)]
+
+    def mark_done(self, url):
+        with self.conn:
+            self.conn.execute("UPDATE frontier SET status = 'done', error = NULL, attempts = attempts + 1, "
+                              "updated_at = ? WHERE url = ?", (time.time(), url))
+
+    def mark_failed(self, url, error):
+        with self.conn:
+            self.conn.execute("UPDATE frontier SET status = 'failed', error = ?, attempts = attempts + 1, "
+                              "updated_at = ? WHERE url = ?", (str(error), time.time(), url))
+
+    def retry_failed(self, kind=None):
+        """把之前失败的 URL 重新标为待处理，返回数量"""
+        sql = "UPDATE frontier SET status = 'pending' WHERE status = 'failed'"
+        params = []
+        if kind is not None:
+            sql += ' AND kind = ?'
+            params.append(kind)
+        with self.conn:
+            return self.conn.execute(sql, params).rowcount
+
+    def rekey(self, key_func, kind=None):
+        """
+        把队列中的 URL 改写为 key_func(url)（如规范化 URL），原 URL 保存在 meta['url'] 中（已有时不覆盖）。
+        改写后重复的只保留一项，其中有已完成的则记为已完成。返回改写的行数；没有需要改写的行时不写数据库。
+        """
+        sql = 'SELECT url, status, meta FROM frontier'
+        params = []
+        if kind is not None:
+            sql += ' WHERE kind = ?'
+            params.append(kind)
+        changed = [(url, key_func(url), status, meta) for url, status, meta in self.conn.execute(sql, params)]
+        changed = [row for row in changed if row[1] != row[0]]
+        with self.conn:
+            for url, key, status, meta in changed:
+                meta = json.loads(meta) if meta else {}
+                meta.setdefault('url', url)
+                existing = self.conn.execute('SELECT status FROM frontier WHERE url = ?', (key,)).fetchone()
+                if existing is None:
+                    self.conn.execute('UPDATE frontier SET url = ?, meta = ? WHERE url = ?',
+                                      (key, json.dumps(meta, ensure_ascii=False), url))
+                    continue
+                if status == 'done':
+                    self.conn.execute("UPDATE frontier SET status = 'done', error = NULL WHERE url = ?", (key,))
+                self.conn.execute('DELETE FROM frontier WHERE url = ?', (url,))
+        return len(changed)
+
+    def counts(self, kind=None):
+        """各状态的 URL 数"""
+        sql = 'SELECT status, COUNT(*) FROM frontier'
+        params = []
+        if kind is not None:
+            sql += ' WHERE kind = ?'
+            params.append(kind)
+        return dict(self.conn.execute(sql + ' GROUP BY status', params).fetchall())
+
+    def reset(self):
+        """清空队列（重新开始）"""
+        with self.conn:
+            self.conn.execute('DELETE FROM frontier')
+
+
+# SeenIndex 指纹取样的字节数：已登记部分的开头和结尾各取这么多字节计算哈希
+FINGERPRINT_BYTES = 1 << 16
+
+
+def csv_fingerprint(path, size):
+    """
+    文件前 size 字节的指纹：开头和结尾各 FINGERPRINT_BYTES 字节的哈希（开头含表头），以及 inode 和修改时间。
+    只在末尾追加时开头和结尾的哈希不变；文件被替换或在已登记的范围内被编辑时通常会变化。
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = f.read(min(size, FINGERPRINT_BYTES))
+        f.seek(max(size - FINGERPRINT_BYTES, 0))
+        tail = f.read(min(size, FINGERPRINT_BYTES))
+    return {
+        'head': hashlib.sha256(head).hexdigest(),
+        'tail': hashlib.sha256(tail).hexdigest(),
+        'inode': stat.st_ino,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+class SeenIndex:
+    """
+    结果CSV中已写入的 URL 索引（SQLite）。key 为 normalize(URL)，同时记录索引对应的CSV大小和指纹（csv_fingerprint）：
+    每批先把行写入CSV并落盘，再在同一个事务中登记这批 URL、新的CSV大小和指纹（add）。
+    打开时只读取已登记范围开头和结尾的少量字节，正常情况下不读取整个CSV：
+      指纹一致、大小和修改时间都未变 → 直接使用；
+      已登记部分的指纹一致、CSV 比记录的大 → 上次中断在写入之后、登记之前，补登多出的行；
+      其他情况（CSV 被删除、替换、截断或编辑，或索引没有指纹）→ 按CSV重建一次索引。
+    补登或重建时只登记完整的行；末行写了一半时从CSV中删去，该文章下次运行重新写入。
+    """
+
+    def __init__(self, path, csv_path, url_column, normalize=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.csv_path = csv_path
+        self.url_column = url_column
+        self.normalize = normalize or (lambda url: url)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, url TEXT, added_at REAL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+        self.conn.commit()
+        self._reconcile()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, url):
+        return self.conn.execute('SELECT 1 FROM seen WHERE key = ?', (self.normalize(url),)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def key(self, url):
+        return self.normalize(url)
+
+    def add(self, urls, csv_size):
+        """登记已写入CSV并落盘的一批 URL，以及写入后的CSV大小和指纹（同一事务）"""
+        now = time.time()
+        fingerprint = csv_fingerprint(self.csv_path, csv_size) if csv_size else None
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO seen (key, url, added_at) VALUES (?, ?, ?)',
+                                  [(self.normalize(url), url, now) for url in urls])
+            self._set_meta(csv_size, fingerprint)
+
+    def _stored_meta(self):
+        meta = dict(self.conn.execute("SELECT name, value FROM meta WHERE name IN ('csv_size', 'csv_fingerprint')"))
+        fingerprint = meta.get('csv_fingerprint')
+        return meta.get('csv_size'), json.loads(fingerprint) if fingerprint else None
+
+    def _set_meta(self, size, fingerprint):
+        self.conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                              [('csv_size', size),
+                               ('csv_fingerprint', json.dumps(fingerprint) if fingerprint else None)])
+
+    def _matches(self, size, stored_size, stored_fingerprint):
+        """CSV 的前 stored_size 字节是否仍是登记时的内容"""
+        if not stored_size:
+            return stored_size == 0
+        if stored_fingerprint is None or size < stored_size:
+            return False
+        current = csv_fingerprint(self.csv_path, stored_size)
+        if any(current[name] != stored_fingerprint[name] for name in ('head', 'tail', 'inode')):
+            return False
+        # 大小未变时修改时间也应未变，否则是等长的编辑
+        return size > stored_size or current['mtime_ns'] == stored_fingerprint['mtime_ns']
+
+    def _reconcile(self):
+        size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+        stored, fingerprint = self._stored_meta()
+        if not self._matches(size, stored, fingerprint):
+            if size:
+                print(f'🔄 按 {self.csv_path} 重建去重索引')
+            with self.conn:
+                self.conn.execute('DELETE FROM seen')
+                self._set_meta(0, None)
+            stored = 0
+        if size > stored:
+            self._index_csv(stored)
+
+    def _index_csv(self, start):
+        """
+        登记CSV中 start 字节之后的完整行。末行不完整（中断于写入中途：没有换行结尾，或字段数不足）时
+        从CSV中删去，不登记，其中的文章下次运行重新抓取写入
+        """
+        with open(self.csv_path, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+            column = header.index(self.url_column)
+            offset = max(start, f.tell())
+            f.seek(offset)
+            position = {'end': offset, 'newline': True}
+
+            def lines():
+                # csv.reader 逐个取物理行，每产出一行后 position['end'] 即为该行结束处
+                for line in f:
+                    position['end'] += len(line)
+                    position['newline'] = line.endswith(b'\n')
+                    yield line.decode('utf-8', errors='replace')
+
+            # 每行要等读到下一行（或确认末行完整）后才登记
+            urls, complete_end, previous = [], offset, None
+            for row in csv.reader(lines()):
+                if previous is not None:
+                    urls.append(previous[0])
+                    complete_end = previous[1]
+                previous = (row[column] if len(row) > column else '', position['end'], len(row))
+            if previous is not None and position['newline'] and (previous[2] >= len(header) or previous[2] == 0):
+                urls.append(previous[0])
+                complete_end = previous[1]
+            size = position['end']
+        urls = [url for url in urls if url]
+        if complete_end < size:
+            with open(self.csv_path, 'r+b') as f:
+                f.truncate(complete_end)
+            print(f'⚠️ {self.csv_path} 末行不完整（写入中途中断），已删除，下次运行重新抓取')
+        self.add(urls, os.path.getsize(self.csv_path))
+        print(f'📇 去重索引补登 {len(urls)} 条，共 {len(self)} 条')
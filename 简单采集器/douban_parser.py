@@ -0,0 +1,308 @@
+"""
+豆瓣页面解析：Top250 列表页，以及影评抓取模式用到的详情页、影评列表页和影评全文
+
+原先每页都用 html.parser 解析整页再对每个 div.item 多次 find，重新解析大量缓存页面时 CPU 主要耗在这里。
+这里把"取出各字段的原始文本"和"由文本拆出字段"分开：后者（导演/主演拆分、年份/国家/类型正则等）
+各后端共用，保证结果逐字段一致；前者有三种后端：
+    'bs4'       原实现：html.parser 解析整页
+    'strainer'  BeautifulSoup + SoupStrainer，只构建 div.item 子树（有 lxml 时用 lxml 解析器）
+    'lxml'      lxml.html + XPath，只在 div.item 内取文本（最快，默认）
+
+基准测试（同时核对各后端结果一致）：
+    python douban_parser.py <HTML文件或目录（含 crawl_state 的 http_cache）>... [--repeat 3]
+    python douban_parser.py --check   使用 fixtures/douban 中保存的列表页校验各后端的解析结果
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from urllib.parse import urljoin
+
+FIELDS = ['排名', '电影名称', '评分', '导演', '主演', '年份', '国家', '类型', '简介']
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'douban')
+
+
+def _has_lxml():
+    try:
+        import lxml.html  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+DEFAULT_BACKEND = 'lxml' if _has_lxml() else 'strainer'
+
+
+def build_row(index, title, rating, info, quote):
+    """由一个条目的原始文本拆出各字段（与原 get_movies 的处理完全相同）"""
+    info_parts = info.strip().split('\n')
+
+    # 提取导演和主演信息
+    director_actors = info_parts[0].strip().split('   ')
+    director = director_actors[0].replace('导演: ', '')
+    actors = director_actors[1].replace('主演: ', '') if len(director_actors) > 1 else ''
+
+    # 提取年份、国家和类型
+    misc_info = re.search(r'(\d+) / (.*?) / (.*)', info_parts[1].strip())
+    year = misc_info.group(1) if misc_info else ''
+    country = misc_info.group(2) if misc_info else ''
+    genre = misc_info.group(3) if misc_info else ''
+
+    # 处理可能不存在的简介
+    return [index, title, rating, director, actors, year, country, genre, quote or '']
+
+
+# --- 各后端：对每个 div.item 取出 (排名, 标题, 评分, bd 段落, 简介) 的原始文本 ---
+
+def _bs4_item_texts(item):
+    bd = item.find('div', class_='bd')
+    quote = item.find('span', class_='inq')
+    return (item.find('em').text, item.find('span', class_='title').text,
+            item.find('span', class_='rating_num').text, bd.find('p').text, quote.text if quote else '')
+
+
+def _parse_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [_bs4_item_texts(item) for item in soup.find_all('div', class_='item')]
+
+
+def _class_strainer(*names):
+    """只构建带指定 class 的 div 子树（SoupStrainer 按整个 class 字符串匹配，需用正则匹配其中一个类名）"""
+    from bs4 import SoupStrainer
+    return SoupStrainer('div', class_=re.compile(rf"(^|\s)({'|'.join(map(re.escape, names))})(\s|$)"))
+
+
+def _parse_strainer(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'lxml' if _has_lxml() else 'html.parser', parse_only=_class_strainer('item'))
+    return [_bs4_item_texts(item) for item in soup.find_all('div', class_='item')]
+
+
+def _class_test(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 与 BeautifulSoup 的 find 相同：取文档顺序中第一个匹配的后代
+_ITEM_XPATH = f"//div[{_class_test('item')}]"
+_FIELD_XPATHS = {
+    'index': '(.//em)[1]',
+    'title': f"(.//span[{_class_test('title')}])[1]",
+    'rating': f"(.//span[{_class_test('rating_num')}])[1]",
+    'info': f"((.//div[{_class_test('bd')}])[1]//p)[1]",
+    'quote': f"(.//span[{_class_test('inq')}])[1]",
+}
+
+
+_compiled_finders = None
+
+
+def _field_finders():
+    """预编译的 XPath（只编译一次）"""
+    global _compiled_finders
+    if _compiled_finders is None:
+        from lxml import etree
+        _compiled_finders = {name: etree.XPath(path) for name, path in _FIELD_XPATHS.items()}
+    return _compiled_finders
+
+
+def _parse_lxml(html):
+    import lxml.html
+    try:
+        root = lxml.html.fromstring(html)
+    except ValueError:  # 带编码声明的字符串需以字节解析
+        root = lxml.html.fromstring(html.encode('utf-8'))
+    items = []
+    for item in root.xpath(_ITEM_XPATH):
+        texts = {}
+        for name, find in _field_finders().items():
+            found = find(item)
+            if found:
+                texts[name] = found[0].text_content()
+            elif name == 'quote':
+                texts[name] = ''
+            else:
+                raise AttributeError(f"条目中缺少 {name}")
+        items.append((texts['index'], texts['title'], texts['rating'], texts['info'], texts['quote']))
+    return items
+
+
+BACKENDS = {'bs4': _parse_bs4, 'strainer': _parse_strainer, 'lxml': _parse_lxml}
+
+
+def parse_movies(html, backend=DEFAULT_BACKEND):
+    """解析列表页，返回每部电影一行 [排名, 电影名称, 评分, 导演, 主演, 年份, 国家, 类型, 简介]"""
+    return [build_row(*texts) for texts in BACKENDS[backend](html)]
+
+
+# --- 详情页与影评页（影评抓取模式使用） ---
+
+REVIEW_FIELDS = ['排名', '电影', '影评ID', '用户', '评分', '时间', '标题', '内容', '有用数', '链接']
+
+
+def _soup(html, parse_only=None):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'lxml' if _has_lxml() else 'html.parser', parse_only=parse_only)
+
+
+def parse_subject_links(html, base_url=''):
+    """列表页中每部电影的 (排名, 电影名称, 详情页URL)"""
+    links = []
+    for item in _soup(html, _class_strainer('item')).find_all('div', class_='item'):
+        link = item.select_one('div.hd a[href]') or item.find('a', href=True)
+        if link:
+            links.append((item.find('em').text, item.find('span', class_='title').text,
+                          urljoin(base_url, link['href'])))
+    return links
+
+
+def parse_subject(html, url):
+    """详情页：电影名称与"全部影评"页URL（找不到链接时按豆瓣的固定路径拼接）"""
+    soup = _soup(html)
+    title = soup.find('span', property='v:itemreviewed')
+    link = soup.find('a', href=re.compile(r'/reviews/?(\?.*)?$'))
+    return {
+        'title': title.text.strip() if title else '',
+        'reviews_url': urljoin(url, link['href'] if link else 'reviews'),
+    }
+
+
+def _review_text(node):
+    text = node.get_text().strip() if node else ''
+    return re.sub(r'\s*\(展开\)$', '', text).strip()
+
+
+def parse_reviews(html, url):
+    """影评列表页：返回 (影评列表, 下一页URL或None)；每条影评为 dict，内容为列表页上的摘要"""
+    soup = _soup(html, _class_strainer('review-item', 'paginator'))
+    reviews = []
+    for item in soup.find_all('div', class_='review-item'):
+        rid = item.get('id') or item.find(attrs={'data-rid': True})['data-rid']
+        user = item.find('a', class_='name')
+        rating = item.find('span', class_=re.compile(r'^allstar\d+'))
+        stars = re.search(r'allstar(\d+)', ' '.join(rating['class'])) if rating else None
+        meta = item.find('span', class_='main-meta')
+        title = item.select_one('div.main-bd h2 a')
+        useful = item.find('span', id=re.compile(r'^r-useful_count'))
+        reviews.append({
+            'id': rid,
+            'user': user.text.strip() if user else '',
+            'rating': str(int(stars.group(1)) // 10) if stars else '',
+            'time': (meta.get('content') or meta.text.strip()) if meta else '',
+            'title': title.text.strip() if title else '',
+            'content': _review_text(item.find('div', class_='short-content')),
+            'useful': useful.text.strip() if useful else '',
+            'url': urljoin(url, title['href']) if title else '',
+        })
+    next_link = soup.select_one('span.next a[href]')
+    return reviews, urljoin(url, next_link['href']) if next_link else None
+
+
+def full_review_url(review_page_url, review_id):
+    """豆瓣展开全文使用的接口，返回 JSON，html 字段为正文"""
+    return urljoin(review_page_url, f'/j/review/{review_id}/full')
+
+
+def parse_full_review(text):
+    """展开全文接口的响应 → 纯文本正文，段落之间换行"""
+    soup = _soup(json.loads(text).get('html', ''))
+    paragraphs = [p.get_text().strip() for p in soup.find_all('p')]
+    return '\n'.join(p for p in paragraphs if p) or soup.get_text().strip()
+
+
+# --- 基准测试 ---
+
+def load_fixtures(paths):
+    """读取 .html 文件，或 crawl_state.ResponseCache 保存的 .json 条目（目录递归查找，其他 JSON 跳过）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(('.html', '.htm', '.json')))
+        else:
+            files.append(path)
+    pages = []
+    for file_path in sorted(files):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            if not file_path.endswith('.json'):
+                pages.append(f.read())
+                continue
+            entry = json.load(f)
+        if isinstance(entry, dict) and 'text' in entry:
+            pages.append(entry['text'])
+    return pages
+
+
+def benchmark(pages, backends=tuple(BACKENDS), repeat=3):
+    """各后端解析全部页面的最短耗时；以 'bs4' 为基准核对结果逐字段一致"""
+    reference = [parse_movies(page, 'bs4') for page in pages]
+    results = {}
+    for backend in backends:
+        rows = [parse_movies(page, backend) for page in pages]
+        mismatches = sum(a != b for a, b in zip(rows, reference))
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for page in pages:
+                parse_movies(page, backend)
+            best = min(best, time.perf_counter() - start)
+        results[backend] = {'seconds': best, 'mismatched_pages': mismatches}
+    return results
+
+
+def available_backends():
+    """当前环境可用的后端（未安装 lxml 时没有 'lxml'）"""
+    return [backend for backend in BACKENDS if backend != 'lxml' or _has_lxml()]
+
+
+def check_fixtures(fixture_dir=FIXTURE_DIR, backends=None):
+    """
+    使用保存的列表页校验各后端：解析结果须与 top250_expected.json 逐字段一致（含没有简介的条目），
+    benchmark 也须报告全部一致。返回核对的条目数。
+    """
+    backends = backends or available_backends()
+    with open(os.path.join(fixture_dir, 'top250_expected.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    pages = []
+    for name, rows in expected.items():
+        page = load_fixtures([os.path.join(fixture_dir, name)])[0]
+        pages.append(page)
+        for backend in backends:
+            if parse_movies(page, backend) != rows:
+                raise AssertionError(f"{backend} 后端解析 {name} 的结果与预期不一致")
+    mismatched = {backend: result['mismatched_pages']
+                  for backend, result in benchmark(pages, backends, repeat=1).items() if result['mismatched_pages']}
+    if mismatched:
+        raise AssertionError(f"benchmark 报告结果不一致: {mismatched}")
+    return sum(len(rows) for rows in expected.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='豆瓣列表页解析基准测试')
+    parser.add_argument('paths', nargs='*', help='HTML 文件或目录（可为抓取状态目录中的 http_cache）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最短耗时')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=None)
+    parser.add_argument('--check', action='store_true', help='使用保存的列表页校验各后端的解析结果')
+    args = parser.parse_args()
+
+    if args.check:
+        items = check_fixtures(backends=args.backends)
+        print(f"✅ {', '.join(args.backends or available_backends())} 后端解析 {items} 个条目均与预期一致")
+        sys.exit()
+    if not args.paths:
+        parser.error('请指定 HTML 文件或目录，或使用 --check')
+    args.backends = args.backends or available_backends()
+    pages = load_fixtures(args.paths)
+    if not pages:
+        sys.exit('没有找到 HTML 页面')
+    items = sum(len(parse_movies(page, 'bs4')) for page in pages)
+    print(f"📄 {len(pages)} 个页面，{items} 个条目")
+    results = benchmark(pages, args.backends, args.repeat)
+    baseline = results.get('bs4', {}).get('seconds')
+    for backend, result in results.items():
+        speedup = f"{baseline / result['seconds']:5.1f}x" if baseline else ''
+        status = '✅ 一致' if result['mismatched_pages'] == 0 else f"❌ {result['mismatched_pages']} 页不一致"
+        print(f"  {backend:<9} {result['seconds'] * 1000 / len(pages):8.2f} ms/页  {speedup}  {status}")
@@ -0,0 +1,82 @@
+"""
+本地测试服务器：用 fixtures/ 中保存的页面代替豆瓣、微信公众号等站点，供各采集脚本的 --check 离线校验
+抓取、续抓和失败重试。
+
+    routes = {'/top250?start=0': 'douban/top250_start0.html', '/subject/1292052/': 'douban/subject_1292052.html'}
+    async with FixtureServer(routes, origin='https://movie.douban.com', fail={'/top250?start=0': 2}) as server:
+        ...  # 以 server.base_url 代替站点地址抓取；server.hits 为收到的请求
+
+- 先按完整的路径和查询串匹配 routes，再只按路径匹配，都没有时返回 404；
+- 返回的页面中 origin 替换为本服务器地址，页面里的绝对链接也指向本地；
+- fail 中的路径（写法同 routes 的键）前几次请求返回 503（Retry-After: 0），用于测试重试和续抓；
+- 响应带 ETag，可测试条件请求和 304。
+"""
+
+import os
+import socket
+import hashlib
+
+from aiohttp import web
+
+FIXTURE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CONTENT_TYPES = {'.html': 'text/html', '.htm': 'text/html', '.json': 'application/json'}
+
+
+class FixtureServer:
+    """
+    routes: {路径（可带查询串）: fixtures 目录下的文件}；directory 为 fixtures 目录
+    origin: 页面中要替换为本服务器地址的站点地址；fail: {路径: 返回 503 的次数}
+    """
+
+    def __init__(self, routes, directory=FIXTURE_ROOT, origin=None, fail=None):
+        self.routes = routes
+        self.directory = directory
+        self.origin = origin
+        self.fail = dict(fail or {})
+        self.hits = []
+        self.base_url = None
+        self._runner = None
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))  # 由系统分配空闲端口
+        await web.SockSite(self._runner, sock).start()
+        self.base_url = f'http://127.0.0.1:{sock.getsockname()[1]}'
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._runner.cleanup()
+
+    def _route(self, request):
+        for key in (request.path_qs, request.path):
+            if key in self.routes:
+                return key
+        return None
+
+    async def _handle(self, request):
+        self.hits.append(request.path_qs)
+        key = self._route(request)
+        if key is None:
+            return web.Response(status=404, text='not found')
+        if self.fail.get(key):
+            self.fail[key] -= 1
+            return web.Response(status=503, headers={'Retry-After': '0'}, text='service unavailable')
+
+        path = os.path.join(self.directory, self.routes[key])
+        with open(path, 'r', encoding='utf-8') as f:
+            body = f.read()
+        if self.origin:
+            body = body.replace(self.origin, self.base_url)
+        etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'text/plain')
+        return web.Response(text=body, content_type=content_type, charset='utf-8', headers={'ETag': etag})
+
+    def count(self, prefix=''):
+        """路径以 prefix 开头的请求数"""
+        return sum(1 for hit in self.hits if hit.startswith(prefix))
@@ -1,31 +1,156 @@
 from miku_ai import get_wexin_article
+import os
+import argparse
 import asyncio
 import csv
 
-# 存储已爬取的 URL，用于去重
-seen_urls = set()
+from async_fetcher import TokenBucket
+from crawl_state import SeenIndex
+from wechat import normalize_wechat_url, open_body_frontier, article_item, fetch_bodies, BODY_DIR, BODY_WORKERS
 
-async def main():
-    query = "开盒挂人"
-    articles = await get_wexin_article(query, top_num=20)
-    
-    # 打开 CSV 文件，准备写入数据
-    with open('articles.csv', mode='a', newline='', encoding='utf-8') as file:
+OUTPUT_CSV = 'articles.csv'
+CSV_HEADER = ['标题', 'URL', '来源', '日期']
+
+# 默认关键词；批量时用 --keywords 指定关键词文件（每行一个，# 开头为注释）
+QUERIES = ["开盒挂人"]
+TOP_NUM = 20
+
+# 批量搜索参数：同时进行的搜索数、搜索频率（每秒次数，0.5 即平均每 2 秒发起一次，0 或 None 不限速）与突发上限、
+# 单个关键词失败后的重试次数
+CONCURRENCY = 4
+RATE = 0.5
+BURST = 2
+RETRIES = 2
+
+def index_path(output_csv):
+    """去重索引与输出CSV放在一起：articles.csv → articles.seen.sqlite3"""
+    return os.path.splitext(output_csv)[0] + '.seen.sqlite3'
+
+def load_keywords(path):
+    """读取关键词文件，去除空行、注释和重复"""
+    with open(path, 'r', encoding='utf-8') as f:
+        keywords = [line.strip() for line in f]
+    return list(dict.fromkeys(k for k in keywords if k and not k.startswith('#')))
+
+async def search(query, top_num, semaphore, bucket, retries=RETRIES, search_func=get_wexin_article):
+    """在并发上限和频率限制内搜索一个关键词（bucket 为 None 时不限速），失败时退避重试，仍失败返回空列表"""
+    async with semaphore:
+        for attempt in range(retries + 1):
+            if bucket is not None:
+                await bucket.acquire()
+            try:
+                return await search_func(query, top_num=top_num) or []
+            except Exception as e:
+                if attempt == retries:
+                    print(f"⚠️ 关键词「{query}」搜索失败：{e}")
+                    return []
+                print(f"⚠️ 关键词「{query}」搜索出错（{e}），第 {attempt + 1} 次重试")
+                await asyncio.sleep(2 ** attempt)
+
+async def write_articles(queue, output_csv=OUTPUT_CSV, body_frontier=None, body_queue=None):
+    """
+    唯一的写入协程：整个批次只打开一次CSV，收到 None 时结束，返回新增篇数。
+    按规范化后的 URL 跨运行去重（索引见 crawl_state.SeenIndex），每个关键词的结果写入并落盘后
+    再登记到索引，中断后重新运行不会重复写入，也不会漏掉已写入的文章。
+    抓取正文时，新文章在登记到索引之前加入正文抓取队列，并交给正文抓取阶段（body_queue）。
+    """
+    count = 0
+    with SeenIndex(index_path(output_csv), output_csv, 'URL', normalize_wechat_url) as seen, \
+            open(output_csv, mode='a', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
         # 写入表头（如果文件为空）
         if file.tell() == 0:
-            writer.writerow(['标题', 'URL', '来源', '日期'])
-        
-        for article in articles:
-            # 检查 URL 是否已存在
-            if article['url'] not in seen_urls:
-                seen_urls.add(article['url'])
-                # 写入数据
+            writer.writerow(CSV_HEADER)
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            query, articles = item
+            urls, new_items, batch_keys = [], [], set()
+            for article in articles:
+                # 检查 URL 是否已存在（包括本批中的重复）
+                key = seen.key(article['url'])
+                if key in batch_keys or article['url'] in seen:
+                    continue
+                batch_keys.add(key)
+                urls.append(article['url'])
+                new_items.append(article_item(article['url'], article['title'], article['source'], article['date']))
                 writer.writerow([article['title'], article['url'], article['source'], article['date']])
-                print("标题：", article['title'])
+                print(f"[{query}] 标题：", article['title'])
                 print("URL：", article['url'])
                 print("来源：", article['source'])
                 print("日期：", article['date'])
                 print("-" * 50)
+            file.flush()
+            os.fsync(file.fileno())
+            if body_frontier is not None:
+                body_frontier.add_items(new_items, kind='article')
+            seen.add(urls, os.fstat(file.fileno()).st_size)
+            count += len(urls)
+            if body_queue is not None:
+                for new_item in new_items:
+                    await body_queue.put(new_item)
+    return count
+
+async def crawl(queries, top_num=TOP_NUM, output_csv=OUTPUT_CSV, concurrency=CONCURRENCY, rate=RATE, burst=BURST,
+                retries=RETRIES, search_func=get_wexin_article, bodies_dir=None, body_workers=BODY_WORKERS):
+    """
+    并发搜索全部关键词，每个关键词的结果搜完即交给写入协程；返回新增篇数。
+    指定 bodies_dir 时同时运行正文抓取阶段（见 wechat.fetch_bodies）：新文章一写入CSV就开始抓取正文，
+    上次未完成的文章也一并处理。
+    """
+    if bodies_dir:
+        with open_body_frontier(bodies_dir) as body_frontier:
+            body_queue = asyncio.Queue()
+            body_task = asyncio.create_task(fetch_bodies(body_frontier, bodies_dir, body_queue, workers=body_workers))
+            try:
+                return await _crawl(queries, top_num, output_csv, concurrency, rate, burst, retries, search_func,
+                                    body_frontier, body_queue)
+            finally:
+                await body_queue.put(None)
+                await body_task
+    return await _crawl(queries, top_num, output_csv, concurrency, rate, burst, retries, search_func)
+
+async def _crawl(queries, top_num, output_csv, concurrency, rate, burst, retries, search_func,
+                 body_frontier=None, body_queue=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    # 与 async_fetcher.HostRateLimiter 一致：rate 为 0 或 None 时不限速
+    bucket = TokenBucket(rate, burst) if rate else None
+    queue = asyncio.Queue()
+    writer_task = asyncio.create_task(write_articles(queue, output_csv, body_frontier, body_queue))
+
+    async def run(query):
+        articles = await search(query, top_num, semaphore, bucket, retries, search_func)
+        await queue.put((query, articles))
+        return len(articles)
+
+    try:
+        found = await asyncio.gather(*(run(query) for query in queries))
+    finally:
+        await queue.put(None)
+        count = await writer_task
+    print(f"📊 {len(queries)} 个关键词共搜到 {sum(found)} 篇，新增 {count} 篇")
+    return count
+
+async def main():
+    parser = argparse.ArgumentParser(description='微信公众号文章搜索（支持多关键词批量）')
+    parser.add_argument('--query', action='append', help='搜索关键词，可重复指定')
+    parser.add_argument('--keywords', help='关键词文件，每行一个')
+    parser.add_argument('--top-num', type=int, default=TOP_NUM, help='每个关键词的结果数')
+    parser.add_argument('--output', default=OUTPUT_CSV, help='输出CSV路径')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='同时进行的搜索数')
+    parser.add_argument('--rate', type=float, default=RATE, help='每秒发起的搜索数，0 表示不限速')
+    parser.add_argument('--bodies', nargs='?', const=BODY_DIR, default=None,
+                        help=f'同时抓取新文章的正文，保存为 TXT 的目录（默认 {BODY_DIR}）')
+    parser.add_argument('--body-workers', type=int, default=BODY_WORKERS, help='正文抓取的并发工作协程数')
+    args = parser.parse_args()
+    if args.rate < 0:
+        parser.error('--rate 不能为负数')
+
+    queries = (args.query or []) + (load_keywords(args.keywords) if args.keywords else [])
+    await crawl(queries or QUERIES, top_num=args.top_num, output_csv=args.output,
+                concurrency=args.concurrency, rate=args.rate, bodies_dir=args.bodies,
+                body_workers=args.body_workers)
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,351 @@
+"""
+微信公众号文章：URL 规范化与正文抓取
+
+同一篇文章的链接常带不同的跟踪参数（chksm、scene、sessionid、分享来源等），或在网页中被转义成 &amp;，
+直接按 URL 去重会把同一篇文章当成多篇。normalize_wechat_url 只保留能唯一确定文章的部分：
+    https://mp.weixin.qq.com/s?__biz=..&mid=..&idx=..&sn=..   长链接，保留 __biz / mid / idx / sn
+    https://mp.weixin.qq.com/s/<token>                       短链接，去掉全部参数
+    https://mp.weixin.qq.com/mp/appmsg/show?__biz=..&appmsgid=..&itemidx=..&sign=..   旧版链接
+其他站点的链接只统一协议和域名大小写、去掉 utm_* 参数和 #锚点。
+
+fetch_bodies 从抓取队列取出新文章，经共享连接池并发抓取文章页，提取 #js_content 的正文，
+每篇写成一个 TXT（按哈希分子目录，只含正文），可直接交给 预处理工具/ 中的
+check_and_delete_error_files.py 和 file_deduplicator.py；标题、公众号、链接等记录在 manifest.csv。
+抓取进度保存在输出目录的 frontier.sqlite3 中，中断后重新运行只处理未完成的文章。
+
+单独运行（为已有的 articles.csv 补抓正文，其他参数见 --help）:
+    python wechat.py articles.csv --out articles_txt
+    python wechat.py articles.csv --base-url http://127.0.0.1:8080   # 请求发往本地测试服务器
+    python wechat.py --check                                          # 用 fixtures/wechat 中的页面离线校验
+"""
+
+import os
+import re
+import csv
+import asyncio
+import hashlib
+import argparse
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from async_fetcher import Fetcher, FetchError
+from crawl_state import Frontier
+
+WECHAT_HOSTS = {'mp.weixin.qq.com'}
+ARTICLE_PARAMS = ('__biz', 'mid', 'idx', 'sn')
+LEGACY_ARTICLE_PARAMS = ('__biz', 'appmsgid', 'itemidx', 'sign')
+
+
+def normalize_wechat_url(url):
+    """返回用于去重的规范 URL（同一篇文章的不同链接得到相同结果）"""
+    url = url.strip().replace('&amp;', '&')
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.endswith(':443') or host.endswith(':80'):
+        host = host.rsplit(':', 1)[0]
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host in WECHAT_HOSTS:
+        path = parts.path.rstrip('/') or '/'
+        if path.startswith('/s/'):
+            return f'https://{host}{path}'
+        params = dict(query)
+        keep = ARTICLE_PARAMS if 'mid' in params else LEGACY_ARTICLE_PARAMS
+        kept = [(name, params[name]) for name in keep if name in params]
+        if kept:
+            return f'https://{host}{path}?{urlencode(kept)}'
+
+    query = [(name, value) for name, value in query if not name.lower().startswith('utm_')]
+    return urlunsplit((parts.scheme.lower(), host, parts.path, urlencode(query), ''))
+
+
+# --- 正文抓取 ---
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+BODY_DIR = 'articles_txt'
+MANIFEST_HEADER = ['文件', '标题', '公众号', 'URL', '来源', '日期']
+
+# 抓取参数：工作协程数、每秒请求数与突发上限、连接数、单次请求的重试次数，
+# 以及一篇文章最多尝试几轮（已删除或只有图片的文章不会无限重试）
+BODY_WORKERS = 4
+BODY_RATE = 1.0
+BODY_BURST = 3
+BODY_CONNECTIONS = 4
+BODY_RETRIES = 3
+MAX_ATTEMPTS = 3
+
+# --check：用 fixtures/wechat 中保存的文章页在本地服务器上校验正文抓取（见 fixture_server.py）。
+# articles.csv 中前两篇各有一条带跟踪参数的重复链接；第三篇前几次请求失败，第四篇已删除
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CHECK_ORIGIN = 'https://mp.weixin.qq.com'
+CHECK_ROUTES = {
+    '/s/Xq3bLm0DataNews1': 'wechat/article_datanews.html',
+    '/s': 'wechat/article_textmining.html',  # 唯一的长链接文章，按路径匹配
+    '/s/Fk7pQz2Crawler9': 'wechat/article_crawler.html',
+    '/s/Dl4eTd0Removed5': 'wechat/article_deleted.html',
+}
+CHECK_EXPECTED = os.path.join(FIXTURE_DIR, 'wechat', 'manifest_expected.csv')
+CHECK_TEXTS = os.path.join(FIXTURE_DIR, 'wechat', 'texts_expected.json')
+
+# 正文中的块级元素，结束处换行
+BLOCK_TAGS = ['p', 'section', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'blockquote', 'pre', 'tr',
+              'figure', 'figcaption']
+
+
+def _soup(html):
+    from bs4 import BeautifulSoup
+    try:
+        import lxml  # noqa: F401
+        return BeautifulSoup(html, 'lxml')
+    except ImportError:
+        return BeautifulSoup(html, 'html.parser')
+
+
+def extract_article(html):
+    """
+    从文章页提取 {'title', 'account', 'text'}；正文按段落换行，段内空白合并。
+    页面没有 #js_content（已删除、需要验证等）或正文为空时返回 None。
+    """
+    soup = _soup(html)
+    content = soup.find(id='js_content')
+    if content is None:
+        return None
+    for tag in content(['script', 'style', 'noscript']):
+        tag.decompose()
+    for br in content.find_all('br'):
+        br.replace_with('\n')
+    for block in content.find_all(BLOCK_TAGS):
+        block.append('\n')
+    lines = (re.sub(r'\s+', ' ', line).strip() for line in content.get_text().split('\n'))
+    text = '\n'.join(line for line in lines if line)
+    if not text:
+        return None
+
+    title = soup.find(id='activity-name') or soup.find(class_='rich_media_title')
+    og_title = soup.find('meta', property='og:title')
+    account = soup.find(id='js_name')
+    return {
+        'title': title.get_text().strip() if title else (og_title.get('content', '') if og_title else ''),
+        'account': account.get_text().strip() if account else '',
+        'text': text,
+    }
+
+
+def article_filename(url):
+    """TXT 的相对路径：按规范化 URL 的哈希命名，前两位作为子目录，同一篇文章总是同一个文件"""
+    digest = hashlib.sha1(normalize_wechat_url(url).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(digest[:2], digest + '.txt')
+
+
+def rebase_url(url, base_url):
+    """把 url 的协议和域名换成 base_url（如本地测试服务器），路径和查询串不变"""
+    base = urlsplit(base_url)
+    parts = urlsplit(url.replace('&amp;', '&'))
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ''))
+
+
+def open_body_frontier(output_dir):
+    """正文抓取队列，按规范化 URL 记录（旧版按原始链接记录的队列在打开时改写，同一篇文章的重复链接合并）"""
+    frontier = Frontier(os.path.join(output_dir, 'frontier.sqlite3'))
+    frontier.rekey(normalize_wechat_url, kind='article')
+    return frontier
+
+
+def article_meta(title='', source='', date=''):
+    """搜索结果中随 URL 一起保存的信息，写入 manifest.csv"""
+    return {'title': title, 'source': source, 'date': date}
+
+
+def article_item(url, title='', source='', date=''):
+    """
+    正文抓取队列中的一项 (规范化 URL, meta)：队列按规范化 URL 去重，同一篇文章的不同链接只抓取一次；
+    原始链接保存在 meta['url'] 中，用于请求和写入 manifest.csv
+    """
+    return normalize_wechat_url(url), dict(article_meta(title, source, date), url=url)
+
+
+def enqueue_csv(frontier, csv_path):
+    """把 articles.csv 中的全部文章加入正文抓取队列（已在队列中的和同一篇文章的重复链接忽略），返回新增数量"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        items = [article_item(row['URL'], row.get('标题', ''), row.get('来源', ''), row.get('日期', ''))
+                 for row in csv.DictReader(f) if row.get('URL')]
+    return frontier.add_items(items, kind='article')
+
+
+def _open_manifest(output_dir):
+    path = os.path.join(output_dir, 'manifest.csv')
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    file = open(path, 'a', newline='', encoding='utf-8-sig' if new else 'utf-8')
+    writer = csv.writer(file)
+    if new:
+        writer.writerow(MANIFEST_HEADER)
+    return file, writer
+
+
+def save_article(output_dir, relative_path, text):
+    """先写临时文件再原子替换，预处理工具不会读到写了一半的 TXT"""
+    path = os.path.join(output_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+    os.replace(tmp_path, path)
+
+
+async def fetch_bodies(frontier, output_dir=BODY_DIR, incoming=None, workers=BODY_WORKERS, rate=BODY_RATE,
+                       burst=BODY_BURST, connections=BODY_CONNECTIONS, retries=BODY_RETRIES,
+                       max_attempts=MAX_ATTEMPTS, base_url=None):
+    """
+    抓取正文：先处理队列中未完成的文章（含上次失败的），再处理 incoming 送来的新文章（article_item 的结果），
+    incoming 收到 None 时结束；不传 incoming 时处理完队列即结束。返回本次保存的篇数。
+    每篇先写 TXT、追加 manifest 并落盘，再在队列中标记完成；同一篇文章（规范化 URL 相同）只抓取一次。
+    指定 base_url 时请求发往该地址（见 rebase_url），TXT 文件名和 manifest 中的链接仍按原始链接。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = asyncio.Queue(maxsize=workers * 2)
+    dispatched = set()
+    stats = {'saved': 0, 'failed': 0}
+    file, writer = _open_manifest(output_dir)
+
+    async def worker():
+        while True:
+            key, url, meta = await tasks.get()
+            try:
+                result = await fetcher.fetch(rebase_url(url, base_url) if base_url else url)
+                if result.status != 200:
+                    raise FetchError(url, f'HTTP {result.status}')
+                article = extract_article(result.text)
+                if article is None:
+                    raise FetchError(url, '未找到正文（文章已删除、需要验证或只有图片）')
+                relative_path = article_filename(url)
+                save_article(output_dir, relative_path, article['text'])
+                writer.writerow([relative_path, article['title'] or meta.get('title', ''), article['account'],
+                                 url, meta.get('source', ''), meta.get('date', '')])
+                file.flush()
+                os.fsync(file.fileno())
+                frontier.mark_done(key)
+                stats['saved'] += 1
+                print(f"📝 {article['title'] or url} → {relative_path}")
+            except Exception as e:
+                frontier.mark_failed(key, e)
+                stats['failed'] += 1
+                print(f"⚠️ 正文抓取失败，下次运行时重试：{e}")
+            finally:
+                tasks.task_done()
+
+    async def dispatch(key, meta):
+        """key 为规范化 URL（队列中的键），按原始链接 meta['url'] 请求"""
+        if key not in dispatched:
+            dispatched.add(key)
+            meta = meta or {}
+            await tasks.put((key, meta.get('url') or key, meta))
+
+    with file:
+        async with Fetcher(rate=rate, burst=burst, headers=HEADERS, connections=connections,
+                           connections_per_host=connections, retries=retries) as fetcher:
+            worker_tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+            try:
+                for url, meta in frontier.pending('article', max_attempts=max_attempts):
+                    await dispatch(url, meta)
+                if incoming is not None:
+                    while (item := await incoming.get()) is not None:
+                        await dispatch(*item)
+                await tasks.join()
+            finally:
+                for task in worker_tasks:
+                    task.cancel()
+                await asyncio.gather(*worker_tasks, return_exceptions=True)
+
+    print(f"📊 正文：保存 {stats['saved']} 篇，失败 {stats['failed']} 篇；队列 {frontier.counts('article')}")
+    return stats['saved']
+
+
+def read_manifest(path):
+    """读取 manifest.csv，按文件名排序（并发抓取时写入的先后不固定）"""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        return sorted(list(csv.reader(f))[1:])
+
+
+async def check_fetch_bodies(retries=1, max_attempts=2):
+    """
+    在本地测试服务器上为 fixtures/wechat/articles.csv 运行三次正文抓取：
+    1. 重复链接（CSV 中的和搜索阶段送来的）只请求一次；一篇文章持续失败（超过重试次数），已删除的文章提取不到正文；
+    2. 续抓：只请求上次失败的两篇，失败的那篇这次成功，已删除的再失败一次；
+    3. 已删除的文章达到 max_attempts 后不再尝试，不再发出请求。
+    每篇文章只写一个 TXT、一行 manifest，与 manifest_expected.csv 和 texts_expected.json 一致。返回保存的篇数。
+    """
+    import json
+    import tempfile
+    from fixture_server import FixtureServer
+
+    failing, deleted = '/s/Fk7pQz2Crawler9', '/s/Dl4eTd0Removed5'
+    with tempfile.TemporaryDirectory() as tmp:
+        with open_body_frontier(tmp) as frontier:
+            added = [enqueue_csv(frontier, os.path.join(FIXTURE_DIR, 'wechat', 'articles.csv')) for _ in range(2)]
+            async with FixtureServer(CHECK_ROUTES, FIXTURE_DIR, origin=CHECK_ORIGIN,
+                                     fail={failing: retries + 1}) as server:
+                counts, requests = [], []
+                for run in range(3):
+                    # 第一次运行时，搜索阶段又送来两篇文章的重复链接（见 miku_ai-weixincrawler.crawl）
+                    incoming = asyncio.Queue()
+                    for url in ([CHECK_ORIGIN + '/s/Xq3bLm0DataNews1?scene=0', CHECK_ORIGIN + failing]
+                                if run == 0 else []):
+                        incoming.put_nowait(article_item(url))
+                    incoming.put_nowait(None)
+                    start = len(server.hits)
+                    counts.append(await fetch_bodies(frontier, tmp, incoming, workers=2, rate=None, retries=retries,
+                                                     max_attempts=max_attempts, base_url=server.base_url))
+                    requests.append([hit.split('?')[0] for hit in server.hits[start:]])
+            status = frontier.counts('article')
+        rows = read_manifest(os.path.join(tmp, 'manifest.csv'))
+        texts = {}
+        for root, _, names in os.walk(tmp):
+            for name in names:
+                if name.endswith('.txt'):
+                    with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                        texts[os.path.relpath(os.path.join(root, name), tmp).replace(os.sep, '/')] = f.read()
+    expected = read_manifest(CHECK_EXPECTED)
+    with open(CHECK_TEXTS, 'r', encoding='utf-8') as f:
+        expected_texts = json.load(f)
+
+    if added != [4, 0]:
+        raise AssertionError(f"重复链接应合并为一篇，再次加入时不应新增: {added}")
+    first = sorted(requests[0])
+    if first != sorted(['/s/Xq3bLm0DataNews1', '/s', deleted] + [failing] * (retries + 1)):
+        raise AssertionError(f"每篇文章应只请求一次（失败的按重试次数）: {requests[0]}")
+    if sorted(requests[1]) != sorted([failing, deleted]):
+        raise AssertionError(f"续抓应只请求上次失败的文章: {requests[1]}")
+    if requests[2]:
+        raise AssertionError(f"已完成和超过尝试次数的文章不应再请求: {requests[2]}")
+    if counts != [2, 1, 0] or status != {'done': 3, 'failed': 1}:
+        raise AssertionError(f"各次保存的篇数或队列状态不符: {counts} {status}")
+    if [[row[0].replace(os.sep, '/')] + row[1:] for row in rows] != expected:
+        raise AssertionError(f"manifest 与 manifest_expected.csv 不一致: {rows}")
+    if texts != expected_texts:
+        raise AssertionError(f"TXT 与 texts_expected.json 不一致: {sorted(texts)}")
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='为 articles.csv 中的文章抓取正文，保存为 TXT')
+    parser.add_argument('csv_path', nargs='?', help='微信文章搜索结果CSV（含 URL 列）')
+    parser.add_argument('--out', default=BODY_DIR, help='TXT 输出目录（同时保存抓取进度）')
+    parser.add_argument('--workers', type=int, default=BODY_WORKERS, help='并发工作协程数')
+    parser.add_argument('--rate', type=float, default=BODY_RATE, help='每秒请求数')
+    parser.add_argument('--connections', type=int, default=BODY_CONNECTIONS, help='并发连接数')
+    parser.add_argument('--base-url', default=None, help='请求发往的地址（如本地测试服务器），替换文章链接的协议和域名')
+    parser.add_argument('--check', action='store_true', help='用保存的文章页在本地服务器上校验正文抓取的去重、续抓和失败重试')
+    args = parser.parse_args()
+
+    if args.check:
+        count = asyncio.run(check_fetch_bodies())
+        print(f'✅ 正文抓取校验通过：失败重试和续抓后共 {count} 篇，重复链接只保存一次')
+        raise SystemExit
+    if not args.csv_path:
+        parser.error('需要 csv_path（或使用 --check）')
+
+    with open_body_frontier(args.out) as frontier:
+        print(f"待抓取队列新增 {enqueue_csv(frontier, args.csv_path)} 篇")
+        asyncio.run(fetch_bodies(frontier, args.out, workers=args.workers, rate=args.rate,
+                                 connections=args.connections, base_url=args.base_url))